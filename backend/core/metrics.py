@@ -0,0 +1,96 @@
+# backend/core/metrics.py
+import numpy as np
+
+class WalletMetrics:
+    """Chỉ số danh mục 1 ví tính theo cột (NumPy) thay vì từng dict một"""
+
+    def __init__(self, symbols, qty, avg, cur, cost, fx):
+        self.symbols = symbols
+        self.qty, self.avg, self.cur, self.cost = qty, avg, cur, cost
+        self.val = qty * cur * fx
+        self.profit = self.val - self.cost
+        self.roi = np.divide(self.profit, self.cost, out=np.zeros_like(self.profit), where=self.cost > 0) * 100
+
+        self.total_value = float(self.val.sum())
+        self.total_cost = float(self.cost.sum())
+        self.weight = self.val / self.total_value * 100 if self.total_value > 0 else np.zeros_like(self.val)
+        # argmax/argmin lấy mã xuất hiện đầu tiên khi bằng nhau
+        self.best = int(np.argmax(self.profit)) if len(symbols) else None
+        self.worst = int(np.argmin(self.profit)) if len(symbols) else None
+        self.largest = int(np.argmax(self.val)) if len(symbols) else None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def pick(self, idx):
+        """Thông tin 1 mã theo vị trí (dùng cho best/worst/largest)"""
+        if idx is None: return None
+        return {
+            'sym': self.symbols[idx], 'val': float(self.val[idx]), 'profit': float(self.profit[idx]),
+            'roi': float(self.roi[idx]), 'weight': float(self.weight[idx])
+        }
+
+    def rows(self):
+        """Danh sách dict theo thứ tự gốc của danh mục, để dựng tin nhắn"""
+        cols = zip(self.symbols, self.qty.tolist(), self.avg.tolist(), self.cur.tolist(), self.val.tolist(),
+                   self.profit.tolist(), self.roi.tolist(), self.weight.tolist())
+        return [{'sym': s, 'qty': q, 'avg': a, 'cur': c, 'val': v, 'profit': p, 'roi': r, 'weight': w}
+                for s, q, a, c, v, p, r, w in cols]
+
+def compute_wallet_metrics(holdings, fx=1.0, price_fallback=False):
+    """holdings: các dòng bảng holdings của 1 ví. fx: hệ số quy đổi sang VNĐ (tỷ giá crypto).
+    price_fallback=True: mã chưa có giá hiện tại thì định giá theo giá vốn (cách Dashboard tổng đang làm)."""
+    n = len(holdings)
+    symbols = [h['symbol'] for h in holdings]
+    qty = np.fromiter((h['quantity'] or 0 for h in holdings), dtype=float, count=n)
+    avg = np.fromiter((h['average_price'] or 0 for h in holdings), dtype=float, count=n)
+    cur = np.fromiter((h['current_price'] or 0 for h in holdings), dtype=float, count=n)
+    cost = np.fromiter((h['cost_basis_vnd'] or 0 for h in holdings), dtype=float, count=n)
+    if price_fallback:
+        cur = np.where(cur == 0, avg, cur)
+    return WalletMetrics(symbols, qty, avg, cur, cost, fx)
+
+def summarize_wallet(snapshot, wallet_id):
+    """Số liệu tổng hợp 1 ví con (STOCK/CRYPTO) cho Dashboard & Báo cáo nhóm"""
+    wallet = snapshot.wallets.get(wallet_id)
+    if not wallet: return None
+
+    pm = snapshot.wallet_metrics(wallet_id)
+    stats = snapshot.trade_stats.get(wallet_id, {})
+    cash = wallet['balance']
+    book_value = wallet['total_in'] - wallet['total_out']
+    total_value = cash + pm.total_value
+    total_profit = total_value - book_value
+
+    return {
+        'cash': cash, 'total_in': wallet['total_in'], 'total_out': wallet['total_out'], 'book_value': book_value,
+        'total_value': total_value, 'total_profit': total_profit,
+        'total_roi': (total_profit / book_value * 100) if book_value > 0 else 0,
+        'best': pm.pick(pm.best), 'worst': pm.pick(pm.worst), 'largest': pm.pick(pm.largest),
+        'holdings': pm.rows(),
+        'total_buy': stats.get('total_buy', 0), 'total_sell': stats.get('total_sell', 0),
+        'top_gainers': stats.get('top_gainers', ()), 'top_losers': stats.get('top_losers', ()),
+        'rate': snapshot.crypto_rate
+    }
+
+NAV_WALLETS = ('STOCK', 'CRYPTO', 'OTHER')
+
+def summarize_nav(snapshot):
+    """Tài sản ròng theo ví tại 1 snapshot: {ví: (tài sản, vốn gốc, lãi/lỗ)} cho STOCK/CRYPTO/OTHER, CASH và TOTAL.
+    Mã chưa có giá hiện tại định giá theo giá vốn (giống Dashboard tổng). Tính 1 lần cho mỗi snapshot."""
+    nav = snapshot.memo.get('nav')
+    if nav is not None: return nav
+    wallets, nav = snapshot.wallets, {}
+    for wid in NAV_WALLETS:
+        w = wallets.get(wid, {'balance': 0, 'total_in': 0, 'total_out': 0})
+        pm = snapshot.wallet_metrics(wid, price_fallback=True)
+        nav[wid] = (w['balance'] + pm.total_value, w['total_in'] - w['total_out'],
+                    snapshot.realized.get(wid, 0) + (pm.total_value - pm.total_cost))
+    cash = wallets.get('CASH', {})
+    cash_balance = cash.get('balance', 0)
+    nav['CASH'] = (cash_balance, cash_balance, 0)
+    nav['TOTAL'] = (cash_balance + sum(nav[wid][0] for wid in NAV_WALLETS),
+                    cash.get('total_in', 0) - cash.get('total_out', 0),
+                    sum(nav[wid][2] for wid in NAV_WALLETS))
+    snapshot.memo['nav'] = nav
+    return nav
@@ -1,5 +1,6 @@
 # backend/core/parser.py
 import re
+from datetime import datetime, timedelta
 
 def parse_currency(text):
     text = text.lower().replace(',', '').strip()
@@ -25,3 +26,92 @@ def parse_trade_command(text):
     quantity = float(match.group(3))
     price = float(match.group(4))
     return wallet_type, symbol, quantity, price
+
+def split_lot_ref(text):
+    """'s vpb -100 25 #12' -> ('s vpb -100 25', 12): bán đúng lô #12. Không có #id -> (text, None)"""
+    match = re.search(r'\s+#(\d+)\s*$', text)
+    if not match: return text, None
+    return text[:match.start()], int(match.group(1))
+
+# Mã tính giá bằng USD: không nhân 1000 khi gõ tắt giá
+CRYPTO_QUOTES = ['BTC', 'ETH', 'SOL', 'BNB']
+
+def normalize_trade_price(wallet_type, price):
+    """Giá cổ phiếu gõ tắt theo nghìn đồng (25.5 -> 25,500)"""
+    return price * 1000 if wallet_type == 'STOCK' and price < 1000 else price
+
+def normalize_quote(symbol, price):
+    """Giá cổ phiếu gõ tắt theo nghìn đồng; mã crypto giữ nguyên USD"""
+    return price * 1000 if (price < 1000 and symbol not in CRYPTO_QUOTES) else price
+
+def parse_price_quotes(text):
+    """up [MÃ] [GIÁ] [MÃ] [GIÁ] ... -> [(mã, giá thực), ...]"""
+    parts = text.split()[1:]
+    if not parts or len(parts) % 2:
+        raise ValueError("Cú pháp: up [MÃ] [GIÁ] (có thể nhiều cặp)")
+    quotes = []
+    for sym, p in zip(parts[::2], parts[1::2]):
+        sym = sym.upper()
+        quotes.append((sym, normalize_quote(sym, float(p))))
+    return quotes
+
+# ==========================================
+# TÌM KIẾM LỊCH SỬ
+# ==========================================
+LEDGER_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d', '%d/%m/%y')
+
+def parse_ledger_date(text):
+    """Ngày trong file Excel cũ -> 'YYYY-MM-DD 00:00:00' (dạng timestamp của SQLite); không đọc được -> None"""
+    text = str(text or '').strip()[:10]
+    for fmt in LEDGER_DATE_FORMATS:
+        try: return datetime.strptime(text, fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError: continue
+    return None
+
+_DATE_PART = r'\d{4}(?:-\d{2}(?:-\d{2})?)?'
+_DATE_RANGE = re.compile(f'^({_DATE_PART})(?:\\.\\.({_DATE_PART}))?$')
+
+def _period_start(part):
+    """Luôn trả đủ YYYY-MM-DD: cột timestamp kiểu DATETIME (affinity NUMERIC) sẽ đổi '2026' thành số 2026"""
+    return datetime.strptime((part + '-01-01')[:10], '%Y-%m-%d').strftime('%Y-%m-%d')
+
+def _period_end(part):
+    """Ngày ngay sau kỳ: '2026' -> '2027-01-01', '2026-06' -> '2026-07-01', '2026-06-30' -> '2026-07-01'"""
+    if len(part) == 4: return f"{int(part) + 1}-01-01"
+    if len(part) == 7:
+        year, month = int(part[:4]), int(part[5:])
+        if not 1 <= month <= 12: raise ValueError(part)
+        return f"{year + month // 12}-{month % 12 + 1:02d}-01"
+    return (datetime.strptime(part, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+def parse_date_range(token):
+    """'2026-01..2026-06' / '2026' / '2026-03-15' -> (từ, tới) so sánh chuỗi với timestamp: từ <= ts < tới.
+    Không phải khoảng ngày -> None"""
+    match = _DATE_RANGE.match(token)
+    if not match: return None
+    start, end = match.group(1), match.group(2) or match.group(1)
+    try: return _period_start(start), _period_end(end)
+    except ValueError: return None
+
+def build_fts_query(text):
+    """Chữ người dùng gõ -> biểu thức MATCH an toàn: mọi từ đều phải có (khớp tiền tố), bỏ ký tự đặc biệt của FTS5"""
+    words = re.findall(r'\w+', text)
+    return ' '.join(f'"{w}"*' for w in words) or None
+
+# ==========================================
+# BÁO CÁO THEO KỲ
+# ==========================================
+_REPORT_PART = r'\d{4}(?:-\d{2})?'
+_REPORT_RANGE = re.compile(f'^({_REPORT_PART})(?:\\.\\.({_REPORT_PART}))?$')
+
+def parse_report_period(token):
+    """'2026' -> ('Y', '2026', '2026'); '2026-09' -> ('M', '2026-09', '2026-09'); '2026-01..2026-06' -> ('M', '2026-01', '2026-06').
+    Khoảng có cả năm lẫn tháng thì đọc theo tháng. Bảng gộp chỉ tới mức tháng nên không nhận ngày -> None"""
+    match = _REPORT_RANGE.match(token.strip())
+    if not match: return None
+    start, end = match.group(1), match.group(2) or match.group(1)
+    if any(len(p) == 7 and not 1 <= int(p[5:]) <= 12 for p in (start, end)): return None
+    if len(start) == 4 and len(end) == 4:
+        return ('Y', start, end) if start <= end else None
+    start, end = (start + '-01')[:7], (end + '-12')[:7]
+    return ('M', start, end) if start <= end else None
@@ -0,0 +1,37 @@
+# backend/database/conftest.py
+# Sổ trộn đủ kiểu ghi để so bảng tổng hợp (trigger) với GROUP BY trực tiếp trên transactions
+import random
+import pytest
+
+@pytest.fixture
+def mixed_ledger(db):
+    """Nạp/rút/cấp vốn, mua/bán AVG lẫn FIFO, xóa mã, dòng có ngày cũ rải nhiều tháng / năm, xóa giao dịch"""
+    rng = random.Random(7)
+    db.update_cash_balance(5_000_000_000, 'NAP')
+    db.transfer_funds('CASH', 'STOCK', 2_000_000_000)
+    db.transfer_funds('CASH', 'CRYPTO', 1_000_000_000)
+    held = {}
+    for i in range(120):
+        if i == 60: db.set_cost_method('FIFO')
+        wallet = rng.choice(('STOCK', 'CRYPTO'))
+        sym = rng.choice(('FPT', 'VPB', 'HPG') if wallet == 'STOCK' else ('BTC', 'XRP'))
+        price = rng.uniform(10_000, 50_000) if wallet == 'STOCK' else rng.uniform(0.5, 100)
+        fx = 25_000 if wallet == 'CRYPTO' else 1
+        qty = held.get((wallet, sym), 0)
+        if qty and rng.random() < 0.4:
+            sell = qty if rng.random() < 0.3 else round(qty / 2, 6)
+            db.execute_trade(wallet, sym, -sell, price, sell * price * fx)
+            held[(wallet, sym)] = qty - sell
+        else:
+            buy = rng.randrange(1, 20) * 100 if wallet == 'STOCK' else round(rng.uniform(1, 50), 6)
+            db.execute_trade(wallet, sym, buy, price, buy * price * fx)
+            held[(wallet, sym)] = qty + buy
+    db.update_cash_balance(100_000_000, 'RUT')
+    db.delete_holding_and_refund('HPG')
+    rows = [(rng.choice(('CASH', 'STOCK')), rng.choice(('NAP', 'RUT', 'CHUYEN_IN', 'MUA', 'BAN')), rng.choice((None, 'FPT', 'VNM')),
+             rng.uniform(-1e7, 1e7), rng.uniform(-1e6, 1e6), f"202{rng.randrange(3, 6)}-{rng.randrange(1, 13):02d}-15 10:00:00")
+            for _ in range(80)]
+    db.execute_many("INSERT INTO transactions (wallet_id, type, symbol, amount, realized_pl, timestamp) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    # Xóa giao dịch: trigger phải trừ ngược đúng phần đã cộng
+    db.execute_query("DELETE FROM transactions WHERE id % 7 = 0")
+    return db
@@ -29,4 +29,281 @@ CREATE TABLE IF NOT EXISTS transactions (
     realized_pl REAL DEFAULT 0,
     timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
 );
+
+-- Chỉ mục cho màn hình lịch sử (lọc theo ví / theo mã, duyệt theo id giảm dần)
+CREATE INDEX IF NOT EXISTS idx_tx_wallet_id ON transactions(wallet_id, id);
+CREATE INDEX IF NOT EXISTS idx_tx_symbol_id ON transactions(symbol, id);
+
+-- Bộ đếm số giao dịch theo phạm vi lọc: 'ALL', 'W:<ví>', 'S:<mã>' (thay cho COUNT(*) quét bảng)
+CREATE TABLE IF NOT EXISTS tx_counters (
+    scope TEXT PRIMARY KEY,
+    total INTEGER DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_tx_count_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO tx_counters (scope, total) VALUES ('ALL', 1)
+        ON CONFLICT(scope) DO UPDATE SET total = total + 1;
+    INSERT INTO tx_counters (scope, total) SELECT 'W:' || NEW.wallet_id, 1 WHERE NEW.wallet_id IS NOT NULL
+        ON CONFLICT(scope) DO UPDATE SET total = total + 1;
+    INSERT INTO tx_counters (scope, total) SELECT 'S:' || NEW.symbol, 1 WHERE NEW.symbol IS NOT NULL
+        ON CONFLICT(scope) DO UPDATE SET total = total + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tx_count_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE tx_counters SET total = total - 1
+    WHERE scope IN ('ALL', 'W:' || OLD.wallet_id, 'S:' || OLD.symbol);
+END;
+
+-- Tổng hợp Lãi/Lỗ theo ví và theo (ví, mã): cộng dồn bằng trigger trong cùng transaction với lệnh ghi,
+-- thay cho GROUP BY quét toàn bộ bảng transactions mỗi lần mở Dashboard
+CREATE TABLE IF NOT EXISTS wallet_pnl (
+    wallet_id TEXT PRIMARY KEY,
+    realized_pl REAL DEFAULT 0,
+    buy_total REAL DEFAULT 0,
+    sell_total REAL DEFAULT 0,
+    trade_count INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS symbol_pnl (
+    wallet_id TEXT,
+    symbol TEXT,
+    realized_pl REAL DEFAULT 0,
+    buy_total REAL DEFAULT 0,
+    sell_total REAL DEFAULT 0,
+    trade_count INTEGER DEFAULT 0,
+    PRIMARY KEY (wallet_id, symbol)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_pnl_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO wallet_pnl (wallet_id, realized_pl, buy_total, sell_total, trade_count)
+    SELECT NEW.wallet_id, COALESCE(NEW.realized_pl, 0),
+           CASE WHEN NEW.type = 'MUA' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           CASE WHEN NEW.type = 'BAN' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           NEW.type IN ('MUA', 'BAN')
+    WHERE NEW.wallet_id IS NOT NULL
+    ON CONFLICT(wallet_id) DO UPDATE SET
+        realized_pl = realized_pl + excluded.realized_pl,
+        buy_total = buy_total + excluded.buy_total,
+        sell_total = sell_total + excluded.sell_total,
+        trade_count = trade_count + excluded.trade_count;
+
+    INSERT INTO symbol_pnl (wallet_id, symbol, realized_pl, buy_total, sell_total, trade_count)
+    SELECT NEW.wallet_id, NEW.symbol, COALESCE(NEW.realized_pl, 0),
+           CASE WHEN NEW.type = 'MUA' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           CASE WHEN NEW.type = 'BAN' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           NEW.type IN ('MUA', 'BAN')
+    WHERE NEW.symbol IS NOT NULL
+    ON CONFLICT(wallet_id, symbol) DO UPDATE SET
+        realized_pl = realized_pl + excluded.realized_pl,
+        buy_total = buy_total + excluded.buy_total,
+        sell_total = sell_total + excluded.sell_total,
+        trade_count = trade_count + excluded.trade_count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_pnl_delete AFTER DELETE ON transactions
+BEGIN
+    UPDATE wallet_pnl SET
+        realized_pl = realized_pl - COALESCE(OLD.realized_pl, 0),
+        buy_total = buy_total - CASE WHEN OLD.type = 'MUA' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        sell_total = sell_total - CASE WHEN OLD.type = 'BAN' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        trade_count = trade_count - (OLD.type IN ('MUA', 'BAN'))
+    WHERE wallet_id = OLD.wallet_id;
+
+    UPDATE symbol_pnl SET
+        realized_pl = realized_pl - COALESCE(OLD.realized_pl, 0),
+        buy_total = buy_total - CASE WHEN OLD.type = 'MUA' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        sell_total = sell_total - CASE WHEN OLD.type = 'BAN' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        trade_count = trade_count - (OLD.type IN ('MUA', 'BAN'))
+    WHERE wallet_id = OLD.wallet_id AND symbol = OLD.symbol;
+END;
+
+-- Lịch sử giá theo mã (lệnh up, giá khớp, import). Giá hiện hành = dòng mới nhất của mỗi mã,
+-- tra bằng chỉ mục (symbol, ts) thay cho holdings.current_price (chỉ còn là giá khớp gần nhất, dùng dự phòng)
+CREATE TABLE IF NOT EXISTS prices (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    ts TEXT DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    price REAL NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_prices_symbol_ts ON prices(symbol, ts);
+
+-- Sổ lô (bật khi cost_method = FIFO/LIFO): mỗi lệnh mua mở 1 lô, lệnh bán trừ dần các lô đang mở.
+-- buy_tx_id NULL = lô mở đầu dựng từ danh mục lúc bật sổ lô / import. price theo đơn vị giá gốc (USD với crypto)
+CREATE TABLE IF NOT EXISTS lots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    wallet_id TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    buy_tx_id INTEGER,
+    opened_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    quantity REAL NOT NULL,
+    remaining REAL NOT NULL,
+    price REAL DEFAULT 0,
+    cost_vnd REAL DEFAULT 0,
+    realized_pl REAL DEFAULT 0
+);
+
+-- Chỉ mục riêng phần lô còn mở: lệnh bán chỉ đọc đúng các lô nó trừ, lô đã đóng không làm chậm theo thời gian
+CREATE INDEX IF NOT EXISTS idx_lots_open ON lots(wallet_id, symbol, id) WHERE remaining > 0;
+
+-- Lệnh bán nào trừ lô nào: số lượng, giá vốn, tiền bán phân bổ và lãi/lỗ chốt của từng phần
+CREATE TABLE IF NOT EXISTS lot_matches (
+    sell_tx_id INTEGER,
+    lot_id INTEGER,
+    quantity REAL,
+    cost_vnd REAL,
+    proceeds_vnd REAL,
+    realized_pl REAL,
+    PRIMARY KEY (sell_tx_id, lot_id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_lot_matches_lot ON lot_matches(lot_id);
+
+-- NAV theo ngày: 1 dòng / (ví, ngày) gồm STOCK, CRYPTO, OTHER, CASH và TOTAL.
+-- Ghi đè sau mỗi lần dữ liệu đổi (từ snapshot tổng hợp, không replay sổ) nên dòng của 1 ngày = trạng thái cuối ngày đó
+CREATE TABLE IF NOT EXISTS nav_snapshots (
+    wallet_id TEXT,
+    day TEXT,
+    assets REAL DEFAULT 0,
+    book_value REAL DEFAULT 0,
+    pnl REAL DEFAULT 0,
+    PRIMARY KEY (wallet_id, day)
+) WITHOUT ROWID;
+
+-- Gộp NAV theo tuần ('W', bucket = ngày thứ Hai) và tháng ('M', bucket = YYYY-MM): giá trị ngày đầu / ngày cuối kỳ
+CREATE TABLE IF NOT EXISTS nav_rollups (
+    period TEXT,
+    wallet_id TEXT,
+    bucket TEXT,
+    first_day TEXT,
+    last_day TEXT,
+    open_assets REAL, open_book REAL, open_pnl REAL,
+    close_assets REAL, close_book REAL, close_pnl REAL,
+    PRIMARY KEY (period, wallet_id, bucket)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_nav_rollup_insert AFTER INSERT ON nav_snapshots
+BEGIN
+    INSERT INTO nav_rollups (period, wallet_id, bucket, first_day, last_day, open_assets, open_book, open_pnl, close_assets, close_book, close_pnl)
+    SELECT k.period, NEW.wallet_id, k.bucket, NEW.day, NEW.day, NEW.assets, NEW.book_value, NEW.pnl, NEW.assets, NEW.book_value, NEW.pnl
+    FROM (SELECT 'W' AS period, date(NEW.day, 'weekday 0', '-6 days') AS bucket UNION ALL SELECT 'M', substr(NEW.day, 1, 7)) k
+    WHERE 1
+    ON CONFLICT(period, wallet_id, bucket) DO UPDATE SET
+        open_assets = CASE WHEN excluded.first_day <= first_day THEN excluded.open_assets ELSE open_assets END,
+        open_book = CASE WHEN excluded.first_day <= first_day THEN excluded.open_book ELSE open_book END,
+        open_pnl = CASE WHEN excluded.first_day <= first_day THEN excluded.open_pnl ELSE open_pnl END,
+        first_day = MIN(first_day, excluded.first_day),
+        close_assets = CASE WHEN excluded.last_day >= last_day THEN excluded.close_assets ELSE close_assets END,
+        close_book = CASE WHEN excluded.last_day >= last_day THEN excluded.close_book ELSE close_book END,
+        close_pnl = CASE WHEN excluded.last_day >= last_day THEN excluded.close_pnl ELSE close_pnl END,
+        last_day = MAX(last_day, excluded.last_day);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_nav_rollup_update AFTER UPDATE ON nav_snapshots
+BEGIN
+    INSERT INTO nav_rollups (period, wallet_id, bucket, first_day, last_day, open_assets, open_book, open_pnl, close_assets, close_book, close_pnl)
+    SELECT k.period, NEW.wallet_id, k.bucket, NEW.day, NEW.day, NEW.assets, NEW.book_value, NEW.pnl, NEW.assets, NEW.book_value, NEW.pnl
+    FROM (SELECT 'W' AS period, date(NEW.day, 'weekday 0', '-6 days') AS bucket UNION ALL SELECT 'M', substr(NEW.day, 1, 7)) k
+    WHERE 1
+    ON CONFLICT(period, wallet_id, bucket) DO UPDATE SET
+        open_assets = CASE WHEN excluded.first_day <= first_day THEN excluded.open_assets ELSE open_assets END,
+        open_book = CASE WHEN excluded.first_day <= first_day THEN excluded.open_book ELSE open_book END,
+        open_pnl = CASE WHEN excluded.first_day <= first_day THEN excluded.open_pnl ELSE open_pnl END,
+        first_day = MIN(first_day, excluded.first_day),
+        close_assets = CASE WHEN excluded.last_day >= last_day THEN excluded.close_assets ELSE close_assets END,
+        close_book = CASE WHEN excluded.last_day >= last_day THEN excluded.close_book ELSE close_book END,
+        close_pnl = CASE WHEN excluded.last_day >= last_day THEN excluded.close_pnl ELSE close_pnl END,
+        last_day = MAX(last_day, excluded.last_day);
+END;
+
+-- Gộp giao dịch theo tháng ('M', bucket YYYY-MM) và năm ('Y', bucket YYYY) cho từng (ví, mã); symbol '' = dòng không gắn mã.
+-- Trigger cộng dồn trong cùng transaction với lệnh ghi: báo cáo kỳ chỉ đọc bảng này, không quét transactions
+CREATE TABLE IF NOT EXISTS period_flows (
+    period TEXT,
+    bucket TEXT,
+    wallet_id TEXT,
+    symbol TEXT,
+    buy_total REAL DEFAULT 0,
+    sell_total REAL DEFAULT 0,
+    realized_pl REAL DEFAULT 0,
+    deposit REAL DEFAULT 0,
+    withdraw REAL DEFAULT 0,
+    transfer_in REAL DEFAULT 0,
+    trade_count INTEGER DEFAULT 0,
+    PRIMARY KEY (period, bucket, wallet_id, symbol)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_period_insert AFTER INSERT ON transactions
+WHEN NEW.wallet_id IS NOT NULL AND NEW.timestamp IS NOT NULL
+BEGIN
+    INSERT INTO period_flows (period, bucket, wallet_id, symbol, buy_total, sell_total, realized_pl, deposit, withdraw, transfer_in, trade_count)
+    SELECT k.period, k.bucket, NEW.wallet_id, COALESCE(NEW.symbol, ''),
+           CASE WHEN NEW.type = 'MUA' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           CASE WHEN NEW.type = 'BAN' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           COALESCE(NEW.realized_pl, 0),
+           CASE WHEN NEW.type = 'NAP' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           CASE WHEN NEW.type = 'RUT' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           CASE WHEN NEW.type = 'CHUYEN_IN' THEN ABS(COALESCE(NEW.amount, 0)) ELSE 0 END,
+           NEW.type IN ('MUA', 'BAN')
+    FROM (SELECT 'M' AS period, substr(NEW.timestamp, 1, 7) AS bucket UNION ALL SELECT 'Y', substr(NEW.timestamp, 1, 4)) k
+    WHERE 1
+    ON CONFLICT(period, bucket, wallet_id, symbol) DO UPDATE SET
+        buy_total = buy_total + excluded.buy_total,
+        sell_total = sell_total + excluded.sell_total,
+        realized_pl = realized_pl + excluded.realized_pl,
+        deposit = deposit + excluded.deposit,
+        withdraw = withdraw + excluded.withdraw,
+        transfer_in = transfer_in + excluded.transfer_in,
+        trade_count = trade_count + excluded.trade_count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_period_delete AFTER DELETE ON transactions
+WHEN OLD.wallet_id IS NOT NULL AND OLD.timestamp IS NOT NULL
+BEGIN
+    UPDATE period_flows SET
+        buy_total = buy_total - CASE WHEN OLD.type = 'MUA' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        sell_total = sell_total - CASE WHEN OLD.type = 'BAN' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        realized_pl = realized_pl - COALESCE(OLD.realized_pl, 0),
+        deposit = deposit - CASE WHEN OLD.type = 'NAP' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        withdraw = withdraw - CASE WHEN OLD.type = 'RUT' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        transfer_in = transfer_in - CASE WHEN OLD.type = 'CHUYEN_IN' THEN ABS(COALESCE(OLD.amount, 0)) ELSE 0 END,
+        trade_count = trade_count - (OLD.type IN ('MUA', 'BAN'))
+    WHERE wallet_id = OLD.wallet_id AND symbol = COALESCE(OLD.symbol, '')
+      AND ((period = 'M' AND bucket = substr(OLD.timestamp, 1, 7)) OR (period = 'Y' AND bucket = substr(OLD.timestamp, 1, 4)));
+END;
+"""
+
+# Tìm kiếm lịch sử: chạy SAU khi _init_db đã thêm cột note cho DB cũ
+SEARCH_SCHEMA = """
+-- Chỉ mục full-text (FTS5, external content) trên type/symbol/note của transactions, đồng bộ bằng trigger.
+-- remove_diacritics 2: gõ không dấu vẫn khớp ("hoan von" ~ "hoàn vốn")
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+    type, symbol, note,
+    content='transactions', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_tx_fts_insert AFTER INSERT ON transactions
+BEGIN
+    INSERT INTO transactions_fts (rowid, type, symbol, note) VALUES (NEW.id, NEW.type, NEW.symbol, NEW.note);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tx_fts_delete AFTER DELETE ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, type, symbol, note) VALUES ('delete', OLD.id, OLD.type, OLD.symbol, OLD.note);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_tx_fts_update AFTER UPDATE OF type, symbol, note ON transactions
+BEGIN
+    INSERT INTO transactions_fts (transactions_fts, rowid, type, symbol, note) VALUES ('delete', OLD.id, OLD.type, OLD.symbol, OLD.note);
+    INSERT INTO transactions_fts (rowid, type, symbol, note) VALUES (NEW.id, NEW.type, NEW.symbol, NEW.note);
+END;
+
+-- Lọc theo khoảng thời gian (his VPB 2026-01..2026-06)
+CREATE INDEX IF NOT EXISTS idx_tx_timestamp ON transactions(timestamp);
+CREATE INDEX IF NOT EXISTS idx_tx_symbol_ts ON transactions(symbol, timestamp);
+CREATE INDEX IF NOT EXISTS idx_tx_wallet_ts ON transactions(wallet_id, timestamp);
 """
@@ -1,117 +1,736 @@
 # backend/database/repository.py
-import sqlite3, os, sys
+import sqlite3, os, sys, threading, itertools, contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
-from config import DB_PATH
-from .models import SCHEMA
+from config import DB_PATH, SHARD_DIR, MAX_OPEN_SHARDS, OWNER_CHAT_ID
+from .models import SCHEMA, SEARCH_SCHEMA
+from .snapshot import PortfolioSnapshot
+from .settings import SETTING_DEFAULTS, coerce_setting
+from backend.core.parser import parse_ledger_date
+
+# Pragma áp dụng cho mỗi kết nối mới (WAL: đọc không chặn ghi, chỉ fsync khi checkpoint)
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",     # ~16MB page cache / kết nối
+    "PRAGMA mmap_size = 134217728",   # 128MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+)
+STATEMENT_CACHE_SIZE = 256
+# Mốc ghi trong PRAGMA user_version khi bảng tổng hợp đã dựng từ transactions; thêm bảng tổng hợp mới thì tăng số này
+AGGREGATES_VERSION = 1
+
+# Giá hiện hành của 1 mã: dòng mới nhất trong prices (đi theo chỉ mục symbol, ts)
+LATEST_PRICE = "(SELECT p.price FROM prices p WHERE p.symbol = {symbol} ORDER BY p.ts DESC, p.id DESC LIMIT 1)"
+# Danh mục kèm giá hiện hành; mã chưa có dòng giá nào thì dùng giá khớp gần nhất lưu trên holdings
+HOLDINGS_VALUED = f"""SELECT h.id, h.wallet_id, h.symbol, h.quantity, h.average_price, h.cost_basis_vnd,
+    COALESCE({LATEST_PRICE.format(symbol='h.symbol')}, h.current_price) AS current_price FROM holdings h ORDER BY h.id"""
+
+# Chat đang được phục vụ trong thread/task hiện tại (None = sổ chung DB_PATH)
+_current_chat = contextvars.ContextVar('current_chat', default=None)
+# Data version tăng toàn cục: shard bị đóng rồi mở lại không bao giờ trùng version cũ
+_versions = itertools.count(1)
+
+def chat_db_path(chat_id):
+    """Mỗi chat một file SQLite riêng. Chat của chủ cũ (OWNER_CHAT_ID) giữ nguyên file DB_PATH."""
+    if chat_id is None or str(chat_id) == OWNER_CHAT_ID:
+        return DB_PATH
+    return os.path.join(SHARD_DIR, f"chat_{chat_id}.db")
+
+def check_legacy_db():
+    """Gọi lúc khởi động: DB_PATH đã có dữ liệu mà chưa đặt OWNER_CHAT_ID thì sổ cũ không chat nào mở được -> dừng hẳn"""
+    if OWNER_CHAT_ID or not os.path.exists(DB_PATH):
+        return
+    conn = sqlite3.connect(f"file:{os.path.abspath(DB_PATH)}?mode=ro", uri=True)
+    try:
+        tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        has_data = any(conn.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone() for t in ('transactions', 'holdings') if t in tables)
+    finally:
+        conn.close()
+    if has_data:
+        raise RuntimeError(f"{DB_PATH} đang chứa dữ liệu cũ: đặt OWNER_CHAT_ID = chat id của chủ sổ để tiếp tục dùng file này")
+
+class ConnectionPool:
+    """Giữ kết nối SQLite sống lâu: mỗi thread một kết nối riêng, dùng chung cho mọi DatabaseRepo cùng file.
+    Các pool (shard) đang mở nằm trong 1 LRU, shard lâu không dùng sẽ bị đóng kết nối."""
+    _pools = OrderedDict()
+    _pools_lock = threading.Lock()
+    _listeners = []
+
+    def __init__(self, db_path):
+        self.db_path = os.path.abspath(db_path)
+        self.initialized = False
+        self.initializing = False
+        self.init_lock = threading.RLock()
+        self.active = 0   # số chat đang xử lý trên shard này (không đóng khi > 0)
+        self._local = threading.local()
+        self._conns = []
+        self._conns_lock = threading.Lock()
+        # Data version: đổi sau mỗi lần ghi đã COMMIT, dùng làm khóa cho các cache phía trên
+        self.version = next(_versions)
+        self._version_lock = threading.Lock()
+        self.snapshot = None
+        self.snapshot_lock = threading.Lock()
+        self.settings = None   # {khóa: giá trị có kiểu} nạp lần đầu cần tới, thay bằng dict mới mỗi lần ghi
+
+    @classmethod
+    def get(cls, db_path):
+        key = os.path.abspath(db_path)
+        with cls._pools_lock:
+            pool = cls._pools.get(key)
+            if pool is None:
+                pool = cls._pools[key] = cls(key)
+                cls._evict_idle()
+            else:
+                cls._pools.move_to_end(key)
+            return pool
+
+    @classmethod
+    def _evict_idle(cls):
+        excess = len(cls._pools) - MAX_OPEN_SHARDS
+        for key in list(cls._pools):
+            if excess <= 0: break
+            pool = cls._pools[key]
+            if pool.active > 0: continue
+            del cls._pools[key]
+            pool.close_all()
+            excess -= 1
+
+    @classmethod
+    def open_paths(cls):
+        """Các file DB đang mở (chat hoạt động gần đây), cũ nhất trước"""
+        with cls._pools_lock:
+            return list(cls._pools)
+
+    @classmethod
+    def add_listener(cls, callback):
+        """callback(pool, version) được gọi sau mỗi lần dữ liệu của 1 shard thay đổi"""
+        cls._listeners.append(callback)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: autocommit như cũ, transaction phải BEGIN tường minh
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+            conn.row_factory = sqlite3.Row
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            with self._conns_lock:
+                self._conns.append(conn)
+        return conn
+
+    def bump_version(self):
+        with self._version_lock:
+            self.version = version = next(_versions)
+        for listener in list(self._listeners):
+            listener(self, version)
+
+    def close_all(self):
+        with self._conns_lock:
+            for conn in self._conns:
+                try: conn.close()
+                except sqlite3.Error: pass
+            self._conns.clear()
+        self._local = threading.local()
+
+@contextmanager
+def pin_pool(db_path):
+    """Giữ shard mở trong khối này (LRU không đóng kết nối khi còn người dùng)"""
+    pool = ConnectionPool.get(db_path)
+    with ConnectionPool._pools_lock:
+        pool.active += 1
+    try:
+        yield pool
+    finally:
+        with ConnectionPool._pools_lock:
+            pool.active -= 1
+
+@contextmanager
+def use_chat(chat_id):
+    """Mọi DatabaseRepo dùng trong khối này đọc/ghi sổ riêng của chat_id"""
+    with pin_pool(chat_db_path(chat_id)) as pool:
+        token = _current_chat.set(chat_id)
+        try:
+            yield pool
+        finally:
+            _current_chat.reset(token)
 
 class DatabaseRepo:
-    def __init__(self):
-        self.db_path = DB_PATH
-        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self._init_db()
+    def __init__(self, db_path=None):
+        # db_path cố định (công cụ/benchmark); mặc định None = theo chat đang xử lý
+        self._fixed_path = db_path
+
+    @property
+    def db_path(self):
+        return self._fixed_path or chat_db_path(_current_chat.get())
+
+    @property
+    def pool(self):
+        pool = ConnectionPool.get(self.db_path)
+        if not pool.initialized:
+            with pool.init_lock:
+                if not pool.initialized and not pool.initializing:
+                    pool.initializing = True
+                    try:
+                        os.makedirs(os.path.dirname(pool.db_path), exist_ok=True)
+                        self._init_db()
+                        pool.initialized = True
+                    finally:
+                        pool.initializing = False
+        return pool
 
     def _init_db(self):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.executescript(SCHEMA)
-            cursor = conn.cursor()
-            cursor.execute("INSERT OR IGNORE INTO wallets (id) VALUES ('CASH'), ('STOCK'), ('CRYPTO'), ('OTHER')")
-            cursor.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
-            cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('goal', 'lai 10%'), ('crypto_rate', '25000')")
-            
-            try: cursor.execute("ALTER TABLE holdings ADD COLUMN current_price REAL DEFAULT 0")
-            except: pass
-            try: cursor.execute("ALTER TABLE holdings ADD COLUMN cost_basis_vnd REAL DEFAULT 0")
-            except: pass
-            try: cursor.execute("ALTER TABLE transactions ADD COLUMN note TEXT")
-            except: pass
-            
-            conn.commit()
+        conn = self.pool.connection()
+        conn.executescript(SCHEMA)
+        cursor = conn.cursor()
+        cursor.execute("INSERT OR IGNORE INTO wallets (id) VALUES ('CASH'), ('STOCK'), ('CRYPTO'), ('OTHER')")
+        cursor.execute("CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT)")
+        cursor.execute("INSERT OR IGNORE INTO settings (key, value) VALUES ('goal', ?), ('crypto_rate', ?)",
+                       (SETTING_DEFAULTS['goal'], str(SETTING_DEFAULTS['crypto_rate'])))
+        
+        try: cursor.execute("ALTER TABLE holdings ADD COLUMN current_price REAL DEFAULT 0")
+        except: pass
+        try: cursor.execute("ALTER TABLE holdings ADD COLUMN cost_basis_vnd REAL DEFAULT 0")
+        except: pass
+        try: cursor.execute("ALTER TABLE transactions ADD COLUMN note TEXT")
+        except: pass
+        conn.executescript(SEARCH_SCHEMA)
+
+        # DB cũ chưa có bộ đếm / bảng tổng hợp: dựng lại đúng 1 lần từ bảng transactions rồi ghi mốc vào file,
+        # không dò bảng rỗng (shard mới / sổ trống sẽ bị dựng lại mỗi lần pool mở lại sau khi LRU đóng)
+        if cursor.execute("PRAGMA user_version").fetchone()[0] < AGGREGATES_VERSION:
+            with self.transaction() as tx:
+                self.rebuild_aggregates()
+                tx.execute(f"PRAGMA user_version = {AGGREGATES_VERSION}")
 
     def execute_query(self, query, params=(), fetch_one=False, fetch_all=False):
-        with sqlite3.connect(self.db_path) as conn:
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            if fetch_one:
-                row = cursor.fetchone()
-                return dict(row) if row else None
-            return [dict(row) for row in cursor.fetchall()] if fetch_all else cursor.lastrowid
+        conn = self.pool.connection()
+        cursor = conn.execute(query, params)
+        if fetch_one:
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        if fetch_all:
+            return [dict(row) for row in cursor.fetchall()]
+        # Lệnh ghi autocommit: đổi data version ngay (trong transaction thì đợi COMMIT)
+        if not conn.in_transaction:
+            self.pool.bump_version()
+        return cursor.lastrowid
+
+    def iter_rows(self, query, params=(), chunk_size=1000):
+        """Duyệt kết quả theo từng lô fetchmany (không fetchall): bộ nhớ không tăng theo số dòng"""
+        cursor = self.pool.connection().execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows: break
+            yield from rows
+
+    def execute_many(self, query, seq_of_params):
+        """executemany trên kết nối của pool (trong transaction thì đổi version lúc COMMIT)"""
+        conn = self.pool.connection()
+        cursor = conn.executemany(query, seq_of_params)
+        if not conn.in_transaction:
+            self.pool.bump_version()
+        return cursor.rowcount
+
+    @contextmanager
+    def transaction(self, readonly=False, quiet=False):
+        """Unit-of-work: mọi câu lệnh bên trong chạy trên 1 kết nối, 1 lần BEGIN IMMEDIATE ... COMMIT.
+        Lỗi giữa chừng sẽ ROLLBACK toàn bộ. Gọi lồng nhau thì nhập chung vào transaction ngoài cùng.
+        readonly=True: BEGIN thường để đọc nhất quán nhiều câu SELECT, không đổi data version.
+        quiet=True: chỉ ghi dữ liệu dẫn xuất (NAV), không đổi data version."""
+        conn = self.pool.connection()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN" if readonly else "BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            # Setting đã ghi xuyên vào cache trong transaction này không còn đúng: nạp lại từ DB
+            self.pool.settings = self.pool.snapshot = None
+            raise
+        conn.execute("COMMIT")
+        if not (readonly or quiet):
+            self.pool.bump_version()
+
+    # ==========================================
+    # SETTINGS (CACHE RAM, GHI XUYÊN)
+    # ==========================================
+    def _settings(self):
+        pool = self.pool
+        settings = pool.settings
+        if settings is None:
+            rows = self.execute_query("SELECT key, value FROM settings", fetch_all=True)
+            settings = pool.settings = {**SETTING_DEFAULTS, **{r['key']: coerce_setting(r['key'], r['value']) for r in rows}}
+        return settings
+
+    def get_setting(self, key):
+        return self._settings().get(key, SETTING_DEFAULTS.get(key))
+
+    def set_settings(self, items):
+        """Ghi xuyên [(khóa, giá trị)]: chỉ khóa đổi giá trị mới ghi DB. Cache đổi trước COMMIT nên snapshot /
+        cache hiển thị (dựng lại theo data version mới) luôn thấy giá trị mới. Trả về True nếu có khóa đổi."""
+        current = self._settings()
+        changed = {k: coerce_setting(k, v) for k, v in items}
+        changed = {k: v for k, v in changed.items() if current.get(k) != v}
+        if not changed: return False
+        with self.transaction():
+            self.execute_many("INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)",
+                              [(k, str(v)) for k, v in changed.items()])
+            self.pool.settings = {**current, **changed}
+        return True
+
+    def set_setting(self, key, value):
+        return self.set_settings([(key, value)])
 
     def update_cash_balance(self, amount, tx_type):
-        if amount > 0:
-            self.execute_query("UPDATE wallets SET balance = balance + ?, total_in = total_in + ? WHERE id = 'CASH'", (amount, amount))
-        else:
-            self.execute_query("UPDATE wallets SET balance = balance + ?, total_out = total_out + ? WHERE id = 'CASH'", (amount, abs(amount)))
-        self.execute_query("INSERT INTO transactions (wallet_id, type, amount) VALUES ('CASH', ?, ?)", (tx_type, amount))
+        with self.transaction():
+            if amount > 0:
+                self.execute_query("UPDATE wallets SET balance = balance + ?, total_in = total_in + ? WHERE id = 'CASH'", (amount, amount))
+            else:
+                self.execute_query("UPDATE wallets SET balance = balance + ?, total_out = total_out + ? WHERE id = 'CASH'", (amount, abs(amount)))
+            self.execute_query("INSERT INTO transactions (wallet_id, type, amount) VALUES ('CASH', ?, ?)", (tx_type, amount))
 
     def transfer_funds(self, from_wallet, to_wallet, amount):
-        self.execute_query("UPDATE wallets SET balance = balance - ? WHERE id = ?", (amount, from_wallet))
-        self.execute_query("UPDATE wallets SET balance = balance + ?, total_in = total_in + ? WHERE id = ?", (amount, amount, to_wallet))
-        if from_wallet != 'CASH':
-            self.execute_query("UPDATE wallets SET total_out = total_out + ? WHERE id = ?", (amount, from_wallet))
-        self.execute_query("INSERT INTO transactions (wallet_id, type, amount) VALUES (?, 'CHUYEN_IN', ?)", (to_wallet, amount))
+        with self.transaction():
+            self.execute_query("UPDATE wallets SET balance = balance - ? WHERE id = ?", (amount, from_wallet))
+            self.execute_query("UPDATE wallets SET balance = balance + ?, total_in = total_in + ? WHERE id = ?", (amount, amount, to_wallet))
+            if from_wallet != 'CASH':
+                self.execute_query("UPDATE wallets SET total_out = total_out + ? WHERE id = ?", (amount, from_wallet))
+            self.execute_query("INSERT INTO transactions (wallet_id, type, amount) VALUES (?, 'CHUYEN_IN', ?)", (to_wallet, amount))
 
-    def execute_trade(self, wallet_id, symbol, quantity, price, total_value_vnd):
+    def execute_trade(self, wallet_id, symbol, quantity, price, total_value_vnd, lot_id=None):
+        """Khớp 1 lệnh mua (quantity > 0) / bán. Giá vốn khi bán theo cost_method: AVG bình quân,
+        FIFO/LIFO trừ lô cũ/mới nhất trước; lot_id: bán đúng 1 lô (cần bật sổ lô). Trả về lãi chốt."""
         symbol = symbol.upper()
-        holding = self.execute_query("SELECT quantity, average_price, cost_basis_vnd FROM holdings WHERE wallet_id = ? AND symbol = ?", (wallet_id, symbol), fetch_one=True)
-        if quantity > 0:
-            self.execute_query("UPDATE wallets SET balance = balance - ? WHERE id = ?", (total_value_vnd, wallet_id))
-            if holding:
-                new_qty = holding['quantity'] + quantity
-                new_cost = holding['cost_basis_vnd'] + total_value_vnd
-                new_avg = (holding['quantity'] * holding['average_price'] + quantity * price) / new_qty
-                self.execute_query("UPDATE holdings SET quantity = ?, average_price = ?, current_price = ?, cost_basis_vnd = ? WHERE wallet_id = ? AND symbol = ?", (new_qty, new_avg, price, new_cost, wallet_id, symbol))
+        with self.transaction():
+            self.record_prices([(symbol, price)])
+            method = self.get_cost_method()
+            if lot_id is not None and method == 'AVG':
+                raise ValueError("Bán theo lô cần bật sổ lô trước: /lots fifo hoặc /lots lifo")
+            holding = self.execute_query("SELECT quantity, average_price, cost_basis_vnd FROM holdings WHERE wallet_id = ? AND symbol = ?", (wallet_id, symbol), fetch_one=True)
+            if quantity > 0:
+                self.execute_query("UPDATE wallets SET balance = balance - ? WHERE id = ?", (total_value_vnd, wallet_id))
+                if holding:
+                    new_qty = holding['quantity'] + quantity
+                    new_cost = holding['cost_basis_vnd'] + total_value_vnd
+                    new_avg = (holding['quantity'] * holding['average_price'] + quantity * price) / new_qty
+                    self.execute_query("UPDATE holdings SET quantity = ?, average_price = ?, current_price = ?, cost_basis_vnd = ? WHERE wallet_id = ? AND symbol = ?", (new_qty, new_avg, price, new_cost, wallet_id, symbol))
+                else:
+                    self.execute_query("INSERT INTO holdings (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd) VALUES (?, ?, ?, ?, ?, ?)", (wallet_id, symbol, quantity, price, price, total_value_vnd))
+                tx_id = self.execute_query("INSERT INTO transactions (wallet_id, type, symbol, quantity, price, amount, realized_pl) VALUES (?, 'MUA', ?, ?, ?, ?, 0)", (wallet_id, symbol, quantity, price, -total_value_vnd))
+                if method != 'AVG':
+                    self.execute_query("INSERT INTO lots (wallet_id, symbol, buy_tx_id, quantity, remaining, price, cost_vnd) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       (wallet_id, symbol, tx_id, quantity, quantity, price, total_value_vnd))
             else:
-                self.execute_query("INSERT INTO holdings (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd) VALUES (?, ?, ?, ?, ?, ?)", (wallet_id, symbol, quantity, price, price, total_value_vnd))
-            self.execute_query("INSERT INTO transactions (wallet_id, type, symbol, quantity, price, amount, realized_pl) VALUES (?, 'MUA', ?, ?, ?, ?, 0)", (wallet_id, symbol, quantity, price, -total_value_vnd))
+                abs_qty = abs(quantity)
+                if not holding: raise ValueError(f"Không có {symbol} trong ví {wallet_id} để bán")
+                self.execute_query("UPDATE wallets SET balance = balance + ? WHERE id = ?", (total_value_vnd, wallet_id))
+                matches, new_avg = None, holding['average_price']
+                if method == 'AVG':
+                    cost = abs_qty * (holding['cost_basis_vnd'] / holding['quantity'])
+                else:
+                    matches = self._match_lots(wallet_id, symbol, abs_qty, total_value_vnd, method, lot_id)
+                    cost = sum(m[2] for m in matches)
+                    if holding['quantity'] != abs_qty:
+                        new_avg = (holding['quantity'] * holding['average_price'] - sum(m[1] * m[6] for m in matches)) / (holding['quantity'] - abs_qty)
+                real_pl = total_value_vnd - cost
+                if holding['quantity'] == abs_qty:
+                    self.execute_query("DELETE FROM holdings WHERE wallet_id = ? AND symbol = ?", (wallet_id, symbol))
+                else:
+                    new_cost = holding['cost_basis_vnd'] - cost
+                    self.execute_query("UPDATE holdings SET quantity = quantity - ?, average_price = ?, current_price = ?, cost_basis_vnd = ? WHERE wallet_id = ? AND symbol = ?", (abs_qty, new_avg, price, new_cost, wallet_id, symbol))
+                tx_id = self.execute_query("INSERT INTO transactions (wallet_id, type, symbol, quantity, price, amount, realized_pl) VALUES (?, 'BAN', ?, ?, ?, ?, ?)", (wallet_id, symbol, abs_qty, price, total_value_vnd, real_pl))
+                if matches:
+                    self._close_lots(tx_id, matches)
+                return real_pl
+            return 0
+
+    # ==========================================
+    # SỔ LÔ (FIFO / LIFO / CHỈ ĐỊNH LÔ)
+    # ==========================================
+    def get_cost_method(self):
+        return self.get_setting('cost_method')
+
+    def set_cost_method(self, method):
+        """Đổi cách tính giá vốn. Bật sổ lô từ AVG thì dựng lại lô mở từ danh mục hiện tại (mỗi mã 1 lô mở đầu)."""
+        with self.transaction():
+            if method != 'AVG' and self.get_cost_method() == 'AVG':
+                self.seed_lots()
+            self.set_setting('cost_method', method)
+
+    def seed_lots(self):
+        # Lô cũ chỉ đóng lại (remaining = 0), không xóa: giữ lãi chốt của lô và các dòng lot_matches trỏ tới nó
+        with self.transaction() as conn:
+            conn.execute("UPDATE lots SET remaining = 0 WHERE remaining > 0")
+            conn.execute("""INSERT INTO lots (wallet_id, symbol, quantity, remaining, price, cost_vnd)
+                SELECT wallet_id, symbol, quantity, quantity, average_price, cost_basis_vnd FROM holdings
+                WHERE wallet_id IN ('STOCK', 'CRYPTO') AND quantity > 0 ORDER BY id""")
+
+    def _match_lots(self, wallet_id, symbol, quantity, proceeds_vnd, method, lot_id=None):
+        """Chọn phần lô bị trừ cho 1 lệnh bán: đọc dần theo chỉ mục lô mở, dừng ngay khi đủ số lượng.
+        -> [(lot_id, sl, giá vốn, tiền bán phân bổ, lãi chốt, sl còn lại, giá lô)]"""
+        conn = self.pool.connection()
+        if lot_id is not None:
+            cursor = conn.execute("SELECT id, quantity, remaining, price, cost_vnd FROM lots WHERE id = ? AND wallet_id = ? AND symbol = ? AND remaining > 0",
+                                  (lot_id, wallet_id, symbol))
         else:
-            abs_qty = abs(quantity)
-            self.execute_query("UPDATE wallets SET balance = balance + ? WHERE id = ?", (total_value_vnd, wallet_id))
-            cost_per_unit = holding['cost_basis_vnd'] / holding['quantity']
-            real_pl = total_value_vnd - (abs_qty * cost_per_unit)
-            if holding['quantity'] == abs_qty:
-                self.execute_query("DELETE FROM holdings WHERE wallet_id = ? AND symbol = ?", (wallet_id, symbol))
-            else:
-                new_cost = holding['cost_basis_vnd'] - (abs_qty * cost_per_unit)
-                self.execute_query("UPDATE holdings SET quantity = quantity - ?, current_price = ?, cost_basis_vnd = ? WHERE wallet_id = ? AND symbol = ?", (abs_qty, price, new_cost, wallet_id, symbol))
-            self.execute_query("INSERT INTO transactions (wallet_id, type, symbol, quantity, price, amount, realized_pl) VALUES (?, 'BAN', ?, ?, ?, ?, ?)", (wallet_id, symbol, abs_qty, price, total_value_vnd, real_pl))
-            return real_pl
-        return 0
+            order = 'DESC' if method == 'LIFO' else 'ASC'
+            cursor = conn.execute(f"SELECT id, quantity, remaining, price, cost_vnd FROM lots WHERE wallet_id = ? AND symbol = ? AND remaining > 0 ORDER BY id {order}",
+                                  (wallet_id, symbol))
+        matches, left = [], quantity
+        for lot in cursor:
+            take = min(left, lot['remaining'])
+            cost = take * lot['cost_vnd'] / lot['quantity']
+            proceeds = proceeds_vnd * take / quantity
+            rest = lot['remaining'] - take
+            matches.append((lot['id'], take, cost, proceeds, proceeds - cost, rest if rest > 1e-9 else 0, lot['price']))
+            left -= take
+            if left <= 1e-9: break
+        cursor.close()
+        if left > 1e-9:
+            where = f"lô #{lot_id}" if lot_id is not None else "các lô đang mở"
+            raise ValueError(f"{where} của {symbol} không đủ {quantity:,.8g} để bán")
+        return matches
+
+    def _close_lots(self, sell_tx_id, matches):
+        conn = self.pool.connection()
+        conn.executemany("UPDATE lots SET remaining = ?, realized_pl = realized_pl + ? WHERE id = ?",
+                         [(m[5], m[4], m[0]) for m in matches])
+        conn.executemany("INSERT INTO lot_matches (sell_tx_id, lot_id, quantity, cost_vnd, proceeds_vnd, realized_pl) VALUES (?, ?, ?, ?, ?, ?)",
+                         [(sell_tx_id,) + m[:5] for m in matches])
+
+    def get_open_lots(self, symbol=None, limit=50):
+        """Lô đang mở (mới nhất trước), lọc theo mã nếu có"""
+        if symbol:
+            return self.execute_query("SELECT * FROM lots WHERE symbol = ? AND remaining > 0 ORDER BY id DESC LIMIT ?", (symbol.upper(), limit), fetch_all=True)
+        return self.execute_query("SELECT * FROM lots WHERE remaining > 0 ORDER BY id DESC LIMIT ?", (limit,), fetch_all=True)
+
+    def get_lot_pnl(self, symbol=None, limit=20):
+        """Lãi/lỗ đã chốt lưu sẵn trên từng lô (không duyệt lại lịch sử)"""
+        if symbol:
+            return self.execute_query("SELECT * FROM lots WHERE symbol = ? AND realized_pl != 0 ORDER BY id DESC LIMIT ?", (symbol.upper(), limit), fetch_all=True)
+        return self.execute_query("SELECT * FROM lots WHERE realized_pl != 0 ORDER BY id DESC LIMIT ?", (limit,), fetch_all=True)
+
+    def record_prices(self, quotes, ts=None):
+        """Ghi lịch sử giá: quotes gồm (mã, giá). ts None = thời điểm ghi"""
+        self.execute_many("INSERT INTO prices (symbol, ts, price) VALUES (?, COALESCE(?, strftime('%Y-%m-%d %H:%M:%f', 'now')), ?)",
+                          [(symbol.upper(), ts, price) for symbol, price in quotes])
+
+    def update_market_prices(self, quotes):
+        """Cập nhật giá nhiều mã trong 1 transaction (up VPB 25 FPT 110 ...)"""
+        with self.transaction():
+            self.record_prices(quotes)
 
     def update_market_price(self, symbol, new_price):
-        self.execute_query("UPDATE holdings SET current_price = ? WHERE symbol = ?", (new_price, symbol.upper()))
+        self.update_market_prices([(symbol, new_price)])
+
+    def get_latest_prices(self, symbols):
+        """{mã: giá mới nhất} trong 1 câu lệnh: mỗi mã 1 lần tra chỉ mục (symbol, ts); mã chưa có giá nào thì bỏ qua"""
+        symbols = list({s.upper() for s in symbols})
+        if not symbols: return {}
+        values = ', '.join(['(?)'] * len(symbols))
+        rows = self.execute_query(f"""WITH s(symbol) AS (VALUES {values})
+            SELECT s.symbol, {LATEST_PRICE.format(symbol='s.symbol')} AS price FROM s""", tuple(symbols), fetch_all=True)
+        return {r['symbol']: r['price'] for r in rows if r['price'] is not None}
+
+    def get_held_symbols(self, wallets=('STOCK', 'CRYPTO')):
+        """{mã: ví} các mã đang nắm giữ trong ví có giá thị trường (tài sản khác tự định giá nên bỏ qua)"""
+        marks = ', '.join('?' * len(wallets))
+        rows = self.execute_query(f"SELECT DISTINCT symbol, wallet_id FROM holdings WHERE wallet_id IN ({marks}) AND quantity > 0", tuple(wallets), fetch_all=True)
+        return {r['symbol']: r['wallet_id'] for r in rows}
 
     def update_other_asset(self, symbol, current_val):
         symbol = symbol.upper()
-        wallet_cash = self.execute_query("SELECT balance FROM wallets WHERE id = 'CASH'", fetch_one=True)
-        if wallet_cash and wallet_cash['balance'] >= current_val:
-            self.transfer_funds('CASH', 'OTHER', current_val)
-        else:
-            diff = current_val - (wallet_cash['balance'] if wallet_cash else 0)
-            self.update_cash_balance(diff, 'NAP')
-            self.transfer_funds('CASH', 'OTHER', current_val)
-        self.execute_query("UPDATE wallets SET balance = 0 WHERE id = 'OTHER'")
-        self.execute_query("INSERT OR REPLACE INTO holdings (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd) VALUES ('OTHER', ?, 1, ?, ?, ?)", (symbol, current_val, current_val, current_val))
+        with self.transaction():
+            wallet_cash = self.execute_query("SELECT balance FROM wallets WHERE id = 'CASH'", fetch_one=True)
+            if wallet_cash and wallet_cash['balance'] >= current_val:
+                self.transfer_funds('CASH', 'OTHER', current_val)
+            else:
+                diff = current_val - (wallet_cash['balance'] if wallet_cash else 0)
+                self.update_cash_balance(diff, 'NAP')
+                self.transfer_funds('CASH', 'OTHER', current_val)
+            self.execute_query("UPDATE wallets SET balance = 0 WHERE id = 'OTHER'")
+            self.record_prices([(symbol, current_val)])
+            self.execute_query("INSERT OR REPLACE INTO holdings (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd) VALUES ('OTHER', ?, 1, ?, ?, ?)", (symbol, current_val, current_val, current_val))
+
+    # ==========================================
+    # LÔ LỆNH (NHIỀU DÒNG / 1 TRANSACTION)
+    # ==========================================
+    def apply_batch(self, ops):
+        """Áp dụng cả lô lệnh trong 1 transaction, kết quả y như chạy lần lượt từng lệnh đơn.
+        ops: ('TRADE', ví, mã, sl, giá, tổng_vnd) | ('PRICE', mã, giá) | ('CASH', số_tiền_có_dấu, loại) | ('TRANSFER', từ_ví, tới_ví, số_tiền)
+        Sổ được tính trên bộ nhớ rồi ghi 1 lượt bằng executemany. Trả về list kết quả từng lệnh (lãi chốt với lệnh bán)."""
+        symbols = sorted({op[2].upper() for op in ops if op[0] == 'TRADE'})
+        if symbols and self.get_cost_method() != 'AVG':
+            return self._apply_sequential(ops)
+        with self.transaction() as conn:
+            holdings, existed = {}, set()
+            if symbols:
+                marks = ",".join("?" * len(symbols))
+                for r in conn.execute(f"SELECT wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd FROM holdings WHERE symbol IN ({marks})", symbols):
+                    key = (r['wallet_id'], r['symbol'])
+                    holdings[key] = dict(r)
+                    existed.add(key)
+            wallet_delta = {}   # ví -> [balance, total_in, total_out]
+            def move(wid, balance=0, total_in=0, total_out=0):
+                d = wallet_delta.setdefault(wid, [0, 0, 0])
+                d[0] += balance; d[1] += total_in; d[2] += total_out
+
+            tx_rows, prices, touched, deleted, results = [], [], {}, set(), []
+            for op in ops:
+                kind = op[0]
+                if kind == 'PRICE':
+                    prices.append((op[1], op[2]))
+                    results.append(None)
+                elif kind == 'CASH':
+                    amount, tx_type = op[1], op[2]
+                    if amount > 0: move('CASH', amount, total_in=amount)
+                    else: move('CASH', amount, total_out=abs(amount))
+                    tx_rows.append(('CASH', tx_type, None, 0, 0, amount, 0))
+                    results.append(None)
+                elif kind == 'TRANSFER':
+                    src, dst, amount = op[1], op[2], op[3]
+                    move(src, -amount, total_out=amount if src != 'CASH' else 0)
+                    move(dst, amount, total_in=amount)
+                    tx_rows.append((dst, 'CHUYEN_IN', None, 0, 0, amount, 0))
+                    results.append(None)
+                else:
+                    _, wid, sym, qty, price, total = op
+                    sym = sym.upper()
+                    key = (wid, sym)
+                    h = holdings.get(key)
+                    prices.append((sym, price))
+                    if qty > 0:
+                        move(wid, -total)
+                        if h:
+                            new_qty = h['quantity'] + qty
+                            h['average_price'] = (h['quantity'] * h['average_price'] + qty * price) / new_qty
+                            h['quantity'], h['current_price'] = new_qty, price
+                            h['cost_basis_vnd'] += total
+                            touched[key] = h
+                        else:
+                            # Dòng mới: xếp cuối để id tăng đúng thứ tự tạo như khi chạy từng lệnh
+                            h = holdings[key] = {'wallet_id': wid, 'symbol': sym, 'quantity': qty, 'average_price': price, 'current_price': price, 'cost_basis_vnd': total}
+                            touched.pop(key, None)
+                            touched[key] = h
+                        tx_rows.append((wid, 'MUA', sym, qty, price, -total, 0))
+                        results.append(0)
+                    else:
+                        if not h: raise ValueError(f"Không có {sym} trong ví {wid} để bán")
+                        abs_qty = abs(qty)
+                        move(wid, total)
+                        cost_per_unit = h['cost_basis_vnd'] / h['quantity']
+                        real_pl = total - (abs_qty * cost_per_unit)
+                        if h['quantity'] == abs_qty:
+                            holdings[key] = None
+                            touched.pop(key, None)
+                            if key in existed: deleted.add(key)
+                        else:
+                            h['quantity'] -= abs_qty
+                            h['current_price'] = price
+                            h['cost_basis_vnd'] -= abs_qty * cost_per_unit
+                            touched[key] = h
+                        tx_rows.append((wid, 'BAN', sym, abs_qty, price, total, real_pl))
+                        results.append(real_pl)
+
+            if prices:
+                self.record_prices(prices)
+            if deleted:
+                conn.executemany("DELETE FROM holdings WHERE wallet_id = ? AND symbol = ?", sorted(deleted))
+            if touched:
+                conn.executemany("""INSERT INTO holdings (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(wallet_id, symbol) DO UPDATE SET quantity = excluded.quantity, average_price = excluded.average_price,
+                        current_price = excluded.current_price, cost_basis_vnd = excluded.cost_basis_vnd""",
+                    [(h['wallet_id'], h['symbol'], h['quantity'], h['average_price'], h['current_price'], h['cost_basis_vnd']) for h in touched.values()])
+            if wallet_delta:
+                conn.executemany("UPDATE wallets SET balance = balance + ?, total_in = total_in + ?, total_out = total_out + ? WHERE id = ?",
+                    [(b, i, o, wid) for wid, (b, i, o) in wallet_delta.items()])
+            if tx_rows:
+                conn.executemany("INSERT INTO transactions (wallet_id, type, symbol, quantity, price, amount, realized_pl) VALUES (?, ?, ?, ?, ?, ?, ?)", tx_rows)
+        return results
+
+    def _apply_sequential(self, ops):
+        """Lô lệnh khi bật sổ lô: chạy lần lượt từng lệnh đơn (lệnh bán cần đọc lô theo chỉ mục), vẫn trong 1 transaction"""
+        results = []
+        with self.transaction():
+            for op in ops:
+                kind = op[0]
+                if kind == 'PRICE':
+                    self.record_prices([(op[1], op[2])])
+                    results.append(None)
+                elif kind == 'CASH':
+                    self.update_cash_balance(op[1], op[2])
+                    results.append(None)
+                elif kind == 'TRANSFER':
+                    self.transfer_funds(op[1], op[2], op[3])
+                    results.append(None)
+                else:
+                    _, wid, sym, qty, price, total = op
+                    results.append(self.execute_trade(wid, sym, qty, price, total))
+        return results
 
     def get_dashboard_data(self):
         return {
             "wallets": self.execute_query("SELECT * FROM wallets", fetch_all=True),
-            "holdings": self.execute_query("SELECT * FROM holdings", fetch_all=True),
-            "realized": {r['wallet_id']: (r['total'] or 0) for r in self.execute_query("SELECT wallet_id, SUM(realized_pl) as total FROM transactions GROUP BY wallet_id", fetch_all=True)},
-            "perf_symbols": self.execute_query("SELECT wallet_id, symbol, SUM(realized_pl) as realized, SUM(CASE WHEN type='MUA' THEN ABS(amount) ELSE 0 END) as total_invested FROM transactions WHERE symbol IS NOT NULL GROUP BY wallet_id, symbol", fetch_all=True),
-            "goal": self.execute_query("SELECT value FROM settings WHERE key = 'goal'", fetch_one=True)['value']
+            "holdings": self.execute_query(HOLDINGS_VALUED, fetch_all=True),
+            "realized": {r['wallet_id']: (r['realized_pl'] or 0) for r in self.execute_query("SELECT wallet_id, realized_pl FROM wallet_pnl", fetch_all=True)},
+            "perf_symbols": self.execute_query("SELECT wallet_id, symbol, realized_pl as realized, buy_total as total_invested FROM symbol_pnl", fetch_all=True),
+            "trade_stats": {wid: self.get_trade_stats(wid) for wid in ('STOCK', 'CRYPTO')},
+            "goal": self.get_setting('goal')
+        }
+
+    def get_trade_stats(self, wallet_id, top_n=3):
+        """Thống kê giao dịch 1 ví lấy thẳng từ bảng tổng hợp: tổng mua/bán + top N mã lãi/lỗ chốt"""
+        totals = self.execute_query("SELECT buy_total, sell_total FROM wallet_pnl WHERE wallet_id = ?", (wallet_id,), fetch_one=True) or {}
+        gainers = self.execute_query("SELECT symbol, realized_pl FROM symbol_pnl WHERE wallet_id = ? AND realized_pl > 0 ORDER BY realized_pl DESC, symbol LIMIT ?", (wallet_id, top_n), fetch_all=True)
+        losers = self.execute_query("SELECT symbol, realized_pl FROM symbol_pnl WHERE wallet_id = ? AND realized_pl < 0 ORDER BY realized_pl ASC, symbol LIMIT ?", (wallet_id, top_n), fetch_all=True)
+        return {
+            'total_buy': totals.get('buy_total') or 0,
+            'total_sell': totals.get('sell_total') or 0,
+            'top_gainers': tuple((r['symbol'], r['realized_pl']) for r in gainers),
+            'top_losers': tuple((r['symbol'], r['realized_pl']) for r in losers),
         }
 
+    def get_snapshot(self):
+        """Snapshot dùng chung theo data version: giữa 2 lần ghi không chạm vào SQLite"""
+        pool = self.pool
+        snap = pool.snapshot
+        if snap is not None and snap.version == pool.version:
+            return snap
+        with pool.snapshot_lock:
+            # Đọc version TRƯỚC khi đọc dữ liệu: có lệnh ghi chen vào thì lần sau sẽ dựng lại
+            version = pool.version
+            snap = pool.snapshot
+            if snap is None or snap.version != version:
+                with self.transaction(readonly=True):
+                    data = self.get_dashboard_data()
+                snap = pool.snapshot = PortfolioSnapshot.build(version, data, self.get_setting('crypto_rate'))
+        return snap
+
+    # ==========================================
+    # BẢNG TỔNG HỢP (SỬA CHỮA / DỰNG LẠI)
+    # ==========================================
+    def rebuild_tx_counters(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM tx_counters")
+            conn.execute("INSERT INTO tx_counters (scope, total) SELECT 'ALL', COUNT(*) FROM transactions")
+            conn.execute("INSERT INTO tx_counters (scope, total) SELECT 'W:' || wallet_id, COUNT(*) FROM transactions WHERE wallet_id IS NOT NULL GROUP BY wallet_id")
+            conn.execute("INSERT INTO tx_counters (scope, total) SELECT 'S:' || symbol, COUNT(*) FROM transactions WHERE symbol IS NOT NULL GROUP BY symbol")
+
+    def rebuild_pnl_aggregates(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM wallet_pnl")
+            conn.execute("DELETE FROM symbol_pnl")
+            conn.execute("""INSERT INTO wallet_pnl (wallet_id, realized_pl, buy_total, sell_total, trade_count)
+                SELECT wallet_id, SUM(COALESCE(realized_pl, 0)),
+                       SUM(CASE WHEN type = 'MUA' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(CASE WHEN type = 'BAN' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(type IN ('MUA', 'BAN'))
+                FROM transactions WHERE wallet_id IS NOT NULL GROUP BY wallet_id""")
+            conn.execute("""INSERT INTO symbol_pnl (wallet_id, symbol, realized_pl, buy_total, sell_total, trade_count)
+                SELECT wallet_id, symbol, SUM(COALESCE(realized_pl, 0)),
+                       SUM(CASE WHEN type = 'MUA' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(CASE WHEN type = 'BAN' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(type IN ('MUA', 'BAN'))
+                FROM transactions WHERE symbol IS NOT NULL GROUP BY wallet_id, symbol""")
+
+    def rebuild_search_index(self):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+    def rebuild_nav_rollups(self):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM nav_rollups")
+            # Cập nhật "rỗng" từng dòng NAV: trigger tự gộp lại tuần/tháng
+            conn.execute("UPDATE nav_snapshots SET day = day")
+
+    def rebuild_period_flows(self):
+        """Dựng bảng gộp tháng từ transactions (1 lượt GROUP BY), bảng gộp năm từ chính các dòng tháng"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM period_flows")
+            conn.execute("""INSERT INTO period_flows (period, bucket, wallet_id, symbol, buy_total, sell_total, realized_pl, deposit, withdraw, transfer_in, trade_count)
+                SELECT 'M', substr(timestamp, 1, 7), wallet_id, COALESCE(symbol, ''),
+                       SUM(CASE WHEN type = 'MUA' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(CASE WHEN type = 'BAN' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(COALESCE(realized_pl, 0)),
+                       SUM(CASE WHEN type = 'NAP' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(CASE WHEN type = 'RUT' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(CASE WHEN type = 'CHUYEN_IN' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+                       SUM(type IN ('MUA', 'BAN'))
+                FROM transactions WHERE wallet_id IS NOT NULL AND timestamp IS NOT NULL
+                GROUP BY 2, 3, 4""")
+            conn.execute("""INSERT INTO period_flows (period, bucket, wallet_id, symbol, buy_total, sell_total, realized_pl, deposit, withdraw, transfer_in, trade_count)
+                SELECT 'Y', substr(bucket, 1, 4), wallet_id, symbol, SUM(buy_total), SUM(sell_total), SUM(realized_pl),
+                       SUM(deposit), SUM(withdraw), SUM(transfer_in), SUM(trade_count)
+                FROM period_flows WHERE period = 'M' GROUP BY 2, 3, 4""")
+
+    def rebuild_aggregates(self):
+        """Dựng lại toàn bộ bảng đếm/tổng hợp từ sổ transactions (lệnh /rebuild)"""
+        with self.transaction():
+            self.rebuild_tx_counters()
+            self.rebuild_pnl_aggregates()
+            self.rebuild_period_flows()
+            self.rebuild_nav_rollups()
+            self.rebuild_search_index()
+
+    # ==========================================
+    # NAV THEO NGÀY / TUẦN / THÁNG
+    # ==========================================
+    def record_nav(self, day, nav):
+        """Ghi đè NAV ngày `day` ({ví: (tài sản, vốn gốc, lãi/lỗ)}); trigger cập nhật bảng gộp tuần/tháng"""
+        with self.transaction(quiet=True):
+            self.execute_many("""INSERT INTO nav_snapshots (wallet_id, day, assets, book_value, pnl) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(wallet_id, day) DO UPDATE SET assets = excluded.assets, book_value = excluded.book_value, pnl = excluded.pnl""",
+                [(wid, day, assets, book, pnl) for wid, (assets, book, pnl) in nav.items()])
+
+    def get_nav_series(self, wallet_id='TOTAL', start=None, end=None, limit=None):
+        """Chuỗi NAV theo ngày trong [start, end] (YYYY-MM-DD), cũ -> mới. limit: chỉ lấy N ngày gần nhất"""
+        rows = self.execute_query("""SELECT day, assets, book_value, pnl FROM nav_snapshots
+            WHERE wallet_id = ? AND day >= COALESCE(?, '') AND day <= COALESCE(?, '9999') ORDER BY day DESC LIMIT ?""",
+            (wallet_id, start, end, -1 if limit is None else limit), fetch_all=True)
+        return rows[::-1]
+
+    def get_nav_rollups(self, period='M', wallet_id='TOTAL', limit=12):
+        """N kỳ gần nhất của bảng gộp ('W' tuần / 'M' tháng), cũ -> mới"""
+        rows = self.execute_query("SELECT * FROM nav_rollups WHERE period = ? AND wallet_id = ? ORDER BY bucket DESC LIMIT ?",
+                                  (period, wallet_id, limit), fetch_all=True)
+        return rows[::-1]
+
+    # ==========================================
+    # BÁO CÁO THEO KỲ (THÁNG / NĂM)
+    # ==========================================
+    def get_period_flows(self, period, start, end):
+        """Tổng hợp các kỳ bucket trong [start, end] của bảng gộp ('M' YYYY-MM / 'Y' YYYY), không đụng tới transactions.
+        -> {'wallets': tổng theo ví, 'symbols': theo (ví, mã) có giao dịch, lãi chốt giảm dần}"""
+        cols = """SUM(buy_total) AS buy_total, SUM(sell_total) AS sell_total, SUM(realized_pl) AS realized_pl,
+            SUM(deposit) AS deposit, SUM(withdraw) AS withdraw, SUM(transfer_in) AS transfer_in, SUM(trade_count) AS trade_count"""
+        with self.transaction(readonly=True):
+            wallets = self.execute_query(f"SELECT wallet_id, {cols} FROM period_flows WHERE period = ? AND bucket BETWEEN ? AND ? GROUP BY wallet_id",
+                                         (period, start, end), fetch_all=True)
+            symbols = self.execute_query(f"""SELECT wallet_id, symbol, {cols} FROM period_flows
+                WHERE period = ? AND bucket BETWEEN ? AND ? AND symbol != '' GROUP BY wallet_id, symbol
+                HAVING SUM(trade_count) > 0 OR SUM(realized_pl) != 0 ORDER BY SUM(realized_pl) DESC, symbol""",
+                (period, start, end), fetch_all=True)
+        return {'wallets': wallets, 'symbols': symbols}
+
     # ==========================================
     # IMPORT / CHỐT SỔ
     # ==========================================
     def clear_all_data(self):
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM transactions")
-            cursor.execute("DELETE FROM holdings")
-            cursor.execute("UPDATE wallets SET balance = 0, total_in = 0, total_out = 0")
-            conn.commit()
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM transactions")
+            conn.execute("DELETE FROM holdings")
+            conn.execute("DELETE FROM wallet_pnl")
+            conn.execute("DELETE FROM symbol_pnl")
+            conn.execute("DELETE FROM period_flows")
+            conn.execute("DELETE FROM lots")
+            conn.execute("DELETE FROM lot_matches")
+            conn.execute("UPDATE wallets SET balance = 0, total_in = 0, total_out = 0")
 
     def force_update_wallet(self, wallet_id, balance, total_in, total_out):
         self.execute_query("UPDATE wallets SET balance = ?, total_in = ?, total_out = ? WHERE id = ?", (balance, total_in, total_out, wallet_id))
@@ -121,58 +740,103 @@ class DatabaseRepo:
         self.execute_query(query, (wallet_id, amount, note))
         
     def insert_raw_transaction(self, wallet_id, tx_type, amount, date_str, note):
-        query = "INSERT INTO transactions (wallet_id, type, amount, note) VALUES (?, ?, ?, ?)"
-        self.execute_query(query, (wallet_id, tx_type, amount, f"[{date_str}] {note}"))
+        # Ngày đọc được thì ghi luôn vào timestamp để lọc theo khoảng ngày; note giữ nguyên dạng "[ngày] ghi chú"
+        query = "INSERT INTO transactions (wallet_id, type, amount, timestamp, note) VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)"
+        self.execute_query(query, (wallet_id, tx_type, amount, parse_ledger_date(date_str), f"[{date_str}] {note}"))
+
+    def insert_ledger_rows(self, rows):
+        """Ghi hàng loạt dòng lịch sử import: rows gồm (wallet_id, type, symbol, quantity, price, amount, realized_pl, timestamp, note).
+        timestamp None = thời điểm ghi."""
+        self.execute_many("""INSERT INTO transactions (wallet_id, type, symbol, quantity, price, amount, realized_pl, timestamp, note)
+            VALUES (?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP), ?)""", rows)
+
+    def insert_holdings(self, rows):
+        """rows gồm (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd)"""
+        self.execute_many("INSERT INTO holdings (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd) VALUES (?, ?, ?, ?, ?, ?)", rows)
 
     # ==========================================
     # MODULE LỊCH SỬ & HOÀN TIỀN (NEW)
     # ==========================================
-    def get_transactions_paginated(self, limit=5, offset=0, filter_type='ALL', symbol=None):
-        query = "SELECT * FROM transactions WHERE 1=1"
+    def _history_where(self, filter_type, symbol, search, date_from, date_to):
+        """Điều kiện lọc lịch sử dùng chung cho trang & đếm. search: biểu thức MATCH của FTS5; [date_from, date_to)"""
+        query = " WHERE 1=1"
         params = []
-        
+        if search:
+            query += " AND transactions_fts MATCH ?"
+            params.append(search)
         if symbol:
-            query += " AND symbol = ?"
+            query += " AND t.symbol = ?"
             params.append(symbol.upper())
         elif filter_type in ['CASH', 'STOCK', 'CRYPTO', 'OTHER']:
-            query += " AND wallet_id = ?"
+            query += " AND t.wallet_id = ?"
             params.append(filter_type)
-            
-        query += " ORDER BY id DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+        if date_from:
+            query += " AND t.timestamp >= ?"
+            params.append(date_from)
+        if date_to:
+            query += " AND t.timestamp < ?"
+            params.append(date_to)
+        return query, params
+
+    def get_transactions_paginated(self, limit=5, offset=0, filter_type='ALL', symbol=None, before_id=None, after_id=None,
+                                   search=None, date_from=None, date_to=None):
+        """Phân trang lịch sử. Truyền before_id/after_id để dùng keyset (id < / id > mốc) thay cho OFFSET.
+        Có search thì duyệt chỉ mục FTS theo rowid giảm dần và dừng ngay khi đủ 1 trang."""
+        if search:
+            query, key = "SELECT t.* FROM transactions_fts JOIN transactions t ON t.id = transactions_fts.rowid", "transactions_fts.rowid"
+        else:
+            query, key = "SELECT t.* FROM transactions t", "t.id"
+        where, params = self._history_where(filter_type, symbol, search, date_from, date_to)
+        query += where
+
+        if before_id is not None:
+            query += f" AND {key} < ? ORDER BY {key} DESC LIMIT ?"
+            params.extend([before_id, limit])
+        elif after_id is not None:
+            # Lùi về trang mới hơn: lấy tăng dần rồi đảo lại cho đúng thứ tự hiển thị
+            query += f" AND {key} > ? ORDER BY {key} ASC LIMIT ?"
+            params.extend([after_id, limit])
+            return self.execute_query(query, tuple(params), fetch_all=True)[::-1]
+        else:
+            query += f" ORDER BY {key} DESC LIMIT ? OFFSET ?"
+            params.extend([limit, offset])
         return self.execute_query(query, tuple(params), fetch_all=True)
 
-    def get_transactions_count(self, filter_type='ALL', symbol=None):
-        query = "SELECT COUNT(*) as total FROM transactions WHERE 1=1"
-        params = []
+    def get_transactions_count(self, filter_type='ALL', symbol=None, search=None, date_from=None, date_to=None):
+        if search or date_from or date_to:
+            # Tìm kiếm: đếm trên chỉ mục FTS / timestamp (không có bộ đếm sẵn cho điều kiện tùy ý)
+            source = "transactions_fts JOIN transactions t ON t.id = transactions_fts.rowid" if search else "transactions t"
+            where, params = self._history_where(filter_type, symbol, search, date_from, date_to)
+            return self.execute_query(f"SELECT COUNT(*) AS total FROM {source}{where}", tuple(params), fetch_one=True)['total']
         if symbol:
-            query += " AND symbol = ?"
-            params.append(symbol.upper())
+            scope = f"S:{symbol.upper()}"
         elif filter_type in ['CASH', 'STOCK', 'CRYPTO', 'OTHER']:
-            query += " AND wallet_id = ?"
-            params.append(filter_type)
-            
-        res = self.execute_query(query, tuple(params), fetch_one=True)
+            scope = f"W:{filter_type}"
+        else:
+            scope = 'ALL'
+        res = self.execute_query("SELECT total FROM tx_counters WHERE scope = ?", (scope,), fetch_one=True)
         return res['total'] if res else 0
 
     def delete_holding_and_refund(self, symbol):
         symbol = symbol.upper()
-        holding = self.execute_query("SELECT * FROM holdings WHERE symbol = ?", (symbol,), fetch_one=True)
+        with self.transaction():
+            holding = self.execute_query("SELECT * FROM holdings WHERE symbol = ?", (symbol,), fetch_one=True)
         
-        if not holding:
-            return False, f"⚠️ Lỗi: Không tìm thấy mã **{symbol}** trong danh mục hiện tại."
+            if not holding:
+                return False, f"⚠️ Lỗi: Không tìm thấy mã **{symbol}** trong danh mục hiện tại."
             
-        wallet_id = holding['wallet_id']
-        cost_basis = holding['cost_basis_vnd']
+            wallet_id = holding['wallet_id']
+            cost_basis = holding['cost_basis_vnd']
         
-        # 1. Hoàn tiền lại vào Sức mua của ví
-        self.execute_query("UPDATE wallets SET balance = balance + ? WHERE id = ?", (cost_basis, wallet_id))
+            # 1. Hoàn tiền lại vào Sức mua của ví
+            self.execute_query("UPDATE wallets SET balance = balance + ? WHERE id = ?", (cost_basis, wallet_id))
         
-        # 2. Xóa sổ
-        self.execute_query("DELETE FROM holdings WHERE wallet_id = ? AND symbol = ?", (wallet_id, symbol))
+            # 2. Xóa sổ (cả các lô còn mở của mã này)
+            self.execute_query("DELETE FROM holdings WHERE wallet_id = ? AND symbol = ?", (wallet_id, symbol))
+            self.execute_query("UPDATE lots SET remaining = 0 WHERE wallet_id = ? AND symbol = ? AND remaining > 0", (wallet_id, symbol))
         
-        # 3. Ghi log lịch sử hoàn tiền
-        self.execute_query("INSERT INTO transactions (wallet_id, type, amount, note) VALUES (?, 'HOAN_TIEN', ?, ?)", 
-                           (wallet_id, cost_basis, f"Đã xóa mã {symbol} do gõ nhầm và hoàn vốn gốc"))
+            # 3. Ghi log lịch sử hoàn tiền
+            self.execute_query("INSERT INTO transactions (wallet_id, type, amount, note) VALUES (?, 'HOAN_TIEN', ?, ?)", 
+                               (wallet_id, cost_basis, f"Đã xóa mã {symbol} do gõ nhầm và hoàn vốn gốc"))
                            
-        return True, f"🗑️ **ĐÃ XÓA MÃ {symbol}**\n━━━━━━━━━━━━━━━━━━━\n✅ Hoàn trả lại Sức mua: **+ {cost_basis:,.0f} đ** vào ví {wallet_id}.\n(Dòng tiền đã được cân bằng lại an toàn)"
+            return True, f"🗑️ **ĐÃ XÓA MÃ {symbol}**\n━━━━━━━━━━━━━━━━━━━\n✅ Hoàn trả lại Sức mua: **+ {cost_basis:,.0f} đ** vào ví {wallet_id}.\n(Dòng tiền đã được cân bằng lại an toàn)"
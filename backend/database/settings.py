@@ -0,0 +1,19 @@
+# backend/database/settings.py
+# Bảng settings (key/value TEXT) có kiểu: đọc 1 lần mỗi shard rồi phục vụ từ RAM, ghi xuyên xuống SQLite.
+from config import RATE_CRYPTO
+
+# Giá trị mặc định quyết định kiểu của khóa (float/str); khóa lạ (từ file import) giữ nguyên chuỗi
+SETTING_DEFAULTS = {
+    'crypto_rate': float(RATE_CRYPTO),
+    'goal': 'lai 10%',
+    'cost_method': 'AVG',
+}
+
+def coerce_setting(key, value):
+    """Giá trị TEXT trong SQLite -> đúng kiểu của khóa; rỗng / hỏng -> mặc định"""
+    default = SETTING_DEFAULTS.get(key)
+    if value is None: return default
+    if isinstance(default, float):
+        try: return float(value)
+        except (TypeError, ValueError): return default
+    return str(value)
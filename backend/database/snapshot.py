@@ -0,0 +1,40 @@
+# backend/database/snapshot.py
+from collections import namedtuple
+from types import MappingProxyType
+from backend.core.metrics import compute_wallet_metrics
+
+_SnapshotBase = namedtuple('_SnapshotBase', 'version wallets holdings holdings_by_wallet realized perf_symbols trade_stats goal crypto_rate memo')
+
+class PortfolioSnapshot(_SnapshotBase):
+    """Ảnh chụp bất biến của danh mục tại 1 data version.
+    Dashboard / Stock / Crypto đọc chung 1 object cho tới khi có lệnh ghi mới."""
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, version, data, crypto_rate):
+        wallets = {w['id']: MappingProxyType(w) for w in data['wallets']}
+        holdings = tuple(MappingProxyType(h) for h in data['holdings'])
+        by_wallet = {}
+        for h in holdings:
+            by_wallet.setdefault(h['wallet_id'], []).append(h)
+        return cls(
+            version=version,
+            wallets=MappingProxyType(wallets),
+            holdings=holdings,
+            holdings_by_wallet=MappingProxyType({wid: tuple(hs) for wid, hs in by_wallet.items()}),
+            realized=MappingProxyType(dict(data['realized'])),
+            perf_symbols=tuple(MappingProxyType(p) for p in data['perf_symbols']),
+            trade_stats=MappingProxyType({wid: MappingProxyType(st) for wid, st in data['trade_stats'].items()}),
+            goal=data['goal'],
+            crypto_rate=crypto_rate,
+            memo={},
+        )
+
+    def wallet_metrics(self, wallet_id, price_fallback=False):
+        """Chỉ số danh mục (NumPy) của 1 ví, tính 1 lần cho mỗi snapshot"""
+        key = (wallet_id, price_fallback)
+        pm = self.memo.get(key)
+        if pm is None:
+            fx = self.crypto_rate if wallet_id == 'CRYPTO' else 1
+            pm = self.memo[key] = compute_wallet_metrics(self.holdings_by_wallet.get(wallet_id, ()), fx, price_fallback)
+        return pm
@@ -0,0 +1,60 @@
+# backend/database/test_pagination.py
+# Phân trang lịch sử theo keyset (before_id / after_id) phải cho đúng các dòng như OFFSET, kể cả khi sổ đổi giữa chừng.
+import pytest
+
+PAGE = 5
+
+@pytest.fixture
+def ledger(db):
+    db.update_cash_balance(10**10, 'NAP')
+    db.transfer_funds('CASH', 'STOCK', 10**9)
+    for i in range(20):
+        sym = ('FPT', 'VPB')[i % 2]
+        db.execute_trade('STOCK', sym, 100, 20_000 + i, 100 * (20_000 + i))
+    db.update_cash_balance(10**6, 'RUT')
+    return db
+
+def _ids(rows):
+    return [r['id'] for r in rows]
+
+def _walk(db, **filters):
+    """Đi hết các trang bằng mốc id của dòng cuối trang trước"""
+    pages = [db.get_transactions_paginated(PAGE, **filters)]
+    while pages[-1]:
+        pages.append(db.get_transactions_paginated(PAGE, before_id=pages[-1][-1]['id'], **filters))
+    return [_ids(p) for p in pages[:-1]]
+
+@pytest.mark.parametrize('filters', [{}, {'filter_type': 'STOCK'}, {'filter_type': 'CASH'}, {'symbol': 'FPT'}])
+def test_keyset_pages_match_offset(ledger, filters):
+    total = ledger.get_transactions_count(**filters)
+    offset_pages = [_ids(ledger.get_transactions_paginated(PAGE, n * PAGE, **filters)) for n in range(-(-total // PAGE))]
+    assert _walk(ledger, **filters) == offset_pages
+    assert sum(map(len, offset_pages)) == total
+
+def test_pages_forward_and_back_across_delete(ledger):
+    first = _ids(ledger.get_transactions_paginated(PAGE))
+    second = _ids(ledger.get_transactions_paginated(PAGE, before_id=first[-1]))
+    # Đang xem trang 2 thì xóa 1 dòng của trang 1 và 1 dòng cũ hơn trang 2
+    ledger.execute_query("DELETE FROM transactions WHERE id IN (?, ?)", (first[2], second[-1] - PAGE))
+    third = _ids(ledger.get_transactions_paginated(PAGE, before_id=second[-1]))
+    back = _ids(ledger.get_transactions_paginated(PAGE, after_id=second[0]))
+    alive = _ids(ledger.execute_query("SELECT id FROM transactions ORDER BY id DESC", fetch_all=True))
+    # Sang trang: đúng 5 dòng kế tiếp còn sống, không lặp / không sót dòng nào của trang 2
+    assert third == [i for i in alive if i < second[-1]][:PAGE]
+    # Quay lại: trang 1 còn 4 dòng (không kéo dòng của trang 2 lên), thứ tự mới -> cũ
+    assert back == [i for i in first if i != first[2]]
+    # Bộ đếm vẫn khớp số dòng còn lại
+    assert ledger.get_transactions_count() == len(alive)
+
+def test_keyset_with_anchor_outside_range(ledger):
+    newest = _ids(ledger.get_transactions_paginated(1))[0]
+    assert ledger.get_transactions_paginated(PAGE, after_id=newest) == []
+    assert ledger.get_transactions_paginated(PAGE, before_id=1) == []
+
+def test_row_counters_match_group_by(ledger):
+    ledger.execute_query("DELETE FROM transactions WHERE id % 3 = 0")
+    counts = {r['scope']: r['total'] for r in ledger.execute_query("SELECT scope, total FROM tx_counters WHERE total != 0", fetch_all=True)}
+    expected = {r['scope']: r['n'] for r in ledger.execute_query("""SELECT 'ALL' AS scope, COUNT(*) AS n FROM transactions
+        UNION ALL SELECT 'W:' || wallet_id, COUNT(*) FROM transactions WHERE wallet_id IS NOT NULL GROUP BY wallet_id
+        UNION ALL SELECT 'S:' || symbol, COUNT(*) FROM transactions WHERE symbol IS NOT NULL GROUP BY symbol""", fetch_all=True)}
+    assert counts == expected
@@ -0,0 +1,19 @@
+# backend/database/test_period_flows.py
+# period_flows (luồng tiền theo tháng / năm) do trigger cộng dồn phải khớp GROUP BY trên transactions, kể cả dòng có ngày cũ và dòng bị xóa.
+import pytest
+
+SUMS = """SUM(CASE WHEN type = 'MUA' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+    SUM(CASE WHEN type = 'BAN' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+    SUM(COALESCE(realized_pl, 0)),
+    SUM(CASE WHEN type = 'NAP' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+    SUM(CASE WHEN type = 'RUT' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+    SUM(CASE WHEN type = 'CHUYEN_IN' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+    SUM(type IN ('MUA', 'BAN'))"""
+COLS = "buy_total, sell_total, realized_pl, deposit, withdraw, transfer_in, trade_count"
+
+@pytest.mark.parametrize('period, width', [('M', 7), ('Y', 4)])
+def test_period_flows_match_group_by(mixed_ledger, table, period, width):
+    flows = table(f"SELECT bucket, wallet_id, symbol, {COLS} FROM period_flows WHERE period = '{period}'", 3)
+    assert flows == table(f"""SELECT substr(timestamp, 1, {width}), wallet_id, COALESCE(symbol, ''), {SUMS} FROM transactions
+        WHERE wallet_id IS NOT NULL AND timestamp IS NOT NULL GROUP BY 1, 2, 3""", 3)
+    assert len({k[0] for k in flows}) > 1   # sổ có dòng rải nhiều kỳ
@@ -0,0 +1,25 @@
+# backend/database/test_pnl_aggregates.py
+# wallet_pnl / symbol_pnl do trigger cộng dồn phải khớp GROUP BY trên transactions, và /rebuild không làm đổi chúng.
+
+SUMS = """SUM(COALESCE(realized_pl, 0)),
+    SUM(CASE WHEN type = 'MUA' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+    SUM(CASE WHEN type = 'BAN' THEN ABS(COALESCE(amount, 0)) ELSE 0 END),
+    SUM(type IN ('MUA', 'BAN'))"""
+
+def test_wallet_pnl_matches_group_by(mixed_ledger, table):
+    assert table("SELECT wallet_id, realized_pl, buy_total, sell_total, trade_count FROM wallet_pnl", 1) == \
+        table(f"SELECT wallet_id, {SUMS} FROM transactions WHERE wallet_id IS NOT NULL GROUP BY wallet_id", 1)
+
+def test_symbol_pnl_matches_group_by(mixed_ledger, table):
+    assert table("SELECT wallet_id, symbol, realized_pl, buy_total, sell_total, trade_count FROM symbol_pnl", 2) == \
+        table(f"SELECT wallet_id, symbol, {SUMS} FROM transactions WHERE symbol IS NOT NULL GROUP BY wallet_id, symbol", 2)
+
+def test_rebuild_keeps_aggregates(mixed_ledger, table):
+    tables = {'tx_counters': 1, 'wallet_pnl': 1, 'symbol_pnl': 2, 'period_flows': 4}
+    before = {t: table(f"SELECT * FROM {t}", k) for t, k in tables.items()}
+    mixed_ledger.rebuild_aggregates()
+    assert {t: table(f"SELECT * FROM {t}", k) for t, k in tables.items()} == before
+
+def test_aggregates_built_once_per_file(db):
+    # Sổ trống vẫn được đánh dấu: mở lại shard không dựng lại bảng tổng hợp
+    assert db.execute_query("PRAGMA user_version", fetch_one=True)['user_version'] >= 1
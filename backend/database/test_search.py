@@ -0,0 +1,10 @@
+# backend/database/test_search.py
+# Chỉ mục tìm kiếm ghi chú (transactions_fts) do trigger giữ phải luôn khớp bảng transactions sau thêm / sửa / xóa.
+
+def test_search_index_matches_transactions(mixed_ledger):
+    db = mixed_ledger
+    db.execute_query("UPDATE transactions SET note = 'chot loi dot ' || id WHERE id % 5 = 0")
+    db.execute_query("INSERT INTO transactions_fts (transactions_fts) VALUES ('integrity-check')")
+    found = {r['rowid'] for r in db.execute_query("SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH 'chot'", fetch_all=True)}
+    assert found == {r['id'] for r in db.execute_query("SELECT id FROM transactions WHERE note LIKE 'chot%'", fetch_all=True)}
+    assert found
@@ -0,0 +1,89 @@
+# backend/modules/batch.py
+from backend.database.repository import DatabaseRepo
+from backend.modules.wallet import WalletModule
+from backend.core.parser import parse_trade_command, normalize_trade_price, parse_price_quotes
+
+class BatchModule:
+    """Lô lệnh nhiều dòng (dán cả bảng khớp lệnh): parse hết trước, 1 dòng sai là từ chối cả lô,
+    hợp lệ thì ghi sổ trong 1 transaction và trả về 1 tin nhắn tổng kết."""
+
+    def __init__(self):
+        self.db = DatabaseRepo()
+        self.wallet = WalletModule()
+
+    def format_money(self, amount):
+        if abs(amount) >= 1000000:
+            return f"{amount / 1000000:,.1f} triệu"
+        return f"{amount:,.0f} đ"
+
+    def parse_line(self, line):
+        """1 dòng -> list lệnh (dòng up có thể mang nhiều cặp mã/giá)"""
+        parts = line.split()
+        action = parts[0]
+        if action in ('s', 'c'):
+            parsed = parse_trade_command(line)
+            if not parsed: raise ValueError("sai cú pháp `s/c [MÃ] [SL] [GIÁ]`")
+            w_type, sym, qty, price = parsed
+            return [['TRADE', w_type, sym, qty, normalize_trade_price(w_type, price)]]
+        if action == 'up':
+            try: return [('PRICE', sym, price) for sym, price in parse_price_quotes(line)]
+            except ValueError: raise ValueError("sai cú pháp `up [MÃ] [GIÁ] ...`")
+        if action in ('nap', 'rut'):
+            amount = self.wallet.parse_amount(" ".join(parts[1:])) if len(parts) > 1 else None
+            if amount is None: raise ValueError("số tiền không hợp lệ")
+            return [('CASH', amount if action == 'nap' else -amount, action.upper())]
+        if action in ('chuyen', 'thu'):
+            target = parts[1].upper() if len(parts) > 2 else None
+            if target not in ('STOCK', 'CRYPTO'): raise ValueError("chỉ hỗ trợ ví STOCK hoặc CRYPTO")
+            amount = self.wallet.parse_amount(" ".join(parts[2:]))
+            if amount is None: raise ValueError("số tiền không hợp lệ")
+            return [('TRANSFER', 'CASH', target, amount) if action == 'chuyen' else ('TRANSFER', target, 'CASH', amount)]
+        raise ValueError("lệnh không hỗ trợ trong lô (chỉ s, c, up, nap, rut, chuyen, thu)")
+
+    def parse_batch(self, text):
+        """-> (ops, lỗi). lỗi là list (số dòng, dòng, lý do)"""
+        ops, errors = [], []
+        for no, line in enumerate(text.lower().splitlines(), 1):
+            line = line.strip()
+            if not line: continue
+            try: ops.extend(self.parse_line(line))
+            except ValueError as e: errors.append((no, line, str(e)))
+        return ops, errors
+
+    def handle_batch(self, text):
+        ops, errors = self.parse_batch(text)
+        if errors:
+            msg = ["❌ Lô lệnh bị từ chối, chưa ghi gì vào sổ:\n"]
+            for no, line, reason in errors[:10]:
+                msg.append(f"• Dòng {no}: `{line}` - {reason}\n")
+            if len(errors) > 10: msg.append(f"... và {len(errors) - 10} dòng lỗi khác\n")
+            return "".join(msg)
+
+        if any(op[0] == 'TRADE' and op[1] == 'CRYPTO' for op in ops):
+            rate = self.db.get_setting('crypto_rate')
+        for op in ops:
+            if op[0] == 'TRADE':
+                op.append(abs(op[3]) * op[4] * (rate if op[1] == 'CRYPTO' else 1))
+
+        try:
+            results = self.db.apply_batch([tuple(op) for op in ops])
+        except Exception as e:
+            return f"❌ Lô lệnh bị từ chối, chưa ghi gì vào sổ: {str(e)}"
+
+        buys = [op for op in ops if op[0] == 'TRADE' and op[3] > 0]
+        sells = [(op, pl) for op, pl in zip(ops, results) if op[0] == 'TRADE' and op[3] < 0]
+        prices = [op for op in ops if op[0] == 'PRICE']
+        funds = [op for op in ops if op[0] in ('CASH', 'TRANSFER')]
+
+        msg = [f"✅ Đã ghi lô {len(ops)} lệnh (1 lần ghi sổ)\n━━━━━━━━━━━━━━━━━━━\n"]
+        if buys:
+            msg.append(f"🛒 Mua: {len(buys)} lệnh | {self.format_money(sum(op[5] for op in buys))}\n")
+        if sells:
+            realized = sum(pl for _, pl in sells)
+            msg.append(f"💰 Bán: {len(sells)} lệnh | {self.format_money(sum(op[5] for op, _ in sells))}\n")
+            msg.append(f"📈 Lãi chốt: {realized:,.0f} đ\n")
+        if prices:
+            msg.append(f"🔄 Cập nhật giá: {', '.join(dict.fromkeys(op[1] for op in prices))}\n")
+        if funds:
+            msg.append(f"💵 Dòng tiền: {len(funds)} lệnh\n")
+        return "".join(msg)
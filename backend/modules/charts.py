@@ -0,0 +1,69 @@
+# backend/modules/charts.py
+from backend.database.repository import DatabaseRepo
+from backend.core.metrics import summarize_nav, NAV_WALLETS
+from backend.services.chart_service import chart_service
+from backend.services.nav_service import flush as flush_nav
+
+WALLET_NAMES = {'CASH': 'Tiền mặt', 'STOCK': 'Chứng khoán', 'CRYPTO': 'Crypto', 'OTHER': 'Tài sản khác'}
+
+def _mil(value):
+    """Đơn vị trục biểu đồ: triệu đồng (làm tròn để dữ liệu giống nhau cho ra đúng 1 ảnh cache)"""
+    return round(value / 1_000_000, 2)
+
+class ChartModule:
+    """Dựng dữ liệu biểu đồ từ snapshot / chuỗi NAV rồi giao cho ChartService vẽ.
+    Mỗi snapshot (1 data version) nhớ sẵn Chart đã yêu cầu: gọi lại không đọc lại dữ liệu."""
+
+    def __init__(self):
+        self.db = DatabaseRepo()
+
+    def _chart(self, params, build):
+        snap = self.db.get_snapshot()
+        key = ('chart',) + params
+        chart = snap.memo.get(key)
+        if chart is not None and chart.future.done() and chart.future.exception() is not None:
+            del snap.memo[key]   # lần vẽ trước lỗi: vẽ lại thay vì trả Chart hỏng tới lần ghi sau
+        if key not in snap.memo:
+            spec = build(snap)
+            snap.memo[key] = chart_service.request(*spec) if spec else None
+        return snap.memo[key]
+
+    def allocation(self, wallet=None):
+        """Pie phân bổ: toàn bộ tài sản theo ví, hoặc theo mã trong 1 ví (kèm tiền mặt của ví)"""
+        def build(snap):
+            if wallet is None:
+                nav = summarize_nav(snap)
+                data = [[WALLET_NAMES[w], _mil(nav[w][0])] for w in ('CASH',) + NAV_WALLETS if nav[w][0] > 0]
+                title = 'Phân bổ tài sản'
+            else:
+                pm = snap.wallet_metrics(wallet, price_fallback=True)
+                data = [[s, _mil(v)] for s, v in zip(pm.symbols, pm.val.tolist()) if v > 0]
+                cash = snap.wallets.get(wallet, {}).get('balance', 0)
+                if cash > 0: data.append([WALLET_NAMES['CASH'], _mil(cash)])
+                title = f"Tỷ trọng {WALLET_NAMES[wallet]}"
+            return ('pie', title, data) if data else None
+        return self._chart(('alloc', wallet), build)
+
+    def nav(self, period='D', limit=90):
+        """Đường tài sản ròng & vốn gốc (tổng) theo ngày / tuần / tháng"""
+        # NAV ghi quiet (không đổi data version): phải ghi xong trước khi ảnh được nhớ theo snapshot hiện tại
+        flush_nav(self.db.pool.db_path)
+        def build(snap):
+            if period == 'D':
+                rows = [(r['day'], r['assets'], r['book_value']) for r in self.db.get_nav_series(limit=limit)]
+            else:
+                rows = [(r['bucket'], r['close_assets'], r['close_book']) for r in self.db.get_nav_rollups(period, limit=limit)]
+            if len(rows) < 2: return None
+            x, assets, book = zip(*rows)
+            data = {'x': list(x), 'series': [['Tài sản', [_mil(v) for v in assets]], ['Vốn gốc', [_mil(v) for v in book]]]}
+            return 'line', 'Tài sản ròng', data
+        return self._chart(('nav', period, limit), build)
+
+    def realized(self, wallet='STOCK', top_n=15):
+        """Cột lãi/lỗ đã chốt theo mã (N mã có |lãi/lỗ| lớn nhất)"""
+        def build(snap):
+            rows = [(p['symbol'], p['realized'] or 0) for p in snap.perf_symbols if p['wallet_id'] == wallet and p['realized']]
+            rows.sort(key=lambda r: -abs(r[1]))
+            data = [[s, _mil(v)] for s, v in sorted(rows[:top_n], key=lambda r: -r[1])]
+            return ('bar', f"Lãi/Lỗ đã chốt - {WALLET_NAMES[wallet]}", data) if data else None
+        return self._chart(('pnl', wallet, top_n), build)
@@ -1,30 +1,44 @@
 # backend/modules/data_manager.py
-import json
+import requests
+from telebot import apihelper
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from backend.services.import_service import ImportService
+from backend.services.export_service import ExportService
+from config import TOKEN
+
+DOWNLOAD_CHUNK = 64 * 1024
+DOWNLOAD_TIMEOUT = 60
 
 class DataManagerModule:
     def __init__(self):
         self.import_service = ImportService()
+        self.export_service = ExportService()
 
     def get_menu_ui(self):
         msg = (
             "💾 **QUẢN LÝ DỮ LIỆU HỆ THỐNG**\n"
             "━━━━━━━━━━━━━━━━━━━\n"
             "Kéo thả file `.json` vào khung chat này để **Import / Chốt số đầu kỳ**.\n"
-            "Dữ liệu của Sếp sẽ tự động cân bằng Lãi/Lỗ quá khứ."
+            "Dữ liệu của Sếp sẽ tự động cân bằng Lãi/Lỗ quá khứ.\n"
+            "Bấm **Export** (hoặc gõ `export` / `export csv`) để tải toàn bộ sổ về máy."
         )
         markup = InlineKeyboardMarkup()
+        markup.row(InlineKeyboardButton("📤 Export JSON", callback_data="data_export_json"), InlineKeyboardButton("📤 Export CSV", callback_data="data_export_csv"))
         markup.add(InlineKeyboardButton("🗑 Xóa trắng dữ liệu (Reset)", callback_data="data_reset"))
         return msg, markup
 
-    def handle_document(self, bot, message):
+    def handle_document(self, file_id):
+        """Tải file .json từ Telegram theo từng chunk rồi import dần, trả về nội dung phản hồi"""
         try:
-            file_info = bot.get_file(message.document.file_id)
-            downloaded_file = bot.download_file(file_info.file_path)
-            json_data = json.loads(downloaded_file.decode('utf-8'))
-            
-            success, response_msg = self.import_service.process_import_file(json_data)
-            bot.reply_to(message, response_msg)
+            file_info = apihelper.get_file(TOKEN, file_id)
+            url = (apihelper.FILE_URL or "https://api.telegram.org/file/bot{0}/{1}").format(TOKEN, file_info['file_path'])
+            with requests.get(url, stream=True, proxies=apihelper.proxy, timeout=DOWNLOAD_TIMEOUT) as resp:
+                resp.raise_for_status()
+                success, response_msg = self.import_service.process_import_stream(resp.iter_content(DOWNLOAD_CHUNK))
+            return response_msg
         except Exception as e:
-            bot.reply_to(message, f"❌ File không hợp lệ hoặc lỗi định dạng: {str(e)}")
+            return f"❌ File không hợp lệ hoặc lỗi định dạng: {str(e)}"
+
+    def export_files(self, fmt='json'):
+        """-> list (tên file, đường dẫn tạm) để gửi dạng document"""
+        return self.export_service.export_files('csv' if fmt == 'csv' else 'json')
@@ -1,30 +1,73 @@
 # backend/modules/history.py
-import math
+import math, hashlib, re, threading
 import os, sys
+from collections import OrderedDict
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../')))
 from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
 from backend.database.repository import DatabaseRepo
 from backend.utils.formatter import format_currency  # Đã import hàm chuẩn từ utils
+from backend.core.parser import build_fts_query
+
+# Số phiên tìm kiếm giữ lại cho nút phân trang (callback_data Telegram tối đa 64 byte nên chỉ mang mã phiên)
+SEARCH_SESSIONS = 256
 
 class HistoryModule:
     def __init__(self):
         self.db = DatabaseRepo()
+        self._searches = OrderedDict()   # mã phiên -> (filter_type, symbol, search, date_from, date_to, nhãn)
+        self._searches_lock = threading.Lock()   # các worker của nhiều chat dùng chung 1 module
+
+    def search(self, filter_type='ALL', symbol=None, text=None, date_from=None, date_to=None, label=''):
+        """Tìm theo chữ (FTS5 trên loại/mã/ghi chú) và/hoặc khoảng ngày [date_from, date_to), trả về trang 1.
+        Tham số giữ phía server, nút phân trang chỉ mang mã phiên 'Q<hex>' ở vị trí filter_type."""
+        spec = (filter_type, symbol, build_fts_query(text) if text else None, date_from, date_to,
+                re.sub(r'[_*`\[\]]', ' ', label).strip())
+        token = hashlib.sha1(repr(spec).encode('utf-8')).hexdigest()[:8]
+        with self._searches_lock:
+            self._searches[token] = spec
+            self._searches.move_to_end(token)
+            while len(self._searches) > SEARCH_SESSIONS:
+                self._searches.popitem(last=False)
+        return self.get_history_ui(filter_type=f"Q{token}")
 
-    def get_history_ui(self, page=1, filter_type='ALL', symbol=None):
+    def get_history_ui(self, page=1, filter_type='ALL', symbol=None, cursor=None):
+        """cursor: 'o<id>' = trang cũ hơn mốc id, 'n<id>' = trang mới hơn mốc id (keyset, không OFFSET)"""
         limit = 5
-        offset = (page - 1) * limit
-        
-        # Tính toán phân trang
-        total_items = self.db.get_transactions_count(filter_type, symbol)
+
+        # Phiên tìm kiếm: khôi phục điều kiện lọc, nút phân trang giữ nguyên mã phiên
+        page_filter, page_symbol = filter_type, symbol
+        search = date_from = date_to = label = None
+        if filter_type.startswith('Q'):
+            with self._searches_lock:
+                spec = self._searches.get(filter_type[1:])
+            if spec:
+                filter_type, symbol, search, date_from, date_to, label = spec
+            else:
+                # Bot khởi động lại / phiên quá cũ: quay về lịch sử tổng hợp
+                filter_type = page_filter = 'ALL'
+        filters = dict(search=search, date_from=date_from, date_to=date_to)
+
+        # Tính toán phân trang (tổng số lấy từ bộ đếm, không quét bảng; tìm kiếm thì đếm trên chỉ mục)
+        total_items = self.db.get_transactions_count(filter_type, symbol, **filters)
         total_pages = math.ceil(total_items / limit) if total_items > 0 else 1
         if page > total_pages: page = total_pages
         if page < 1: page = 1
         
-        transactions = self.db.get_transactions_paginated(limit, offset, filter_type, symbol)
+        transactions = []
+        if cursor and cursor[1:].isdigit():
+            anchor = int(cursor[1:])
+            if cursor[0] == 'o':
+                transactions = self.db.get_transactions_paginated(limit, filter_type=filter_type, symbol=symbol, before_id=anchor, **filters)
+            elif cursor[0] == 'n':
+                transactions = self.db.get_transactions_paginated(limit, filter_type=filter_type, symbol=symbol, after_id=anchor, **filters)
+        if not transactions:
+            # Không có mốc (trang đầu / callback kiểu cũ) hoặc dữ liệu đã đổi: quay về OFFSET theo số trang
+            transactions = self.db.get_transactions_paginated(limit, (page - 1) * limit, filter_type, symbol, **filters)
         
         # Đặt Tiêu đề
         header = "TỔNG HỢP"
-        if symbol: header = f"MÃ {symbol.upper()}"
+        if label: header = f"TÌM \"{label}\""
+        elif symbol: header = f"MÃ {symbol.upper()}"
         elif filter_type == 'CASH': header = "NẠP/RÚT VỐN (CASH)"
         elif filter_type == 'STOCK': header = "CHỨNG KHOÁN"
         elif filter_type == 'CRYPTO': header = "CRYPTO"
@@ -74,8 +117,10 @@ class HistoryModule:
         markup = None
         if total_pages > 1:
             markup = InlineKeyboardMarkup(row_width=2)
-            btn_prev = InlineKeyboardButton("⬅️ Trước", callback_data=f"his_p_{page-1}_{filter_type}_{symbol or 'NONE'}")
-            btn_next = InlineKeyboardButton("Sau ➡️", callback_data=f"his_p_{page+1}_{filter_type}_{symbol or 'NONE'}")
+            first_id = transactions[0]['id'] if transactions else 0
+            last_id = transactions[-1]['id'] if transactions else 0
+            btn_prev = InlineKeyboardButton("⬅️ Trước", callback_data=f"his_p_{page-1}_{page_filter}_{page_symbol or 'NONE'}_n{first_id}")
+            btn_next = InlineKeyboardButton("Sau ➡️", callback_data=f"his_p_{page+1}_{page_filter}_{page_symbol or 'NONE'}_o{last_id}")
             
             # Đổi icon 🚫 thành ký tự tàng hình (Zero-width space)
             if page == 1: btn_prev = InlineKeyboardButton("‎", callback_data="ignore")
@@ -0,0 +1,42 @@
+# backend/modules/lots.py
+from backend.database.repository import DatabaseRepo
+from backend.utils.formatter import format_currency, draw_line
+
+COST_METHODS = {'AVG': 'Giá vốn bình quân', 'FIFO': 'FIFO (lô cũ bán trước)', 'LIFO': 'LIFO (lô mới bán trước)'}
+
+class LotModule:
+    def __init__(self):
+        self.db = DatabaseRepo()
+
+    def set_method(self, method):
+        method = method.upper()
+        if method not in COST_METHODS:
+            return "⚠️ Cách tính giá vốn: /lots avg | /lots fifo | /lots lifo"
+        self.db.set_cost_method(method)
+        msg = f"✅ Cách tính giá vốn: {COST_METHODS[method]}"
+        if method != 'AVG':
+            msg += "\n💡 Bán đúng 1 lô: thêm #số_lô cuối lệnh (vd: s vpb -100 25 #12)"
+        return msg
+
+    def get_lots_view(self, symbol=None):
+        method = self.db.get_cost_method()
+        lines = [f"📦 SỔ LÔ - {COST_METHODS.get(method, method)}", draw_line("thick")]
+        if method == 'AVG':
+            lines.append("ℹ️ Đang tính giá vốn bình quân, chưa ghi sổ lô. Bật bằng /lots fifo hoặc /lots lifo")
+            return "\n".join(lines)
+
+        lots = self.db.get_open_lots(symbol)
+        if not lots:
+            lines.append("Không có lô nào đang mở.")
+        for lot in lots:
+            unit_cost = lot['cost_vnd'] / lot['quantity'] if lot['quantity'] else 0
+            opened = (lot['opened_at'] or '')[:10] if lot['buy_tx_id'] else 'lô mở đầu'
+            lines.append(f"#{lot['id']} {lot['symbol']} | Còn {lot['remaining']:,.8g}/{lot['quantity']:,.8g} | Vốn {format_currency(unit_cost)}/cp | {opened}")
+
+        closed = self.db.get_lot_pnl(symbol, limit=10)
+        if closed:
+            lines += [draw_line("thin"), "💰 Lãi/Lỗ chốt theo lô:"]
+            for lot in closed:
+                lines.append(f"#{lot['id']} {lot['symbol']}: {format_currency(lot['realized_pl'])}")
+        lines += [draw_line("thin"), "💡 /lots [MÃ] | /lots avg|fifo|lifo | Bán đúng lô: s vpb -100 25 #12"]
+        return "\n".join(lines)
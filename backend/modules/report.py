@@ -0,0 +1,62 @@
+# backend/modules/report.py
+from datetime import date
+from backend.database.repository import DatabaseRepo
+from backend.core.parser import parse_report_period
+from backend.utils.formatter import format_currency, draw_line
+from backend.utils.render_cache import cached_view
+
+REPORT_WALLETS = (('STOCK', '📈 Stock'), ('CRYPTO', '🟡 Crypto'), ('OTHER', '🥇 Khác'))
+REPORT_GUIDE = "💡 report 2026 | report 2026-09 | report 2026-01..2026-06"
+
+class ReportModule:
+    """Báo cáo Lãi/Lỗ chốt & dòng tiền theo tháng / năm, đọc thẳng bảng gộp period_flows"""
+
+    def __init__(self):
+        self.db = DatabaseRepo()
+
+    def handle_report_command(self, token=None):
+        """token rỗng = tháng hiện tại"""
+        spec = parse_report_period(token) if token else ('M',) + (date.today().strftime('%Y-%m'),) * 2
+        if not spec:
+            return f"⚠️ Kỳ báo cáo không hợp lệ.\n{REPORT_GUIDE}"
+        return self.get_period_report(*spec)
+
+    @cached_view('period_report', error='Báo cáo')
+    def get_period_report(self, period, start, end, top_n=5):
+        data = self.db.get_period_flows(period, start, end)
+        label = ('NĂM ' if period == 'Y' else 'THÁNG ') + (start if start == end else f"{start} → {end}")
+        lines = [f"📊 BÁO CÁO {label}", draw_line("thick")]
+        if not data['wallets']:
+            lines += ["ℹ️ Không có giao dịch nào trong kỳ này.", draw_line("thin"), REPORT_GUIDE]
+            return "\n".join(lines)
+
+        w = {r['wallet_id']: r for r in data['wallets']}
+        cash = w.get('CASH', {})
+        deposit, withdraw = cash.get('deposit') or 0, cash.get('withdraw') or 0
+        lines += [
+            "💵 DÒNG TIỀN:",
+            f"📤 Nạp: {format_currency(deposit)} | 📥 Rút: {format_currency(withdraw)}",
+            f"💧 Ròng: {format_currency(deposit - withdraw)}",
+            f"🔁 Cấp vốn: Stock {format_currency(w.get('STOCK', {}).get('transfer_in') or 0)} | Crypto {format_currency(w.get('CRYPTO', {}).get('transfer_in') or 0)}",
+            f"↩️ Thu về Ví Mẹ: {format_currency(cash.get('transfer_in') or 0)}",
+            draw_line("thin"),
+            "📈 GIAO DỊCH & LÃI/LỖ CHỐT:"
+        ]
+        total_pl = 0
+        for wid, name in REPORT_WALLETS:
+            r = w.get(wid)
+            if not r: continue
+            total_pl += r['realized_pl'] or 0
+            lines.append(f"{name}: Mua {format_currency(r['buy_total'] or 0)} | Bán {format_currency(r['sell_total'] or 0)} | Lãi chốt {format_currency(r['realized_pl'] or 0)} ({r['trade_count'] or 0} lệnh)")
+        lines.append(f"💰 Tổng lãi chốt: {format_currency(total_pl)}")
+
+        gainers = [s for s in data['symbols'] if (s['realized_pl'] or 0) > 0][:top_n]
+        losers = [s for s in reversed(data['symbols']) if (s['realized_pl'] or 0) < 0][:top_n]
+        if gainers or losers:
+            lines.append(draw_line("thin"))
+        if gainers:
+            lines.append("🏆 Top lãi: " + ", ".join(f"{s['symbol']} {format_currency(s['realized_pl'])}" for s in gainers))
+        if losers:
+            lines.append("💀 Top lỗ: " + ", ".join(f"{s['symbol']} {format_currency(s['realized_pl'])}" for s in losers))
+        lines += [draw_line("thick"), REPORT_GUIDE]
+        return "\n".join(lines)
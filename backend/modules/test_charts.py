@@ -0,0 +1,34 @@
+# backend/modules/test_charts.py
+# Biểu đồ NAV yêu cầu ngay sau lệnh ghi phải có điểm NAV mới nhất (không chờ thread nền ghi NAV).
+from datetime import date
+from concurrent.futures import Future
+from types import SimpleNamespace
+import pytest
+from backend.modules.charts import ChartModule
+from backend.services import nav_service
+from backend.services.chart_service import chart_service
+
+@pytest.fixture
+def requested(monkeypatch):
+    """Dữ liệu gửi sang ChartService thay vì vẽ ảnh thật"""
+    calls = []
+    def request(kind, title, data):
+        calls.append(data)
+        future = Future()
+        future.set_result(None)
+        return SimpleNamespace(data=data, future=future)
+    monkeypatch.setattr(chart_service, 'request', request)
+    return calls
+
+def test_nav_chart_right_after_trade(db, requested, monkeypatch):
+    monkeypatch.setattr(nav_service, 'NAV_DEBOUNCE', 60)   # thread nền chưa kịp ghi
+    db.update_cash_balance(10**9, 'NAP')
+    nav_service.record_nav(db, date(2024, 1, 1))
+    db.transfer_funds('CASH', 'STOCK', 10**8)
+    db.execute_trade('STOCK', 'FPT', 1_000, 100_000, 10**8)
+    db.update_market_prices([('FPT', 130_000)])   # tài sản tăng 30 triệu
+
+    chart = ChartModule().nav('D')
+    assert chart.data['series'][0][1][-1] == 1030.0   # triệu đồng, đã gồm lệnh vừa ghi
+    # Gọi lại trong cùng data version: trả bản đã nhớ, không dựng lại
+    assert ChartModule().nav('D') is chart and len(requested) == 1
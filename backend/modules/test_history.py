@@ -0,0 +1,34 @@
+# backend/modules/test_history.py
+# Nút phân trang lịch sử: mốc 'o<id>' / 'n<id>' đi theo keyset, mốc hỏng hoặc hết dữ liệu thì quay về OFFSET theo số trang.
+import re
+import pytest
+from backend.modules.history import HistoryModule
+
+@pytest.fixture
+def hist(db):
+    db.update_cash_balance(10**10, 'NAP')
+    db.transfer_funds('CASH', 'STOCK', 10**9)
+    for i in range(14):
+        db.execute_trade('STOCK', 'FPT', 100, 20_000, 2_000_000)
+    return HistoryModule()
+
+def _shown(msg):
+    return [int(i) for i in re.findall(r"ID: #(\d+)", msg)]
+
+def _offset_page(db, page):
+    return [r['id'] for r in db.get_transactions_paginated(5, (page - 1) * 5)]
+
+def test_cursor_buttons_follow_keyset(hist, db):
+    msg, markup = hist.get_history_ui(1)
+    page1 = _shown(msg)
+    assert page1 == _offset_page(db, 1)
+    nxt = markup.keyboard[0][1].callback_data
+    assert nxt.endswith(f"_o{page1[-1]}")
+    page2 = _shown(hist.get_history_ui(2, cursor=f"o{page1[-1]}")[0])
+    assert page2 == _offset_page(db, 2)
+    assert _shown(hist.get_history_ui(1, cursor=f"n{page2[0]}")[0]) == page1
+
+@pytest.mark.parametrize('cursor', ['', 'o', 'oabc', 'x12', 'n-3', 'o1'])
+def test_bad_or_exhausted_cursor_falls_back_to_offset(hist, db, cursor):
+    # 'o1': không còn dòng nào cũ hơn id 1 -> dùng số trang
+    assert _shown(hist.get_history_ui(2, cursor=cursor)[0]) == _offset_page(db, 2)
@@ -0,0 +1,158 @@
+# backend/services/chart_service.py
+# Vẽ biểu đồ PNG (matplotlib) trên pool worker riêng: handler chỉ nhận Future, không chờ vẽ.
+# Ảnh cache trên đĩa theo nội dung dữ liệu + tham số (version đếm lại từ đầu mỗi lần khởi động nên không dùng làm tên file),
+# kèm file_id Telegram của lần gửi đầu: lần sau gửi lại bằng file_id, không vẽ, không upload.
+import hashlib, json, logging, os, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from config import CHART_DIR, CHART_WORKERS, CHART_CACHE_MAX
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# VẼ (CHẠY TRONG WORKER)
+# ==========================================
+def _pie(ax, data):
+    labels, values = zip(*data)
+    ax.pie(values, labels=labels, autopct='%1.1f%%', startangle=90, counterclock=False)
+    ax.axis('equal')
+
+def _line(ax, data):
+    for name, values in data['series']:
+        ax.plot(data['x'], values, label=name)
+    ax.set_ylabel('triệu đ')
+    ax.grid(alpha=0.3)
+    ax.legend()
+    step = max(1, len(data['x']) // 8)
+    ax.set_xticks(range(0, len(data['x']), step), [data['x'][i] for i in range(0, len(data['x']), step)], rotation=30, ha='right')
+
+def _bar(ax, data):
+    labels, values = zip(*data)
+    ax.bar(labels, values, color=['#2e7d32' if v >= 0 else '#c62828' for v in values])
+    ax.axhline(0, color='black', linewidth=0.8)
+    ax.set_ylabel('triệu đ')
+    ax.tick_params(axis='x', rotation=45)
+
+RENDERERS = {'pie': _pie, 'line': _line, 'bar': _bar}
+
+def render_png(kind, title, data, path):
+    from matplotlib.figure import Figure   # chỉ dùng API hướng đối tượng (không pyplot): an toàn khi nhiều thread
+    fig = Figure(figsize=(7, 4.5), dpi=110)
+    ax = fig.add_subplot()
+    RENDERERS[kind](ax, data)
+    ax.set_title(title)
+    tmp = path + '.tmp'
+    fig.savefig(tmp, format='png', bbox_inches='tight')
+    os.replace(tmp, path)
+    return path
+
+# ==========================================
+# CACHE + POOL
+# ==========================================
+class Chart:
+    """1 ảnh biểu đồ: future -> đường dẫn PNG; file_id có sẵn nếu ảnh này đã từng được gửi"""
+    __slots__ = ('key', 'path', 'future', 'file_id', 'service')
+
+    def __init__(self, service, key, path, future, file_id):
+        self.service, self.key, self.path, self.future, self.file_id = service, key, path, future, file_id
+
+    def remember(self, message):
+        """Lưu file_id Telegram trả về sau lần upload đầu"""
+        self.service.count('uploads')
+        if message is not None and getattr(message, 'photo', None):
+            self.file_id = message.photo[-1].file_id
+            self.service.save_file_id(self.key, self.file_id)
+
+    def reused(self):
+        self.service.count('file_id_sends')
+
+    def forget(self):
+        """file_id không còn dùng được: lần sau upload lại"""
+        self.file_id = None
+        self.service.save_file_id(self.key, None)
+
+class ChartService:
+    def __init__(self, chart_dir=CHART_DIR, workers=CHART_WORKERS, max_files=CHART_CACHE_MAX):
+        self.chart_dir = chart_dir
+        self.max_files = max_files
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chart')
+        self._jobs = {}   # key -> Future đang vẽ: 2 request cùng ảnh chỉ vẽ 1 lần
+        self._lock = threading.Lock()
+        self._available = None
+        self.renders = self.disk_hits = self.uploads = self.file_id_sends = self.failures = 0
+
+    @property
+    def available(self):
+        if self._available is None:
+            try:
+                import matplotlib
+                matplotlib.use('Agg')
+                self._available = True
+            except ImportError:
+                self._available = False
+        return self._available
+
+    def request(self, kind, title, data):
+        """Trả Chart ngay: ảnh đã có trên đĩa thì future xong sẵn, chưa có thì đưa vào pool vẽ"""
+        key = hashlib.sha1(json.dumps([kind, title, data], ensure_ascii=False).encode('utf-8')).hexdigest()
+        path = os.path.join(self.chart_dir, f"{key}.png")
+        file_id = self.load_file_id(key)
+        with self._lock:
+            future = self._jobs.get(key)
+            if future is None:
+                if os.path.exists(path):
+                    os.utime(path)   # LRU theo mtime khi dọn cache
+                    future = Future()
+                    future.set_result(path)
+                    self.disk_hits += 1
+                else:
+                    os.makedirs(self.chart_dir, exist_ok=True)
+                    future = self._jobs[key] = self._pool.submit(self._render, key, kind, title, data, path)
+                    self.renders += 1
+        return Chart(self, key, path, future, file_id)
+
+    def _render(self, key, kind, title, data, path):
+        try:
+            return render_png(kind, title, data, path)
+        except Exception:
+            self.count('failures')
+            raise
+        finally:
+            with self._lock: self._jobs.pop(key, None)
+            self._prune()
+
+    def _prune(self):
+        files = [e for e in os.scandir(self.chart_dir) if e.name.endswith('.png')]
+        if len(files) <= self.max_files: return
+        files.sort(key=lambda e: e.stat().st_mtime)
+        for e in files[:len(files) - self.max_files]:
+            for p in (e.path, e.path[:-4] + '.fid'):
+                try: os.remove(p)
+                except OSError: pass
+
+    def load_file_id(self, key):
+        try:
+            with open(os.path.join(self.chart_dir, f"{key}.fid"), encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def save_file_id(self, key, file_id):
+        path = os.path.join(self.chart_dir, f"{key}.fid")
+        if file_id:
+            with open(path, 'w', encoding='utf-8') as f: f.write(file_id)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {'renders': self.renders, 'disk_hits': self.disk_hits, 'uploads': self.uploads,
+                    'file_id_sends': self.file_id_sends, 'failures': self.failures, 'pending': len(self._jobs)}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+chart_service = ChartService()
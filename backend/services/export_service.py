@@ -0,0 +1,76 @@
+# backend/services/export_service.py
+import csv, gzip, json, os, tempfile
+from datetime import datetime
+from backend.database.repository import DatabaseRepo, HOLDINGS_VALUED
+
+EXPORT_TABLES = ('wallets', 'holdings', 'transactions', 'settings')
+
+class ExportService:
+    """Xuất sổ ra file theo kiểu streaming: đọc cursor từng lô, ghi thẳng ra file tạm,
+    bộ nhớ không phụ thuộc số dòng. File JSON dùng đúng định dạng ImportService đọc lại được."""
+
+    def __init__(self):
+        self.db = DatabaseRepo()
+
+    def write_json(self, fp):
+        # 1 transaction đọc: toàn bộ file là 1 ảnh nhất quán của sổ
+        with self.db.transaction(readonly=True):
+            settings = {r['key']: r['value'] for r in self.db.iter_rows("SELECT key, value FROM settings")}
+            wallets = {r['id']: {'total_in': r['total_in'], 'total_out': r['total_out'], 'current_cash': r['balance']}
+                       for r in self.db.iter_rows("SELECT id, balance, total_in, total_out FROM wallets")}
+            # Giá trong file là VNĐ / USD đúng như trong sổ: import lại không nhân 1000 giá CK < 1000 như file gõ tay
+            fp.write('{"version": "3.4", "price_unit": "vnd", ')
+            fp.write(f'"exported_at": {json.dumps(datetime.now().isoformat(timespec="seconds"))},\n')
+            fp.write(f'"settings": {json.dumps(settings, ensure_ascii=False)},\n')
+            fp.write(f'"wallets": {json.dumps(wallets)},\n')
+            self._write_array(fp, 'holdings', (
+                {'wallet_id': r['wallet_id'], 'symbol': r['symbol'], 'qty': r['quantity'], 'average_price': r['average_price'],
+                 'market_price': r['current_price'], 'cost_basis_vnd': r['cost_basis_vnd']}
+                for r in self.db.iter_rows(HOLDINGS_VALUED)))
+            fp.write(',\n')
+            self._write_array(fp, 'history', (
+                {k: r[k] for k in ('wallet_id', 'type', 'symbol', 'quantity', 'price', 'amount', 'realized_pl', 'timestamp', 'note')}
+                for r in self.db.iter_rows("SELECT * FROM transactions ORDER BY id")))
+            fp.write('}\n')
+
+    def _write_array(self, fp, key, items):
+        fp.write(f'"{key}": [')
+        sep = '\n'
+        for item in items:
+            fp.write(sep)
+            fp.write(json.dumps(item, ensure_ascii=False))
+            sep = ',\n'
+        fp.write('\n]')
+
+    def write_csv(self, table, fp):
+        columns = [c['name'] for c in self.db.execute_query(f"PRAGMA table_info({table})", fetch_all=True)]
+        writer = csv.writer(fp)
+        writer.writerow(columns)
+        writer.writerows(tuple(r) for r in self.db.iter_rows(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid"))
+
+    def export_files(self, fmt='json'):
+        """Ghi file tạm, trả về list (tên hiển thị, đường dẫn). Bên gọi xóa file sau khi gửi."""
+        stamp = datetime.now().strftime('%Y%m%d_%H%M')
+        files = []
+        try:
+            if fmt == 'csv':
+                with self.db.transaction(readonly=True):
+                    for table in EXPORT_TABLES:
+                        path = self._temp_path('.csv.gz')
+                        files.append((f"finance_{table}_{stamp}.csv.gz", path))
+                        with gzip.open(path, 'wt', encoding='utf-8', newline='') as fp:
+                            self.write_csv(table, fp)
+            else:
+                path = self._temp_path('.json')
+                files.append((f"finance_export_{stamp}.json", path))
+                with open(path, 'w', encoding='utf-8') as fp:
+                    self.write_json(fp)
+        except Exception:
+            for _, path in files: os.remove(path)
+            raise
+        return files
+
+    def _temp_path(self, suffix):
+        fd, path = tempfile.mkstemp(prefix='finance_export_', suffix=suffix)
+        os.close(fd)
+        return path
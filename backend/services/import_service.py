@@ -1,64 +1,119 @@
 # backend/services/import_service.py
-import json
+from collections import defaultdict
+from itertools import islice
 from backend.database.repository import DatabaseRepo
+from backend.utils.json_stream import iter_object
+from backend.core.parser import parse_ledger_date
+
+# Số dòng lịch sử gom lại cho mỗi lần executemany
+HISTORY_BATCH = 1000
 
 class ImportService:
     def __init__(self):
         self.db = DatabaseRepo()
 
     def process_import_file(self, json_data):
+        """Import từ dict đã parse sẵn"""
+        def items():
+            for key, value in json_data.items():
+                if key in ('history', 'holdings'):
+                    for item in value: yield key, item
+                else:
+                    yield key, value
+        return self._import(items())
+
+    def process_import_stream(self, chunks):
+        """Import từ file JSON dạng chunk (bytes), đọc tăng dần: history/holdings không nằm trọn trong RAM"""
+        return self._import(iter_object(chunks, stream_keys=('history', 'holdings')))
+
+    def _import(self, items):
+        # Mọi bước nằm trong 1 transaction: lỗi giữa chừng thì ROLLBACK, sổ cũ còn nguyên
         try:
-            # 1. Dọn sạch DB cũ
-            self.db.clear_all_data()
-
-            # Lấy tỷ giá để tính toán giá trị Crypto
-            r_row = self.db.execute_query("SELECT value FROM settings WHERE key = 'crypto_rate'", fetch_one=True)
-            rate = float(r_row['value']) if r_row else 25000.0
-
-            # 2. Xử lý Lịch sử (Nếu có)
-            for tx in json_data.get('history', []):
-                self.db.insert_raw_transaction(tx['wallet_id'], tx['type'], tx['amount'], tx['date'], tx.get('note', ''))
-
-            # 3. Phục hồi Ví & Danh mục
-            for w_id, w_data in json_data.get('wallets', {}).items():
-                net_capital = w_data['total_in'] - w_data['total_out']
-                current_cash = w_data['current_cash']
-                
-                asset_value_vnd = 0
-                total_cost_basis_vnd = 0 # Đã thêm biến lưu Tổng Giá Vốn
-
-                # Duyệt qua các tài sản đang cầm thuộc ví này
-                for h in json_data.get('holdings', []):
-                    if h['wallet_id'] == w_id:
+            with self.db.transaction():
+                # 1. Dọn sạch DB cũ
+                self.db.clear_all_data()
+
+                # 2. Lịch sử ghi theo lô ngay khi đọc tới; danh mục gom theo ví 1 lần
+                state = {'wallets': {}, 'holdings': defaultdict(list), 'settings': {}, 'version': '3.4', 'price_unit': None}
+                imported_pl = defaultdict(float)   # Lãi/Lỗ chốt đã có sẵn trong lịch sử (file EXPORT)
+                history = self._collect(items, state)
+                while True:
+                    rows = [self._history_row(tx) for tx in islice(history, HISTORY_BATCH)]
+                    if not rows: break
+                    for row in rows: imported_pl[row[0]] += row[6]
+                    self.db.insert_ledger_rows(rows)
+
+                if state['settings']:
+                    self.db.set_settings(state['settings'].items())
+
+                # Lấy tỷ giá để tính toán giá trị Crypto
+                rate = self.db.get_setting('crypto_rate')
+
+                # 3. Phục hồi Ví & Danh mục
+                holding_rows, wallet_rows, pnl_rows = [], [], []
+                for w_id, w_data in state['wallets'].items():
+                    net_capital = w_data['total_in'] - w_data['total_out']
+                    current_cash = w_data['current_cash']
+                    total_cost_basis_vnd = 0 # Tổng Giá Vốn
+                    fx = rate if w_id == 'CRYPTO' else 1
+
+                    for h in state['holdings'].get(w_id, ()):
                         market_price = h['market_price']
                         avg_price = h.get('average_price', market_price)
-                        
-                        if w_id == 'STOCK' and market_price < 1000: 
+
+                        # File Excel cũ ghi giá CK theo nghìn đồng; file EXPORT (price_unit = vnd) đã là VNĐ
+                        if w_id == 'STOCK' and market_price < 1000 and state['price_unit'] != 'vnd':
                             market_price *= 1000
                             if avg_price < 1000: avg_price *= 1000
-                        
-                        val_vnd = h['qty'] * market_price * (rate if w_id == 'CRYPTO' else 1)
-                        cost_basis_vnd = h['qty'] * avg_price * (rate if w_id == 'CRYPTO' else 1)
-                        
-                        asset_value_vnd += val_vnd
+
+                        # File EXPORT mang sẵn giá vốn VNĐ (crypto theo tỷ giá lúc mua)
+                        cost_basis_vnd = h['cost_basis_vnd'] if 'cost_basis_vnd' in h else h['qty'] * avg_price * fx
                         total_cost_basis_vnd += cost_basis_vnd # Cộng dồn Giá Vốn
-                        
-                        # Nạp danh mục
-                        self.db.execute_query(
-                            "INSERT INTO holdings (wallet_id, symbol, quantity, average_price, current_price, cost_basis_vnd) VALUES (?, ?, ?, ?, ?, ?)",
-                            (w_id, h['symbol'].upper(), h['qty'], avg_price, market_price, cost_basis_vnd)
-                        )
-
-                # Cập nhật Ví gốc
-                self.db.force_update_wallet(w_id, current_cash, w_data['total_in'], w_data['total_out'])
-
-                # 4. Thuật toán bù trừ: Ghi Lãi/Lỗ Quá Khứ
-                if w_id in ['STOCK', 'CRYPTO']:
-                    # ✅ FIX LỖI TÍNH ĐÚP: Dùng tổng Giá Vốn (cost_basis) thay vì Giá Thị Trường (asset_value)
-                    historical_pnl = (current_cash + total_cost_basis_vnd) - net_capital
-                    if historical_pnl != 0:
-                        self.db.insert_historical_pnl(w_id, historical_pnl, f"Lãi/Lỗ dồn tích trước {json_data.get('version', '3.4')}")
+                        holding_rows.append((w_id, h['symbol'].upper(), h['qty'], avg_price, market_price, cost_basis_vnd))
+
+                    # Cập nhật Ví gốc
+                    wallet_rows.append((current_cash, w_data['total_in'], w_data['total_out'], w_id))
+
+                    # 4. Thuật toán bù trừ: Ghi Lãi/Lỗ Quá Khứ
+                    if w_id in ['STOCK', 'CRYPTO']:
+                        # ✅ FIX LỖI TÍNH ĐÚP: Dùng tổng Giá Vốn (cost_basis) thay vì Giá Thị Trường (asset_value)
+                        historical_pnl = (current_cash + total_cost_basis_vnd) - net_capital - imported_pl[w_id]
+                        if historical_pnl != 0:
+                            pnl_rows.append((w_id, historical_pnl, f"Lãi/Lỗ dồn tích trước {state['version']}"))
+
+                self.db.insert_holdings(holding_rows)
+                self.db.record_prices([(r[1], r[4]) for r in holding_rows])
+                self.db.execute_many("UPDATE wallets SET balance = ?, total_in = ?, total_out = ? WHERE id = ?", wallet_rows)
+                self.db.execute_many("INSERT INTO transactions (wallet_id, type, amount, realized_pl, symbol, note) VALUES (?, 'CHOT_LICH_SU', 0, ?, NULL, ?)", pnl_rows)
+                # Sổ lô đang bật: file không mang chi tiết lô, mỗi mã mở lại 1 lô từ danh mục vừa nhập
+                if self.db.get_cost_method() != 'AVG':
+                    self.db.seed_lots()
 
             return True, "✅ Khôi phục thành công! Toàn bộ sổ sách Excel đã được tích hợp."
         except Exception as e:
             return False, f"❌ Lỗi cấu trúc file Import: {str(e)}"
+
+    def _collect(self, items, state):
+        """Tách luồng (khóa, giá trị): ví & danh mục gom vào state (nhỏ), yield từng dòng lịch sử cho bên gọi"""
+        for key, value in items:
+            if key == 'history':
+                yield value
+            elif key == 'holdings':
+                state['holdings'][value['wallet_id']].append(value)
+            elif key == 'wallets':
+                state['wallets'].update(value)
+            elif key == 'settings':
+                state['settings'].update(value)
+            elif key in ('version', 'price_unit'):
+                state[key] = value
+
+    def _history_row(self, tx):
+        """1 dòng lịch sử -> bộ giá trị cho insert_ledger_rows.
+        File Excel cũ chỉ có date/note; file EXPORT có đủ mã, SL, giá, lãi chốt và timestamp."""
+        if 'timestamp' in tx:
+            note, ts = tx.get('note'), tx['timestamp']
+        else:
+            # Ngày chỉ nằm trong note: đọc được thì ghi luôn vào timestamp để lọc theo khoảng ngày
+            note, ts = f"[{tx['date']}] {tx.get('note', '')}", parse_ledger_date(tx['date'])
+        return (tx['wallet_id'], tx['type'], tx.get('symbol'), tx.get('quantity') or 0, tx.get('price') or 0,
+                tx['amount'], tx.get('realized_pl') or 0, ts, note)
@@ -0,0 +1,81 @@
+# backend/services/nav_service.py
+# Chuỗi NAV theo ngày: sau khi dữ liệu 1 shard đổi (COMMIT), thread nền ghi đè dòng NAV hôm nay
+# từ snapshot tổng hợp (không replay sổ). Bảng gộp tuần/tháng do trigger trong SQLite duy trì.
+import logging, threading, time
+from datetime import date
+from backend.core.metrics import summarize_nav
+from backend.database.repository import ConnectionPool, DatabaseRepo, pin_pool
+
+logger = logging.getLogger(__name__)
+
+NAV_DEBOUNCE = 2.0   # giây: các lệnh ghi liên tiếp trong khoảng này chỉ dựng snapshot + ghi NAV 1 lần
+
+_lock = threading.Lock()   # mỗi lúc chỉ 1 lần ghi NAV (thread nền hoặc flush)
+_recorded = {}   # file DB -> data version đã ghi NAV (version tăng toàn cục nên so sánh được)
+_dirty = set()   # file DB có ghi mới, đang chờ thread nền ghi NAV
+_dirty_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+
+def record_nav(db, day=None):
+    """Ghi NAV của sổ `db` cho ngày `day` (mặc định hôm nay); bỏ qua nếu đã ghi từ snapshot mới hơn"""
+    path = db.pool.db_path
+    with _lock:
+        snap = db.get_snapshot()
+        if day is None and _recorded.get(path, 0) >= snap.version: return
+        db.record_nav((day or date.today()).isoformat(), summarize_nav(snap))
+        if day is None: _recorded[path] = snap.version
+
+def flush(db_path=None):
+    """Ghi NAV ngay cho các shard đang chờ (hoặc chỉ db_path) thay vì đợi thread nền"""
+    with _dirty_lock:
+        paths = set(_dirty) if db_path is None else _dirty & {db_path}
+        _dirty.difference_update(paths)
+    for path in paths:
+        try:
+            with pin_pool(path):
+                record_nav(DatabaseRepo(path))
+        except Exception as e:
+            logger.warning("Ghi NAV %s lỗi: %s", path, e)
+    # Đi theo LRU shard: shard đã đóng thì bỏ mốc version (mở lại sẽ có version mới và ghi lại NAV)
+    open_paths = set(ConnectionPool.open_paths())
+    with _lock:
+        for path in [p for p in _recorded if p not in open_paths]:
+            del _recorded[path]
+
+def _run():
+    while True:
+        _wake.wait()
+        _wake.clear()
+        time.sleep(NAV_DEBOUNCE)
+        flush()
+
+def _on_write(pool, version):
+    """Chạy trên thread của lệnh ghi nên chỉ đánh dấu shard; NAV là dữ liệu dẫn xuất, ghi trễ vài giây không sao"""
+    global _thread
+    if not pool.initialized: return   # đang tạo schema / dựng bảng tổng hợp lần đầu
+    with _dirty_lock:
+        _dirty.add(pool.db_path)
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name='nav-recorder', daemon=True)
+            _thread.start()
+    _wake.set()
+
+ConnectionPool.add_listener(_on_write)
+
+def period_returns(rows):
+    """rows cũ -> mới (bảng gộp tuần/tháng hoặc chuỗi ngày) -> [(kỳ, tài sản cuối kỳ, lãi/lỗ trong kỳ, %)].
+    Lãi/lỗ trong kỳ = chênh lệch lãi/lỗ lũy kế so với cuối kỳ trước, nên tiền nạp/rút không bị tính là lợi nhuận;
+    % tính trên tài sản cuối kỳ trước (kỳ đầu tiên: đầu kỳ)."""
+    out, prev = [], None
+    for r in rows:
+        if 'bucket' in r:
+            label, assets, pnl, base = r['bucket'], r['close_assets'], r['close_pnl'], (r['open_assets'], r['open_pnl'])
+        else:
+            label, assets, pnl = r['day'], r['assets'], r['pnl']
+            base = (assets, pnl)
+        base_assets, base_pnl = prev or base
+        change = pnl - base_pnl
+        out.append((label, assets, change, change / base_assets * 100 if base_assets > 0 else 0))
+        prev = (assets, pnl)
+    return out
@@ -0,0 +1,204 @@
+# backend/services/price_service.py
+# Lấy giá thị trường tự động: provider cắm được (file CSV/JSON hoặc HTTP), cache TTL theo mã,
+# gộp request đồng thời cùng mã thành 1 lần fetch, thread nền làm tươi giá cho các shard đang mở.
+import csv, json, logging, os, threading, time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+import requests
+from backend.core.parser import normalize_trade_price
+from backend.database.repository import ConnectionPool, DatabaseRepo, pin_pool
+from config import PRICE_PROVIDER, PRICE_TTL, PRICE_REFRESH_INTERVAL, PRICE_FETCH_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# PROVIDER
+# ==========================================
+class PriceProvider(ABC):
+    """Nguồn giá: fetch(symbols) -> {MÃ: giá}. Mã nguồn không biết thì bỏ qua, lỗi mạng/file thì raise."""
+    name = 'base'
+
+    @abstractmethod
+    def fetch(self, symbols):
+        ...
+
+class FilePriceProvider(PriceProvider):
+    """Đọc bảng giá từ file cục bộ: CSV 2 cột (mã, giá; có/không header) hoặc JSON {mã: giá}.
+    File chỉ được đọc lại khi mtime đổi - chạy offline, hợp cho test/benchmark hoặc job ngoài ghi file."""
+    name = 'file'
+
+    def __init__(self, path):
+        self.path = path
+        self._table, self._mtime = {}, None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as fp:
+            if self.path.endswith('.json'):
+                return {str(k).upper(): float(v) for k, v in json.load(fp).items()}
+            table = {}
+            for row in csv.reader(fp):
+                if len(row) < 2: continue
+                try: table[row[0].strip().upper()] = float(row[1])
+                except ValueError: continue   # header
+            return table
+
+    def fetch(self, symbols):
+        with self._lock:
+            mtime = os.path.getmtime(self.path)
+            if mtime != self._mtime:
+                self._table, self._mtime = self._load(), mtime
+            table = self._table
+        return {s: table[s] for s in symbols if s in table}
+
+class HttpPriceProvider(PriceProvider):
+    """GET {url}?symbols=A,B -> JSON {mã: giá}. Dùng được với stub HTTP chạy local."""
+    name = 'http'
+
+    def __init__(self, url, timeout=PRICE_FETCH_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+
+    def fetch(self, symbols):
+        resp = requests.get(self.url, params={'symbols': ','.join(symbols)}, timeout=self.timeout)
+        resp.raise_for_status()
+        return {str(k).upper(): float(v) for k, v in resp.json().items() if v is not None}
+
+def make_provider(spec):
+    """'http(s)://...' -> HttpPriceProvider, 'file:đường_dẫn' hoặc đường dẫn -> FilePriceProvider, rỗng -> None"""
+    if not spec: return None
+    if spec.startswith(('http://', 'https://')): return HttpPriceProvider(spec)
+    return FilePriceProvider(spec[5:] if spec.startswith('file:') else spec)
+
+# ==========================================
+# CACHE TTL + GỘP REQUEST
+# ==========================================
+class PriceService:
+    def __init__(self, provider, ttl=PRICE_TTL):
+        self.provider = provider
+        self.ttl = ttl
+        self._cache = {}      # mã -> (giá hoặc None, thời điểm fetch)
+        self._inflight = {}   # mã -> Future của lần fetch đang chạy
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._wanted = set()   # shard được handler nhờ làm tươi sớm (không chờ hết chu kỳ)
+        self._thread = None
+        self.hits = self.fetches = self.fetched_symbols = self.coalesced = self.errors = self.writes = 0
+
+    def get_prices(self, symbols):
+        """{MÃ: giá} cho các mã nguồn có giá. Mã còn hạn TTL lấy từ cache; mã hết hạn gom vào 1 lần fetch,
+        request khác hỏi cùng mã trong lúc đó chờ chung kết quả thay vì fetch lại."""
+        prices, mine, waiting = {}, {}, []
+        now = time.monotonic()
+        with self._lock:
+            for symbol in dict.fromkeys(s.upper() for s in symbols):
+                hit = self._cache.get(symbol)
+                if hit and now - hit[1] < self.ttl:
+                    self.hits += 1
+                    if hit[0] is not None: prices[symbol] = hit[0]
+                elif symbol in self._inflight:
+                    self.coalesced += 1
+                    waiting.append((symbol, self._inflight[symbol]))
+                else:
+                    mine[symbol] = self._inflight[symbol] = Future()
+        if mine:
+            prices.update(self._fetch(mine))
+        for symbol, future in waiting:
+            price = future.result()
+            if price is not None: prices[symbol] = price
+        return prices
+
+    def _fetch(self, futures):
+        failed = False
+        try:
+            result = self.provider.fetch(list(futures))
+        except Exception as e:
+            # Lỗi cũng được cache hết TTL: nguồn giá chết không làm mọi dashboard phải chờ timeout
+            logger.warning("Lấy giá từ %s lỗi: %s", self.provider.name, e)
+            result, failed = {}, True
+        result = {s: p for s, p in result.items() if s in futures}
+        now = time.monotonic()
+        with self._lock:
+            self.errors += failed
+            self.fetches += 1
+            self.fetched_symbols += len(futures)
+            for symbol, future in futures.items():
+                self._cache[symbol] = (result.get(symbol), now)
+                del self._inflight[symbol]
+                future.set_result(result.get(symbol))
+        return result
+
+    def refresh(self, db):
+        """Làm tươi giá các mã đang giữ của 1 sổ; chỉ ghi (1 transaction) những mã có giá khác giá đang lưu.
+        Giá nguồn < 1000 chỉ được hiểu là nghìn đồng với mã thuộc ví STOCK (crypto giữ nguyên USD)"""
+        held = db.get_held_symbols()
+        if not held: return 0
+        prices = {s: normalize_trade_price(held[s], p) for s, p in self.get_prices(held).items()}
+        if not prices: return 0
+        stored = db.get_latest_prices(prices)
+        quotes = [(s, p) for s, p in prices.items() if stored.get(s) != p]
+        if quotes:
+            db.update_market_prices(quotes)
+            with self._lock: self.writes += len(quotes)
+        return len(quotes)
+
+    # ==========================================
+    # THREAD NỀN
+    # ==========================================
+    def request_refresh(self, db_path):
+        """Gọi từ handler: không bao giờ chờ nguồn giá trên luồng xử lý tin nhắn, chỉ nhờ thread nền làm tươi shard này.
+        Tin nhắn hiện tại dùng giá đang lưu; giá mới ghi xong thì lần xem sau (data version mới) thấy ngay."""
+        with self._lock: self._wanted.add(db_path)
+        self._wake.set()
+
+    def refresh_open_shards(self):
+        """1 vòng làm tươi: mọi shard đang mở; các shard trùng mã dùng chung cache nên mỗi mã chỉ fetch 1 lần"""
+        self.refresh_shards(ConnectionPool.open_paths())
+
+    def refresh_shards(self, paths):
+        for db_path in paths:
+            try:
+                with pin_pool(db_path):
+                    self.refresh(DatabaseRepo(db_path))
+            except Exception as e:
+                logger.warning("Làm tươi giá %s lỗi: %s", db_path, e)
+
+    def _run(self, interval):
+        next_round = time.monotonic() + interval
+        while True:
+            self._wake.wait(max(0, next_round - time.monotonic()))
+            self._wake.clear()
+            if self._stop.is_set(): break
+            with self._lock:
+                wanted, self._wanted = self._wanted, set()
+            if time.monotonic() >= next_round:
+                self.refresh_open_shards()
+                next_round = time.monotonic() + interval
+            else:
+                self.refresh_shards(wanted)
+
+    def start(self, interval=PRICE_REFRESH_INTERVAL):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='price-refresher', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'provider': self.provider.name, 'ttl': self.ttl, 'cached': len(self._cache), 'hits': self.hits,
+                'fetches': self.fetches, 'fetched_symbols': self.fetched_symbols, 'coalesced': self.coalesced,
+                'errors': self.errors, 'writes': self.writes
+            }
+
+# None khi chưa cấu hình PRICE_PROVIDER: giá vẫn cập nhật tay bằng lệnh up như cũ
+_provider = make_provider(PRICE_PROVIDER)
+price_service = PriceService(_provider) if _provider else None
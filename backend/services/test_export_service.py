@@ -0,0 +1,58 @@
+# backend/services/test_export_service.py
+# EXPORT JSON rồi import lại phải ra đúng sổ cũ: danh mục, giá và lịch sử giao dịch không đổi.
+import io, json
+import pytest
+from backend.services.export_service import ExportService
+from backend.services.import_service import ImportService
+from backend.database.repository import HOLDINGS_VALUED
+
+TX_COLS = "wallet_id, type, symbol, quantity, price, amount, realized_pl, timestamp, note"
+
+@pytest.fixture
+def ledger(db):
+    db.update_cash_balance(10**9, 'NAP')
+    db.transfer_funds('CASH', 'STOCK', 3 * 10**8)
+    db.transfer_funds('CASH', 'CRYPTO', 2 * 10**8)
+    # Giá VNĐ dưới 1000 (cổ phiếu penny) phải giữ nguyên, không bị hiểu là nghìn đồng lần nữa
+    db.execute_trade('STOCK', 'PNY', 10_000, 800, 8_000_000)
+    db.execute_trade('STOCK', 'FPT', 1_000, 110_000, 110_000_000)
+    db.execute_trade('STOCK', 'FPT', -400, 120_000, 48_000_000)
+    db.execute_trade('CRYPTO', 'XRP', 1_000, 0.55, 13_750_000)
+    db.update_market_prices([('PNY', 750), ('XRP', 0.6)])
+    db.execute_query("UPDATE transactions SET note = 'chốt lời' WHERE type = 'BAN'")
+    return db
+
+def _state(db):
+    # Giá hiện hành theo bảng prices (như lúc định giá), không theo cột current_price đã cũ của holdings
+    holdings = sorted((dict(r, id=None) for r in db.execute_query(HOLDINGS_VALUED, fetch_all=True)), key=lambda r: (r['wallet_id'], r['symbol']))
+    return (holdings,
+            db.execute_query(f"SELECT {TX_COLS} FROM transactions ORDER BY id", fetch_all=True),
+            db.execute_query("SELECT id, balance, total_in, total_out FROM wallets ORDER BY id", fetch_all=True),
+            db.get_latest_prices(['PNY', 'FPT', 'XRP']))
+
+def _export(db):
+    fp = io.StringIO()
+    ExportService().write_json(fp)
+    return fp.getvalue()
+
+def test_json_export_round_trip(ledger):
+    before = _state(ledger)
+    ok, msg = ImportService().process_import_file(json.loads(_export(ledger)))
+    assert ok, msg
+    assert _state(ledger) == before
+
+def test_streamed_export_round_trip(ledger):
+    before = _state(ledger)
+    text = _export(ledger).encode('utf-8')
+    ok, msg = ImportService().process_import_stream(text[i:i + 64] for i in range(0, len(text), 64))
+    assert ok, msg
+    assert _state(ledger) == before
+
+def test_legacy_file_prices_still_in_thousands(db):
+    legacy = {'wallets': {'STOCK': {'total_in': 10**7, 'total_out': 0, 'current_cash': 7_500_000}},
+              'holdings': [{'wallet_id': 'STOCK', 'symbol': 'VPB', 'qty': 100, 'average_price': 25, 'market_price': 26.5}],
+              'history': []}
+    ok, msg = ImportService().process_import_file(legacy)
+    assert ok, msg
+    h = db.execute_query("SELECT average_price, current_price FROM holdings WHERE symbol = 'VPB'", fetch_one=True)
+    assert (h['average_price'], h['current_price']) == (25_000, 26_500)
@@ -0,0 +1,34 @@
+# backend/services/test_nav_service.py
+# NAV ngày ghi ở thread nền (gom theo NAV_DEBOUNCE); bảng gộp tuần/tháng do trigger giữ đúng ngày đầu / cuối kỳ.
+import random, time
+from backend.services import nav_service
+
+def test_write_records_nav_in_background(db, monkeypatch):
+    monkeypatch.setattr(nav_service, 'NAV_DEBOUNCE', 0.05)
+    db.update_cash_balance(10**6, 'NAP')
+    for _ in range(100):
+        if db.get_nav_series(): break
+        time.sleep(0.02)
+    assert db.get_nav_series()[-1]['assets'] == 10**6
+    assert db.pool.db_path in nav_service._recorded
+
+def test_flush_writes_pending_nav_now(db, monkeypatch):
+    monkeypatch.setattr(nav_service, 'NAV_DEBOUNCE', 60)
+    db.update_cash_balance(2 * 10**6, 'NAP')
+    nav_service.flush(db.pool.db_path)
+    assert db.get_nav_series()[-1]['assets'] == 2 * 10**6
+
+def test_monthly_rollups_match_first_and_last_day(db, table):
+    rng = random.Random(3)
+    days = [f"2024-{m:02d}-{d:02d}" for m in range(1, 4) for d in range(1, 29)]
+    # Ghi không theo thứ tự ngày, có ghi đè: rollup vẫn phải lấy đúng ngày đầu / cuối kỳ
+    for day in rng.sample(days, len(days)) + rng.sample(days, 10):
+        db.record_nav(day, {'TOTAL': (rng.uniform(1e8, 2e8), 1e8, rng.uniform(-1e7, 1e7))})
+    expected = table("""WITH g AS (SELECT substr(day, 1, 7) AS bucket, MIN(day) AS first_day, MAX(day) AS last_day
+            FROM nav_snapshots WHERE wallet_id = 'TOTAL' GROUP BY 1)
+        SELECT 'M', bucket, first_day, last_day,
+            (SELECT assets FROM nav_snapshots WHERE wallet_id = 'TOTAL' AND day = first_day) AS open_assets,
+            (SELECT assets FROM nav_snapshots WHERE wallet_id = 'TOTAL' AND day = last_day) AS close_assets
+        FROM g""", 4)
+    assert table("""SELECT period, bucket, first_day, last_day, open_assets, close_assets FROM nav_rollups
+        WHERE period = 'M' AND wallet_id = 'TOTAL'""", 4) == expected
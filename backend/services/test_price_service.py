@@ -0,0 +1,62 @@
+# backend/services/test_price_service.py
+# Nguồn giá chỉ được gọi từ thread nền (handler không chờ mạng); giá CK nghìn đồng chỉ nhân 1000 với ví STOCK.
+import threading, time
+import pytest
+from backend.services.price_service import PriceProvider, PriceService
+
+class SlowProvider(PriceProvider):
+    name = 'slow'
+
+    def __init__(self, table, delay=0.3):
+        self.table, self.delay = table, delay
+        self.calls = []
+
+    def fetch(self, symbols):
+        self.calls.append((threading.current_thread().name, sorted(symbols)))
+        time.sleep(self.delay)
+        return {s: self.table[s] for s in symbols if s in self.table}
+
+@pytest.fixture
+def held(db):
+    db.update_cash_balance(10**9, 'NAP')
+    db.transfer_funds('CASH', 'STOCK', 10**8)
+    db.transfer_funds('CASH', 'CRYPTO', 10**8)
+    db.execute_trade('STOCK', 'FPT', 100, 100_000, 10**7)
+    db.execute_trade('CRYPTO', 'XRP', 100, 0.6, 1_500_000)
+    return db
+
+def test_provider_base_is_abstract():
+    with pytest.raises(TypeError):
+        PriceProvider()
+
+def test_request_refresh_never_blocks_on_provider(held):
+    provider = SlowProvider({'FPT': 110.5, 'XRP': 0.5})
+    service = PriceService(provider, ttl=60)
+    service.start(interval=3600)
+    try:
+        t0 = time.monotonic()
+        service.request_refresh(held.pool.db_path)
+        assert time.monotonic() - t0 < 0.05
+        for _ in range(100):
+            if held.get_latest_prices(['FPT']).get('FPT') == 110_500: break
+            time.sleep(0.02)
+    finally:
+        service.stop()
+    assert [name for name, _ in provider.calls] == ['price-refresher']
+    # FPT (ví STOCK) gõ theo nghìn đồng; XRP (ví CRYPTO) giữ nguyên USD dù < 1000
+    assert held.get_latest_prices(['FPT', 'XRP']) == {'FPT': 110_500, 'XRP': 0.5}
+
+def test_concurrent_lookups_share_one_fetch():
+    provider = SlowProvider({'FPT': 1.0}, delay=0.1)
+    service = PriceService(provider, ttl=60)
+    threads = [threading.Thread(target=service.get_prices, args=(['FPT'],)) for _ in range(10)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(provider.calls) == 1
+    assert service.stats()['coalesced'] + service.stats()['hits'] == 9
+
+def test_latest_prices_in_one_query(held):
+    held.update_market_prices([('FPT', 120_000), ('XRP', 0.7)])
+    held.update_market_prices([('FPT', 121_000)])
+    assert held.get_latest_prices(['fpt', 'XRP', 'NONE']) == {'FPT': 121_000, 'XRP': 0.7}
+    assert held.get_latest_prices([]) == {}
@@ -0,0 +1,76 @@
+# backend/telegram/async_runtime.py
+# Runtime asyncio: gửi/nhận Telegram trên event loop (AsyncTeleBot, cần aiohttp),
+# còn mọi thao tác SQLite chạy trong 1 executor riêng -> 1 lượt gửi chậm không chặn việc đọc/ghi sổ của chat khác.
+import asyncio, logging
+from concurrent.futures import ThreadPoolExecutor
+from backend.database.repository import use_chat
+from backend.telegram.handlers import MESSAGE_ROUTES, CALLBACK_ROUTES, chat_of
+
+logger = logging.getLogger(__name__)
+
+def _step(chat_id, gen):
+    """Chạy handler tới Reply kế tiếp (trong thread DB, trên đúng sổ của chat). None = handler đã xong."""
+    with use_chat(chat_id):
+        return next(gen, None)
+
+class AsyncRuntime:
+    """Đăng ký các handler dùng chung lên AsyncTeleBot dưới dạng coroutine"""
+
+    def __init__(self, token, db_workers=4):
+        from telebot.async_telebot import AsyncTeleBot
+        self.bot = AsyncTeleBot(token)
+        self.db_executor = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix='db-worker')
+        self._chat_locks = {}   # chat_id -> [asyncio.Lock, số task đang giữ/chờ]
+        for filters, handler in MESSAGE_ROUTES:
+            self.bot.register_message_handler(self._wrap(handler), **filters)
+        for filters, handler in CALLBACK_ROUTES:
+            self.bot.register_callback_query_handler(self._wrap(handler), **filters)
+
+    def _wrap(self, handler):
+        async def run(update):
+            await self.handle(handler, update)
+        return run
+
+    async def handle(self, handler, update):
+        chat_id = chat_of(update)
+        loop = asyncio.get_running_loop()
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # AsyncTeleBot chạy các update song song: khóa theo chat để giữ đúng thứ tự trong 1 chat
+            async with entry[0]:
+                gen = handler(update)
+                while True:
+                    reply = await loop.run_in_executor(self.db_executor, _step, chat_id, gen)
+                    if reply is None: break
+                    await reply.send_async(self.bot)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat_id]
+
+    async def close(self):
+        from telebot import asyncio_helper
+        # close_session lỗi nếu bot chưa từng mở phiên aiohttp nào
+        if asyncio_helper.session_manager.session:
+            await self.bot.close_session()
+        self.db_executor.shutdown(wait=True)
+
+    async def run(self):
+        try:
+            await self.bot.infinity_polling()
+        finally:
+            await self.close()
+
+    async def run_webhook(self, make_server):
+        """Chế độ webhook: server HTTP chạy trên thread riêng, chuyển update vào event loop theo đúng thứ tự nhận"""
+        loop = asyncio.get_running_loop()
+        def feed(updates):
+            asyncio.run_coroutine_threadsafe(self.bot.process_new_updates(updates), loop)
+        server = make_server(feed)
+        try:
+            await loop.run_in_executor(None, server.serve_forever)
+        finally:
+            server.shutdown()
+            server.server_close()
+            await self.close()
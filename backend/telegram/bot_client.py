@@ -11,4 +11,5 @@ if not TOKEN:
     sys.exit(1)
 
 # Khởi tạo thực thể bot duy nhất (Singleton)
-bot = telebot.TeleBot(TOKEN)
+# threaded=False: việc chia luồng do ChatDispatcher đảm nhận (tuần tự theo từng chat)
+bot = telebot.TeleBot(TOKEN, threaded=False, use_class_middlewares=True)
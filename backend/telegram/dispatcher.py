@@ -0,0 +1,103 @@
+# backend/telegram/dispatcher.py
+import logging, threading, time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+def update_chat_id(update):
+    """Chat sở hữu 1 update (None nếu update không gắn với chat nào)"""
+    if update.message: return update.message.chat.id
+    if update.edited_message: return update.edited_message.chat.id
+    if update.callback_query and update.callback_query.message: return update.callback_query.message.chat.id
+    return None
+
+class ChatDispatcher:
+    """Xử lý update trên 1 pool worker có giới hạn: song song giữa các chat, tuần tự trong cùng 1 chat.
+    Hàng đợi đầy (max_pending) thì luồng nhận update bị chặn lại (backpressure)."""
+
+    def __init__(self, workers=8, max_pending=1000):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chat-worker')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._queues = {}   # chat_id -> deque[(thời điểm vào hàng, func, args)]
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)   # báo khi không còn chat nào có việc (dùng lúc shutdown)
+        self.workers, self.max_pending = workers, max_pending
+        self.pending = self.peak_pending = 0
+        self.processed = self.failed = 0
+        self.wait_total = self.wait_max = 0.0
+        self.blocked_total = 0.0
+
+    def submit(self, chat_id, func, *args):
+        t0 = time.monotonic()
+        self._slots.acquire()
+        blocked = time.monotonic() - t0
+        with self._lock:
+            self.blocked_total += blocked
+            self.pending += 1
+            self.peak_pending = max(self.peak_pending, self.pending)
+            queue = self._queues.get(chat_id)
+            idle = queue is None
+            if idle:
+                queue = self._queues[chat_id] = deque()
+            queue.append((time.monotonic(), func, args))
+        # Chat đang có việc thì worker hiện tại sẽ tự lấy tiếp, không mở worker thứ 2 cho cùng chat
+        if idle:
+            self._executor.submit(self._run_next, chat_id)
+
+    def _run_next(self, chat_id):
+        with self._lock:
+            queued_at, func, args = self._queues[chat_id].popleft()
+        wait = time.monotonic() - queued_at
+        try:
+            func(*args)
+            ok = True
+        except Exception:
+            logger.exception("Lỗi khi xử lý update của chat %s", chat_id)
+            ok = False
+        finally:
+            self._slots.release()
+        with self._lock:
+            self.pending -= 1
+            self.processed += ok
+            self.failed += not ok
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            more = bool(self._queues[chat_id])
+            if not more:
+                del self._queues[chat_id]
+                if not self._queues: self._drained.notify_all()
+        # Mỗi lượt chỉ xử lý 1 update rồi xếp lại cuối hàng worker: chat spam không chiếm trọn 1 thread
+        if more:
+            self._executor.submit(self._run_next, chat_id)
+
+    def install(self, bot):
+        """Chuyển mọi update của bot (polling/webhook) qua dispatcher. bot phải tạo với threaded=False."""
+        process = bot.process_new_updates
+        def process_new_updates(updates):
+            # Polling đọc offset từ last_update_id ngay sau khi hàm này trả về, trong khi update còn nằm trong hàng đợi:
+            # phải tiến offset tại đây, nếu không lượt getUpdates sau lấy lại đúng các update đó (giao dịch bị ghi 2 lần)
+            if updates:
+                bot.last_update_id = max(bot.last_update_id, max(u.update_id for u in updates))
+            for update in updates:
+                self.submit(update_chat_id(update), process, [update])
+        bot.process_new_updates = process_new_updates
+
+    def stats(self):
+        with self._lock:
+            done = self.processed + self.failed
+            return {
+                'workers': self.workers, 'pending': self.pending, 'peak_pending': self.peak_pending,
+                'max_pending': self.max_pending, 'active_chats': len(self._queues),
+                'deepest_chat_queue': max((len(q) for q in self._queues.values()), default=0),
+                'processed': self.processed, 'failed': self.failed,
+                'avg_wait_ms': (self.wait_total / done * 1000) if done else 0,
+                'max_wait_ms': self.wait_max * 1000, 'blocked_ms': self.blocked_total * 1000
+            }
+
+    def shutdown(self, wait=True):
+        """wait=True: chờ mọi chat xử lý hết hàng đợi rồi mới đóng pool (update đã nhận không bị mất)"""
+        if wait:
+            with self._drained:
+                self._drained.wait_for(lambda: not self._queues)
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,415 @@
+# backend/telegram/handlers.py
+# Handler dùng chung cho cả 2 runtime (threads / asyncio).
+# Mỗi handler là 1 generator: tính toán (đọc/ghi sổ) rồi yield từng Reply cần gửi,
+# runtime lo việc gửi thật (TeleBot đồng bộ hoặc AsyncTeleBot), nên không handler nào giữ kết nối mạng.
+import os, asyncio
+from functools import partial
+from backend.telegram.keyboards import get_home_keyboard, get_stock_keyboard, get_crypto_keyboard, get_history_keyboard
+from backend.database.repository import DatabaseRepo
+from backend.modules.dashboard import DashboardModule
+from backend.modules.stock import StockModule
+from backend.modules.wallet import WalletModule
+from backend.modules.crypto import CryptoModule
+from backend.modules.data_manager import DataManagerModule
+from backend.modules.history import HistoryModule
+from backend.modules.batch import BatchModule
+from backend.modules.charts import ChartModule
+from backend.modules.lots import LotModule, COST_METHODS
+from backend.modules.report import ReportModule
+from backend.core.parser import parse_currency, parse_trade_command, normalize_trade_price, parse_price_quotes, split_lot_ref, parse_date_range
+from backend.utils.render_cache import render_cache
+from backend.services.price_service import price_service
+from backend.services.chart_service import chart_service
+from backend.telegram.router import CommandRouter
+
+db = DatabaseRepo()
+dash = DashboardModule()
+stock_mod = StockModule()
+crypto_mod = CryptoModule()
+wallet_mod = WalletModule()
+data_mod = DataManagerModule()
+hist_mod = HistoryModule()
+batch_mod = BatchModule()
+chart_mod = ChartModule()
+lot_mod = LotModule()
+report_mod = ReportModule()
+
+user_context = {}
+
+class Reply:
+    """1 lệnh gửi Telegram: tên method của bot + tham số (giống hệt chữ ký của TeleBot/AsyncTeleBot)"""
+    __slots__ = ('method', 'args', 'kwargs')
+
+    def __init__(self, method, *args, **kwargs):
+        self.method, self.args, self.kwargs = method, args, kwargs
+
+    def send(self, bot):
+        return getattr(bot, self.method)(*self.args, **self.kwargs)
+
+    async def send_async(self, bot):
+        return await getattr(bot, self.method)(*self.args, **self.kwargs)
+
+class ChartReply(Reply):
+    """Gửi ảnh biểu đồ: đã có file_id thì gửi lại ngay (không vẽ, không upload);
+    chưa có thì chờ worker vẽ xong lúc gửi (không giữ thread DB), upload rồi nhớ file_id"""
+    __slots__ = ('chart',)
+
+    def __init__(self, chat_id, chart, **kwargs):
+        super().__init__('send_photo', chat_id, **kwargs)
+        self.chart = chart
+
+    def send(self, bot):
+        if self.chart.file_id:
+            try:
+                msg = bot.send_photo(self.args[0], self.chart.file_id, **self.kwargs)
+                self.chart.reused()
+                return msg
+            except Exception:
+                self.chart.forget()
+        path = self.chart.future.result()
+        with open(path, 'rb') as f:
+            msg = bot.send_photo(self.args[0], f, **self.kwargs)
+        self.chart.remember(msg)
+        return msg
+
+    async def send_async(self, bot):
+        if self.chart.file_id:
+            try:
+                msg = await bot.send_photo(self.args[0], self.chart.file_id, **self.kwargs)
+                self.chart.reused()
+                return msg
+            except Exception:
+                self.chart.forget()
+        path = await asyncio.wrap_future(self.chart.future)
+        with open(path, 'rb') as f:
+            msg = await bot.send_photo(self.args[0], f, **self.kwargs)
+        self.chart.remember(msg)
+        return msg
+
+send_message = partial(Reply, 'send_message')
+reply_to = partial(Reply, 'reply_to')
+edit_message_text = partial(Reply, 'edit_message_text')
+answer_callback_query = partial(Reply, 'answer_callback_query')
+send_document = partial(Reply, 'send_document')
+
+# Bảng route theo đúng thứ tự đăng ký (thứ tự ưu tiên khi nhiều filter cùng khớp)
+MESSAGE_ROUTES, CALLBACK_ROUTES = [], []
+
+def message_handler(**filters):
+    def decorator(func):
+        MESSAGE_ROUTES.append((filters, func))
+        return func
+    return decorator
+
+def callback_query_handler(**filters):
+    def decorator(func):
+        CALLBACK_ROUTES.append((filters, func))
+        return func
+    return decorator
+
+# Tin nhắn text đi qua router: nút bấm tra dict, lệnh gõ tay khớp 1 regex -> đúng 1 handler
+router = CommandRouter()
+
+def chat_of(update):
+    """Chat sở hữu message / callback_query"""
+    return update.message.chat.id if hasattr(update, 'data') else update.chat.id
+
+@message_handler(commands=['rebuild'])
+def rebuild_aggregates(message):
+    db.rebuild_aggregates()
+    yield reply_to(message, "✅ Đã dựng lại bộ đếm & bảng tổng hợp Lãi/Lỗ từ sổ giao dịch.")
+
+@message_handler(commands=['cachestats'])
+def show_cache_stats(message):
+    st = render_cache.stats()
+    yield reply_to(message, f"🧠 Cache hiển thị: {st['entries']} bản | Hit {st['hits']} / Miss {st['misses']} ({st['hit_rate']:.1f}%)\n♻️ Bị xóa do ghi: {st['invalidations']} | Bị đẩy ra (LRU): {st['evictions']}")
+
+@message_handler(commands=['nav'])
+def show_nav(message):
+    args = message.text.split()[1:]
+    period = args[0][0].upper() if args else 'W'
+    yield reply_to(message, dash.get_nav_report(period if period in ('D', 'W', 'M') else 'W'))
+
+CHART_WALLETS = {'stock': 'STOCK', 'crypto': 'CRYPTO', 'other': 'OTHER', 'k': 'OTHER'}
+
+@message_handler(commands=['chart'])
+def show_chart(message):
+    """/chart [stock|crypto|other] | /chart nav [d|w|m] | /chart pnl [stock|crypto]"""
+    if not chart_service.available:
+        yield reply_to(message, "⚠️ Chưa cài matplotlib nên không vẽ được biểu đồ (pip install matplotlib).")
+        return
+    args = message.text.lower().split()[1:]
+    kind = args[0] if args else ''
+    if kind == 'nav':
+        period = args[1][0].upper() if len(args) > 1 else 'D'
+        chart = chart_mod.nav(period if period in ('D', 'W', 'M') else 'D')
+    elif kind == 'pnl':
+        chart = chart_mod.realized('CRYPTO' if 'crypto' in args else 'STOCK')
+    else:
+        chart = chart_mod.allocation(CHART_WALLETS.get(kind))
+    if chart is None:
+        yield reply_to(message, "ℹ️ Chưa đủ dữ liệu để vẽ biểu đồ này.")
+        return
+    yield ChartReply(message.chat.id, chart)
+
+@message_handler(commands=['chartstats'])
+def show_chart_stats(message):
+    st = chart_service.stats()
+    yield reply_to(message, f"🖼 Biểu đồ: vẽ mới {st['renders']} | Dùng lại ảnh trên đĩa {st['disk_hits']}\n📤 Upload {st['uploads']} | Gửi lại bằng file_id {st['file_id_sends']} | ⏳ Đang vẽ: {st['pending']} | ❌ Lỗi: {st['failures']}")
+
+@message_handler(commands=['lots'])
+def show_lots(message):
+    """/lots [MÃ] xem lô đang mở | /lots avg|fifo|lifo đổi cách tính giá vốn"""
+    args = message.text.split()[1:]
+    if args and args[0].upper() in COST_METHODS:
+        yield reply_to(message, lot_mod.set_method(args[0]))
+    else:
+        yield reply_to(message, lot_mod.get_lots_view(args[0] if args else None))
+
+@message_handler(commands=['pricestats'])
+def show_price_stats(message):
+    if price_service is None:
+        yield reply_to(message, "ℹ️ Chưa cấu hình nguồn giá tự động (PRICE_PROVIDER).")
+        return
+    st = price_service.stats()
+    yield reply_to(message, f"💹 Nguồn giá: {st['provider']} | TTL {st['ttl']}s | Đang cache: {st['cached']} mã\n🎯 Hit {st['hits']} | Fetch {st['fetches']} lần ({st['fetched_symbols']} mã) | Gộp chờ chung: {st['coalesced']}\n✍️ Giá đã ghi: {st['writes']} | ❌ Lỗi nguồn: {st['errors']}")
+
+def refresh_prices():
+    """Dashboard dựng từ giá đang lưu; việc lấy giá (TTL + gộp request) để thread nền làm, handler không chờ mạng"""
+    if price_service is not None:
+        price_service.request_refresh(db.pool.db_path)
+
+@message_handler(content_types=['document'])
+def handle_docs(message):
+    if message.document.file_name.endswith('.json'):
+        yield reply_to(message, "⏳ Đang phân tích sổ sách tài chính...")
+        yield reply_to(message, data_mod.handle_document(message.document.file_id))
+    else:
+        yield reply_to(message, "⚠️ Vui lòng gửi file định dạng .json")
+
+@message_handler(content_types=['text'])
+def route_text(message):
+    handler, typed = router.resolve(message.text)
+    if handler is None: return
+    if not typed:
+        yield from handler(message)
+        return
+    # Lệnh gõ tay: chuẩn hóa text 1 lần, lỗi nhập liệu trả về cho người dùng
+    text = message.text.lower().strip()
+    if '\n' in text: handler = cmd_batch
+    try:
+        yield from handler(message, text)
+    except Exception as e:
+        yield reply_to(message, f"❌ Lỗi: {str(e)}")
+
+@router.button("🏠 Trang chủ", "💼 Tài sản của bạn", "/start")
+def show_home(message):
+    user_context[message.chat.id] = 'HOME'
+    refresh_prices()
+    yield send_message(message.chat.id, dash.get_main_dashboard(), reply_markup=get_home_keyboard())
+
+@router.button("📊 Chứng Khoán")
+def show_stock(message):
+    user_context[message.chat.id] = 'STOCK'
+    refresh_prices()
+    yield send_message(message.chat.id, stock_mod.get_dashboard(), reply_markup=get_stock_keyboard())
+
+@router.button("🪙 Crypto", "🟡 Crypto")
+def show_crypto(message):
+    user_context[message.chat.id] = 'CRYPTO'
+    refresh_prices()
+    yield send_message(message.chat.id, crypto_mod.get_dashboard(), reply_markup=get_crypto_keyboard())
+
+@router.button("📈 Báo cáo nhóm")
+def show_report(message):
+    ctx = user_context.get(message.chat.id, 'STOCK')
+    refresh_prices()
+    if ctx == 'CRYPTO':
+        yield send_message(message.chat.id, crypto_mod.get_group_report())
+    else:
+        yield send_message(message.chat.id, stock_mod.get_group_report())
+
+@router.button("📊 Báo cáo", "/report")
+def show_period_report(message):
+    yield send_message(message.chat.id, report_mod.handle_report_command())
+
+@router.command('report')
+def cmd_report(message, text):
+    """report 2026 | report 2026-09 | report 2026-01..2026-06"""
+    parts = text.split()[1:]
+    yield reply_to(message, report_mod.handle_report_command(parts[0] if parts else None))
+
+@router.button("📥 EXPORT/IMPORT", "💾 Dữ liệu")
+def show_data_menu(message):
+    msg, markup = data_mod.get_menu_ui()
+    yield send_message(message.chat.id, msg, reply_markup=markup, parse_mode="Markdown")
+
+def send_export(chat_id, fmt):
+    # File tạm chỉ bị xóa sau khi runtime đã gửi xong (generator chạy tiếp sau yield)
+    for name, path in data_mod.export_files(fmt):
+        try:
+            with open(path, 'rb') as f:
+                yield send_document(chat_id, f, visible_file_name=name, caption=f"📤 {name}")
+        finally:
+            os.remove(path)
+
+@router.button("export", "/export")
+def export_json(message):
+    yield from send_export(message.chat.id, 'json')
+
+@router.command('export')
+def cmd_export(message, text):
+    yield from send_export(message.chat.id, 'csv' if 'csv' in text.split()[1:] else 'json')
+
+@callback_query_handler(func=lambda call: call.data.startswith('data_export_'))
+def handle_export_callbacks(call):
+    yield answer_callback_query(call.id, "⏳ Đang xuất dữ liệu...")
+    yield from send_export(call.message.chat.id, call.data.rsplit('_', 1)[1])
+
+# ==========================================
+# MODULE LỊCH SỬ (NÚT BẤM & LỌC)
+# ==========================================
+@router.button("📜 Lịch sử", "/history")
+def show_history(message):
+    yield send_message(message.chat.id, "🗄️ **ĐÃ MỞ TRUNG TÂM LƯU TRỮ**\n👇 Sử dụng menu bên dưới để lọc giao dịch:", reply_markup=get_history_keyboard(), parse_mode="Markdown")
+    msg, markup = hist_mod.get_history_ui(page=1, filter_type='ALL')
+    yield send_message(message.chat.id, msg, reply_markup=markup, parse_mode="Markdown")
+
+HISTORY_FILTERS = {
+    "💵 LS Nạp/Rút": "CASH",
+    "📊 LS Chứng khoán": "STOCK",
+    "🪙 LS Crypto": "CRYPTO",
+    "🥇 LS Khác": "OTHER"
+}
+
+@router.button(*HISTORY_FILTERS)
+def handle_history_filters(message):
+    f_type = HISTORY_FILTERS[message.text]
+    msg, markup = hist_mod.get_history_ui(page=1, filter_type=f_type)
+    yield send_message(message.chat.id, msg, reply_markup=markup, parse_mode="Markdown")
+
+HISTORY_SEARCH_GUIDE = "Gõ lệnh:\n👉 `his [MÃ]` (VD: `his VPB`)\n👉 `his nap` (Xem lịch sử Nạp)\n👉 `his rut` (Xem lịch sử Rút)\n👉 `his VPB 2026-01..2026-06` (Theo khoảng ngày)\n👉 `his hoan von` (Tìm trong ghi chú, gõ không dấu được)"
+
+@router.button("🔍 Tìm kiếm LS")
+def history_search_guide(message):
+    yield send_message(message.chat.id, f"🔍 **HƯỚNG DẪN TÌM KIẾM NHANH**\n\n{HISTORY_SEARCH_GUIDE}", parse_mode="Markdown")
+
+@router.button("🔙 Đóng Menu")
+def close_history_menu(message):
+    yield send_message(message.chat.id, "✅ Đã đóng Menu Lịch sử.", reply_markup=get_home_keyboard())
+    yield from show_home(message)
+
+# Xử lý lật trang Inline (ĐÃ FIX LỖI BỎ QUÊN NÚT 🚫)
+@callback_query_handler(func=lambda call: call.data.startswith('his_') or call.data == 'ignore')
+def handle_history_callbacks(call):
+    if call.data == 'ignore':
+        yield answer_callback_query(call.id, "⚠️ Bạn đang ở ranh giới trang (đầu/cuối) rồi!", show_alert=False)
+        return
+    parts = call.data.split('_')
+    if parts[1] == 'p':
+        page, filter_type = int(parts[2]), parts[3]
+        symbol = parts[4] if parts[4] != 'NONE' else None
+        cursor = parts[5] if len(parts) > 5 else None
+        msg, markup = hist_mod.get_history_ui(page, filter_type, symbol, cursor)
+        yield edit_message_text(msg, chat_id=call.message.chat.id, message_id=call.message.message_id, reply_markup=markup, parse_mode="Markdown")
+
+# ==========================================
+# PARSER NHẬN DIỆN LỆNH GÕ TAY
+# ==========================================
+@router.button("➕ Giao dịch")
+def trade_ins(message):
+    yield reply_to(message, "➕ **LỆNH GIAO DỊCH**\n- Stock: `s [MÃ] [SL] [GIÁ VNĐ]`\n- Crypto: `c [MÃ] [SL] [GIÁ USD]`", parse_mode="Markdown")
+
+@router.button("🔄 Cập nhật giá")
+def refresh_ins(message):
+    yield reply_to(message, "🔄 **CẬP NHẬT GIÁ NHANH**\nCú pháp: `up [MÃ] [GIÁ]`\nNhiều mã 1 lần: `up VPB 25 FPT 110 BTC 67000`", parse_mode="Markdown")
+
+# Bộ lọc từ khóa thông minh cho `his`; không trúng từ khóa nào thì tự hiểu đó là Mã (Ví dụ: VPB, ETH)
+HISTORY_KEYWORDS = {
+    'NAP': 'CASH', 'RUT': 'CASH', 'CASH': 'CASH',
+    'STOCK': 'STOCK', 'CK': 'STOCK', 'CHUNGKHOAN': 'STOCK',
+    'CRYPTO': 'CRYPTO', 'COIN': 'CRYPTO',
+    'KHAC': 'OTHER', 'OTHER': 'OTHER'
+}
+
+@router.command('his')
+def cmd_history(message, text):
+    parts = text.split()[1:]
+    if not parts: return
+    ranges = [r for r in map(parse_date_range, parts) if r]
+    words = [p for p in parts if not parse_date_range(p)]
+    if len(ranges) > 1:
+        # Nhiều khoảng ngày: không tự lấy khoảng đầu rồi bỏ phần còn lại, báo cú pháp cho người dùng gõ lại
+        yield reply_to(message, f"⚠️ Chỉ dùng được 1 khoảng ngày (VD: `2026-01..2026-06`).\n\n{HISTORY_SEARCH_GUIDE}", parse_mode="Markdown")
+        return
+    if len(words) == 1 and not ranges:
+        # 1 từ: từ khóa ví hoặc Mã (đi theo bộ đếm sẵn như cũ); mã chưa từng giao dịch thì tìm như chữ trong ghi chú
+        term = words[0].upper()
+        f_type = HISTORY_KEYWORDS.get(term)
+        if f_type:
+            msg, markup = hist_mod.get_history_ui(filter_type=f_type)
+        elif db.get_transactions_count(symbol=term):
+            msg, markup = hist_mod.get_history_ui(symbol=term)
+        else:
+            msg, markup = hist_mod.search(text=words[0], label=words[0])
+    else:
+        # his [ví|MÃ] [YYYY-MM..YYYY-MM] | his [chữ tìm trong ghi chú ...]
+        f_type = HISTORY_KEYWORDS.get(words[0].upper()) if words else None
+        symbol = None
+        if f_type: words = words[1:]
+        elif len(words) == 1 and db.get_transactions_count(symbol=words[0].upper()): symbol, words = words[0].upper(), []
+        date_from, date_to = ranges[0] if ranges else (None, None)
+        msg, markup = hist_mod.search(f_type or 'ALL', symbol, ' '.join(words) or None, date_from, date_to, label=' '.join(parts))
+    yield reply_to(message, msg, reply_markup=markup, parse_mode="Markdown")
+
+@router.command('del')
+def cmd_delete(message, text):
+    sym = text.split()[1].upper()
+    _, msg_text = db.delete_holding_and_refund(sym)
+    yield reply_to(message, msg_text, parse_mode="Markdown")
+
+@router.command('rate')
+def cmd_rate(message, text):
+    if text.startswith('rate crypto '):
+        val = float(text.replace('rate crypto ', '').strip())
+        db.set_setting('crypto_rate', val)
+        yield reply_to(message, f"✅ Đã cập nhật tỷ giá: 1 USD = {val:,.0f} đ")
+
+@router.command('nap', 'rut', 'chuyen', 'thu')
+def cmd_fund(message, text):
+    yield reply_to(message, wallet_mod.handle_fund_command(message.text))
+
+@router.command('k')
+def cmd_other_asset(message, text):
+    parts = text.split()
+    name, val = parts[1].upper(), parse_currency(" ".join(parts[2:]))
+    db.update_other_asset(name, val)
+    yield reply_to(message, f"✅ Ghi nhận {name}: {val:,.0f} đ")
+
+@router.command('up')
+def cmd_update_price(message, text):
+    quotes = parse_price_quotes(text)
+    db.update_market_prices(quotes)
+    yield reply_to(message, "\n".join(f"✅ {sym} = {real_p:,.2f}" for sym, real_p in quotes))
+
+@router.command('s', 'c')
+def cmd_trade(message, text):
+    text, lot_id = split_lot_ref(text)
+    parsed = parse_trade_command(text)
+    if not parsed: return
+    w_type, sym, qty, price = parsed
+    price = normalize_trade_price(w_type, price)
+
+    rate = db.get_setting('crypto_rate') if w_type == 'CRYPTO' else 1
+
+    total_vnd = abs(qty) * price * rate
+    res = db.execute_trade(w_type, sym, qty, price, total_vnd, lot_id=lot_id)
+
+    sl_str = f"{abs(qty)}" if w_type == 'CRYPTO' else f"{abs(qty):,.0f}"
+    msg = f"✅ Khớp {'MUA' if qty>0 else 'BÁN'} {sl_str} {sym}"
+    if qty < 0: msg += f"\n💰 Lãi chốt: {res:,.0f} đ"
+    yield reply_to(message, msg)
+
+def cmd_batch(message, text):
+    # Nhiều dòng lệnh trong 1 tin nhắn: parse hết rồi ghi 1 transaction, trả 1 tin tổng kết
+    yield reply_to(message, batch_mod.handle_batch(text), parse_mode="Markdown")
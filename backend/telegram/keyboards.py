@@ -24,3 +24,11 @@ def get_crypto_keyboard():
     markup.row(types.KeyboardButton("➕ Giao dịch"), types.KeyboardButton("🔄 Cập nhật giá"))
     markup.row(types.KeyboardButton("📈 Báo cáo nhóm"), types.KeyboardButton("🏠 Trang chủ"))
     return markup
+
+def get_history_keyboard():
+    """Bàn phím ảo [::] cho Lịch sử"""
+    markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
+    markup.row(types.KeyboardButton("💵 LS Nạp/Rút"), types.KeyboardButton("📊 LS Chứng khoán"))
+    markup.row(types.KeyboardButton("🪙 LS Crypto"), types.KeyboardButton("🥇 LS Khác"))
+    markup.row(types.KeyboardButton("🔍 Tìm kiếm LS"), types.KeyboardButton("🔙 Đóng Menu"))
+    return markup
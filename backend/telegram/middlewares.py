@@ -0,0 +1,19 @@
+# backend/telegram/middlewares.py
+from telebot.handler_backends import BaseMiddleware
+from backend.database.repository import use_chat
+
+class ChatScopeMiddleware(BaseMiddleware):
+    """Trong lúc xử lý 1 update, mọi DatabaseRepo đọc/ghi sổ riêng của chat gửi update đó"""
+
+    def __init__(self):
+        self.update_types = ['message', 'callback_query']
+
+    def pre_process(self, message, data):
+        chat = message.message.chat if hasattr(message, 'data') else message.chat
+        scope = use_chat(chat.id)
+        scope.__enter__()
+        data['chat_scope'] = scope
+
+    def post_process(self, message, data, exception):
+        scope = data.pop('chat_scope', None)
+        if scope: scope.__exit__(None, None, None)
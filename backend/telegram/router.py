@@ -0,0 +1,38 @@
+# backend/telegram/router.py
+import re
+
+class CommandRouter:
+    """Tra handler cho 1 tin nhắn text trong 1 bước: dict cho nút bấm (khớp tuyệt đối)
+    + 1 regex biên dịch sẵn cho lệnh gõ tay (tiền tố + dấu cách, không phân biệt hoa thường)."""
+
+    def __init__(self):
+        self.exact = {}
+        self.prefixes = {}
+        self._pattern = None
+
+    def button(self, *texts):
+        def decorator(func):
+            for text in texts: self.exact[text] = func
+            return func
+        return decorator
+
+    def command(self, *prefixes):
+        def decorator(func):
+            for prefix in prefixes: self.prefixes[prefix.lower()] = func
+            self._pattern = None
+            return func
+        return decorator
+
+    def _compile(self):
+        # Tiền tố dài đứng trước để 'chuyen' không bị 'c' nuốt mất
+        alts = '|'.join(re.escape(p) for p in sorted(self.prefixes, key=len, reverse=True))
+        self._pattern = re.compile(f'({alts}) ', re.IGNORECASE)
+        return self._pattern
+
+    def resolve(self, text):
+        """-> (handler, là lệnh gõ tay?) hoặc (None, False) nếu không khớp"""
+        handler = self.exact.get(text)
+        if handler: return handler, False
+        m = (self._pattern or self._compile()).match(text)
+        if m: return self.prefixes[m.group(1).lower()], True
+        return None, False
@@ -0,0 +1,55 @@
+# backend/telegram/test_dispatcher.py
+# ChatDispatcher + long polling: mỗi update_id được xử lý đúng 1 lần, tuần tự trong từng chat.
+import threading, time
+from collections import Counter
+from types import SimpleNamespace
+from backend.telegram.dispatcher import ChatDispatcher
+
+def _update(update_id, chat_id):
+    return SimpleNamespace(update_id=update_id, message=SimpleNamespace(chat=SimpleNamespace(id=chat_id)),
+                           edited_message=None, callback_query=None)
+
+class PollingBot:
+    """Giả TeleBot threaded=False: mỗi vòng polling lấy các update có id > last_update_id rồi gọi process_new_updates"""
+    def __init__(self, updates, delay=0.002):
+        self.server = updates
+        self.last_update_id = 0
+        self.delay = delay
+        self.handled = []
+        self._lock = threading.Lock()
+
+    def process_new_updates(self, updates):
+        for update in updates:
+            time.sleep(self.delay)
+            with self._lock: self.handled.append(update)
+
+    def poll_once(self, batch=10):
+        updates = [u for u in self.server if u.update_id > self.last_update_id][:batch]
+        self.process_new_updates(updates)
+        return bool(updates)
+
+def test_each_update_processed_exactly_once():
+    updates = [_update(i, i % 5) for i in range(1, 101)]
+    bot = PollingBot(updates)
+    dispatcher = ChatDispatcher(workers=4, max_pending=1000)
+    dispatcher.install(bot)
+    polls = 0
+    while polls < 50 and bot.poll_once():   # chặn trên: offset không tiến thì polling lặp vô hạn
+        polls += 1
+    dispatcher.shutdown()
+    assert polls == 10   # offset tiến ngay khi nhận, không chờ worker xử lý xong
+    assert bot.last_update_id == 100
+    assert Counter(u.update_id for u in bot.handled) == Counter(range(1, 101))
+    # Trong 1 chat: đúng thứ tự nhận
+    for chat in range(5):
+        ids = [u.update_id for u in bot.handled if u.message.chat.id == chat]
+        assert ids == sorted(ids)
+
+def test_shutdown_drains_queued_updates():
+    bot = PollingBot([_update(i, 1) for i in range(1, 31)], delay=0.005)
+    dispatcher = ChatDispatcher(workers=2)
+    dispatcher.install(bot)
+    bot.poll_once(batch=30)
+    dispatcher.shutdown()
+    assert [u.update_id for u in bot.handled] == list(range(1, 31))
+    assert dispatcher.stats()['processed'] == 30
@@ -0,0 +1,30 @@
+# backend/telegram/test_handlers.py
+# Lệnh `his`: khoảng ngày được truyền nguyên vẹn xuống tìm kiếm, gõ nhiều khoảng thì báo cú pháp thay vì âm thầm bỏ bớt.
+from types import SimpleNamespace
+import pytest
+from backend.telegram import handlers
+
+@pytest.fixture
+def searches(db, monkeypatch):
+    calls = []
+    def search(*args, **kwargs):
+        calls.append(args)
+        return "ok", None
+    monkeypatch.setattr(handlers.hist_mod, 'search', search)
+    return calls
+
+def _his(text):
+    message = SimpleNamespace(chat=SimpleNamespace(id=None), text=text, message_id=1)
+    return list(handlers.route_text(message))
+
+def test_single_range_reaches_search(searches):
+    _his("his nap 2024-01..2024-06")
+    assert searches == [('CASH', None, None, '2024-01-01', '2024-07-01')]
+
+@pytest.mark.parametrize('text', ["his 2024 2025", "his VPB 2024-01..2024-03 2025-01", "his nap 2024-01 2024-02-15"])
+def test_several_ranges_rejected_with_usage(searches, text):
+    replies = _his(text)
+    assert searches == []
+    assert len(replies) == 1
+    assert replies[0].method == 'reply_to'
+    assert "1 khoảng ngày" in replies[0].args[1] and handlers.HISTORY_SEARCH_GUIDE in replies[0].args[1]
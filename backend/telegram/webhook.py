@@ -0,0 +1,52 @@
+# backend/telegram/webhook.py
+# Nhận update qua webhook thay cho long polling: HTTP server nhỏ (thư viện chuẩn), kiểm tra secret token
+# rồi đưa update vào đúng pipeline của runtime (feed nhận list[Update], giống bot.process_new_updates).
+import hmac, logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from telebot.types import Update
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+MAX_BODY = 1024 * 1024
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def _reply(self, code, body=b''):
+        self.send_response(code)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body: self.wfile.write(body)
+
+    def do_GET(self):
+        # Health check cho nền tảng deploy
+        self._reply(200, b'ok')
+
+    def do_POST(self):
+        srv = self.server
+        if self.path != srv.path:
+            return self._reply(404)
+        if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ''), srv.secret):
+            return self._reply(403)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length <= 0 or length > MAX_BODY:
+            return self._reply(413 if length > MAX_BODY else 400)
+        try:
+            update = Update.de_json(self.rfile.read(length).decode('utf-8'))
+        except Exception:
+            logger.warning("Webhook nhận body không phải Update hợp lệ")
+            return self._reply(400)
+        srv.feed([update])
+        self._reply(200)
+
+    def log_message(self, format, *args):
+        logger.debug("webhook %s - " + format, self.address_string(), *args)
+
+class WebhookServer(ThreadingHTTPServer):
+    """HTTP server nhận update Telegram tại `path`. Bắt buộc có secret: update thiếu/sai header bị từ chối (403)."""
+    daemon_threads = True
+
+    def __init__(self, feed, host='0.0.0.0', port=8080, path='/webhook', secret=None):
+        if not secret:
+            raise ValueError("Webhook không có secret sẽ nhận POST từ bất kỳ ai")
+        super().__init__((host, port), _WebhookHandler)
+        self.feed, self.path, self.secret = feed, path, secret
@@ -0,0 +1,80 @@
+# backend/utils/json_stream.py
+# Đọc 1 JSON object lớn theo từng chunk (không json.loads cả file):
+# các khóa cấp 1 trả về lần lượt, khóa có giá trị là mảng lớn thì trả từng phần tử.
+import codecs, json
+
+_WS = ' \t\r\n'
+
+class _Reader:
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf, self.pos, self.eof = '', 0, False
+
+    def fill(self):
+        """Đọc thêm 1 chunk; bỏ phần đã xử lý để bộ nhớ không tăng theo kích thước file"""
+        if self.eof: return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            self.buf = self.buf[self.pos:] + self.utf8.decode(b'', final=True)
+        else:
+            if isinstance(chunk, str): chunk = chunk.encode('utf-8')
+            self.buf = self.buf[self.pos:] + self.utf8.decode(chunk)
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Ký tự kế tiếp khác khoảng trắng ('' nếu hết dữ liệu)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WS:
+                self.pos += 1
+            if self.pos < len(self.buf): return self.buf[self.pos]
+            if not self.fill(): return ''
+
+    def expect(self, chars):
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"JSON không hợp lệ: cần {' hoặc '.join(chars)} tại vị trí {self.pos}, gặp {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Giải mã trọn 1 giá trị JSON; thiếu dữ liệu thì đọc thêm chunk rồi thử lại"""
+        self.peek()
+        while True:
+            try:
+                val, end = self.decoder.raw_decode(self.buf, self.pos)
+                # Số nằm sát cuối buffer có thể còn chữ số ở chunk sau
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return val
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self.fill()
+
+def iter_object(chunks, stream_keys=()):
+    """Duyệt object cấp 1 của 1 tài liệu JSON được chia chunk (bytes/str).
+    Yield (khóa, giá trị); với khóa trong stream_keys mà giá trị là mảng thì yield (khóa, phần tử) cho từng phần tử."""
+    r = _Reader(chunks)
+    r.expect('{')
+    if r.peek() == '}':
+        r.pos += 1
+        return
+    while True:
+        key = r.value()
+        r.expect(':')
+        if key in stream_keys and r.peek() == '[':
+            r.pos += 1
+            if r.peek() == ']':
+                r.pos += 1
+            else:
+                while True:
+                    yield key, r.value()
+                    if r.expect(',]') == ']': break
+        else:
+            yield key, r.value()
+        if r.expect(',}') == '}': break
+    if r.peek():
+        raise ValueError("JSON không hợp lệ: còn dữ liệu sau object cấp 1")
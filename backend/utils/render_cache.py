@@ -0,0 +1,72 @@
+# backend/utils/render_cache.py
+import threading
+from collections import OrderedDict
+from functools import wraps
+from backend.database.repository import ConnectionPool
+
+class RenderCache:
+    """LRU cache cho tin nhắn đã dựng sẵn.
+    Khóa: (file DB, view, ví, data version, tỷ giá) - lệnh ghi vào DB sẽ xóa các bản của file đó."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            text = self._entries.get(key)
+            if text is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, db_path=None):
+        with self._lock:
+            stale = [k for k in self._entries if db_path is None or k[0] == db_path]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': (self.hits / total * 100) if total else 0,
+                'evictions': self.evictions, 'invalidations': self.invalidations
+            }
+
+render_cache = RenderCache()
+ConnectionPool.add_listener(lambda pool, version: render_cache.invalidate(pool.db_path))
+
+def cached_view(view, wallet=None, error=None):
+    """Decorator cho các hàm get_*() của module (có self.db): trả bản dựng sẵn nếu dữ liệu chưa đổi.
+    error: nhãn lỗi - hàm lỗi thì trả "❌ Lỗi <nhãn>: ..." cho người dùng nhưng KHÔNG cache (lần sau dựng lại)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            snap = self.db.get_snapshot()
+            key = (self.db.pool.db_path, view, wallet, snap.version, snap.crypto_rate, args, tuple(sorted(kwargs.items())))
+            text = render_cache.get(key)
+            if text is None:
+                try:
+                    text = func(self, *args, **kwargs)
+                except Exception as e:
+                    if error is None: raise
+                    return f"❌ Lỗi {error}: {str(e)}"
+                render_cache.put(key, text)
+            return text
+        return wrapper
+    return decorator
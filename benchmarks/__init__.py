@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Đo hiệu năng, chạy tay: python -m benchmarks.<tên_file>
@@ -0,0 +1,108 @@
+# benchmarks/ledger.py
+# Sinh sổ giao dịch giả lập có số liệu khớp nhau (dòng tiền, giá vốn bình quân, lãi chốt, danh mục cuối kỳ)
+# theo đúng định dạng file ImportService đọc (giống file EXPORT), để benchmark chạy trên dữ liệu cỡ thật.
+# Xem nhanh: python -m benchmarks.ledger [số lệnh] > ledger.json
+import json, random, string, sys
+from datetime import datetime, timedelta
+
+LEDGER_WALLETS = ('STOCK', 'CRYPTO')
+NOTES = ('Mua thêm theo kế hoạch', 'Chốt lời một phần', 'Cắt lỗ', 'Cơ cấu danh mục', 'Giải ngân đợt mới')
+
+def _symbols(rng, wallet, count):
+    size = 3 if wallet == 'STOCK' else 4
+    names = set()
+    while len(names) < count:
+        names.add(''.join(rng.choices(string.ascii_uppercase, k=size)))
+    return sorted(names)
+
+class _Book:
+    """Sổ 1 ví trong lúc sinh: tiền mặt, danh mục (sl, giá TB, giá vốn VNĐ), giá hiện tại từng mã"""
+    def __init__(self, wallet, symbols, rng):
+        self.wallet, self.symbols = wallet, symbols
+        self.cash = self.total_in = self.total_out = 0
+        self.positions = {}
+        lo, hi = (10_000, 150_000) if wallet == 'STOCK' else (0.5, 60_000)
+        self.floor = lo / 2   # giá CK không rơi dưới 1000 (ImportService sẽ hiểu nhầm là đơn vị nghìn đồng)
+        self.prices = {s: rng.uniform(lo, hi) for s in symbols}
+
+def generate_ledger(wallets=LEDGER_WALLETS, symbols=40, trades=50_000, years=3, start_year=2023, rate=25_000, seed=1):
+    """-> dict import (version, settings, wallets, holdings, history). Cùng tham số + seed cho ra đúng 1 sổ,
+    nên kết quả benchmark giữa các commit so sánh được. trades = số lệnh MUA/BAN (chưa tính dòng nạp/rút/cấp vốn)."""
+    rng = random.Random(seed)
+    books = {w: _Book(w, _symbols(rng, w, symbols), rng) for w in wallets}
+    start = datetime(start_year, 1, 1)
+    span = years * 365 * 86400
+    times = sorted(rng.randrange(span) for _ in range(trades))
+    cash = {'total_in': 0, 'total_out': 0, 'current_cash': 0}
+    history = []
+
+    def row(ts, wallet, tx_type, amount, symbol=None, qty=0, price=0, pl=0, note=None):
+        history.append({'wallet_id': wallet, 'type': tx_type, 'symbol': symbol, 'quantity': qty, 'price': price,
+                        'amount': amount, 'realized_pl': pl, 'timestamp': ts, 'note': note})
+
+    def fund(ts, book, need):
+        # Nạp vào Ví Mẹ rồi cấp vốn sang ví con (như lệnh nap + chuyen)
+        amount = round(max(need, 1) * rng.uniform(1.5, 4), -6)
+        cash['total_in'] += amount
+        row(ts, 'CASH', 'NAP', amount)
+        book.cash += amount
+        book.total_in += amount
+        row(ts, book.wallet, 'CHUYEN_IN', amount)
+
+    for offset in times:
+        ts = (start + timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S')
+        book = books[rng.choice(wallets)]
+        sym = rng.choice(book.symbols)
+        book.prices[sym] = max(book.floor, book.prices[sym] * rng.uniform(0.97, 1.03))
+        price = round(book.prices[sym], -2) if book.wallet == 'STOCK' else round(book.prices[sym], 4)
+        fx = rate if book.wallet == 'CRYPTO' else 1
+        pos = book.positions.get(sym)
+        note = rng.choice(NOTES) if rng.random() < 0.2 else None
+
+        if pos and rng.random() < 0.45:
+            # Bán hết (30%) hoặc 1 phần; CK theo lô 100
+            qty = pos[0] * rng.uniform(0.2, 0.8)
+            qty = max(100, round(qty, -2)) if book.wallet == 'STOCK' else round(qty, 6)
+            if rng.random() < 0.3 or qty >= pos[0]: qty = pos[0]
+            value = qty * price * fx
+            cost = pos[2] * qty / pos[0]
+            if qty == pos[0]: del book.positions[sym]
+            else: book.positions[sym] = [pos[0] - qty, pos[1], pos[2] - cost]
+            book.cash += value
+            row(ts, book.wallet, 'BAN', value, sym, qty, price, value - cost, note)
+        else:
+            qty = rng.randrange(1, 50) * 100 if book.wallet == 'STOCK' else round(rng.uniform(100, 5000) / price, 6) or 0.000001
+            value = qty * price * fx
+            if book.cash < value: fund(ts, book, value - book.cash)
+            book.cash -= value
+            if pos:
+                new_qty = pos[0] + qty
+                book.positions[sym] = [new_qty, (pos[0] * pos[1] + qty * price) / new_qty, pos[2] + value]
+            else:
+                book.positions[sym] = [qty, price, value]
+            row(ts, book.wallet, 'MUA', -value, sym, qty, price, 0, note)
+
+        # Thỉnh thoảng thu bớt tiền thừa về Ví Mẹ rồi rút ra (lệnh thu + rut)
+        if book.cash > 0 and rng.random() < 0.01:
+            amount = round(book.cash * rng.uniform(0.2, 0.6), -3)
+            book.cash -= amount
+            book.total_out += amount
+            cash['current_cash'] += amount
+            cash['total_in'] += amount
+            row(ts, 'CASH', 'CHUYEN_IN', amount)
+            withdraw = round(cash['current_cash'] * rng.uniform(0.3, 0.9), -3)
+            cash['current_cash'] -= withdraw
+            cash['total_out'] += withdraw
+            row(ts, 'CASH', 'RUT', -withdraw)
+
+    holdings = []
+    for book in books.values():
+        for sym, (qty, avg, cost) in book.positions.items():
+            holdings.append({'wallet_id': book.wallet, 'symbol': sym, 'qty': qty, 'average_price': avg,
+                             'market_price': round(book.prices[sym], 4), 'cost_basis_vnd': cost})
+    wallet_state = {'CASH': cash}
+    wallet_state.update({b.wallet: {'total_in': b.total_in, 'total_out': b.total_out, 'current_cash': b.cash} for b in books.values()})
+    return {'version': '3.4', 'settings': {'crypto_rate': str(rate)}, 'wallets': wallet_state, 'holdings': holdings, 'history': history}
+
+if __name__ == "__main__":
+    json.dump(generate_ledger(trades=int(sys.argv[1]) if len(sys.argv) > 1 else 1000), sys.stdout, ensure_ascii=False)
@@ -0,0 +1,62 @@
+# benchmarks/router_dispatch.py
+# So sánh chi phí chọn handler cho 1 tin nhắn text: chuỗi lambda tuần tự (main.py cũ) vs CommandRouter.
+# Chạy: python -m benchmarks.router_dispatch [số vòng]
+import os, sys, timeit
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.telegram.handlers import router
+
+MANUAL_PREFIXES = ['nap ', 'rut ', 'chuyen ', 'thu ', 's ', 'c ', 'k ', 'up ', 'rate ', 'his ', 'del ']
+
+# Thứ tự filter y như các @bot.message_handler(func=...) cũ; lọt xuống cuối là handle_manual_commands
+LEGACY_FILTERS = [
+    lambda t: t in ["🏠 Trang chủ", "💼 Tài sản của bạn", "/start"],
+    lambda t: t == "📊 Chứng Khoán",
+    lambda t: t in ["🪙 Crypto", "🟡 Crypto"],
+    lambda t: t == "📈 Báo cáo nhóm",
+    lambda t: t in ["📥 EXPORT/IMPORT", "💾 Dữ liệu"],
+    lambda t: t in ["📜 Lịch sử", "/history"],
+    lambda t: t in ["💵 LS Nạp/Rút", "📊 LS Chứng khoán", "🪙 LS Crypto", "🥇 LS Khác"],
+    lambda t: t == "🔍 Tìm kiếm LS",
+    lambda t: t == "🔙 Đóng Menu",
+    lambda t: t == "➕ Giao dịch",
+    lambda t: t == "🔄 Cập nhật giá",
+    lambda t: any(t.lower().startswith(x) for x in MANUAL_PREFIXES),
+]
+
+def legacy_dispatch(text):
+    for i, f in enumerate(LEGACY_FILTERS):
+        if f(text): break
+    else:
+        return None
+    if i < len(LEGACY_FILTERS) - 1: return i
+    # Nhánh if/elif của handle_manual_commands, mỗi nhánh lại startswith trên text đã lower/strip
+    text = text.lower().strip()
+    for branch in ['his ', 'del ', 'rate crypto ', ('nap ', 'rut ', 'chuyen ', 'thu '), 'k ', 'up ', ('s ', 'c ')]:
+        if text.startswith(branch): return branch
+    return None
+
+def router_dispatch(text):
+    handler, typed = router.resolve(text)
+    if typed: text = text.lower().strip()
+    return handler
+
+# Trộn kiểu traffic thật: phần lớn là lệnh gõ tay (lệnh 's'/'c' nằm cuối chuỗi cũ), còn lại là nút bấm
+SAMPLE = [
+    's vpb 100 25.5', 'c btc 0.01 65000', 'up vpb 27', 'nap 10 tr', 'chuyen stock 5 tr', 'his vpb',
+    'del fpt', 'k vang 20 tr', 'rate crypto 25500', '🏠 Trang chủ', '📊 Chứng Khoán', '🔙 Đóng Menu',
+    '📈 Báo cáo nhóm', 'xin chào',
+]
+
+def run(rounds=20000):
+    results = {}
+    for name, fn in [('legacy', legacy_dispatch), ('router', router_dispatch)]:
+        total = min(timeit.repeat(lambda: [fn(t) for t in SAMPLE], number=rounds, repeat=3))
+        results[name] = total / (rounds * len(SAMPLE)) * 1e9
+    return results
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    res = run(rounds)
+    for name, ns in res.items():
+        print(f"{name:>7}: {ns:8.1f} ns/tin nhắn")
+    print(f"nhanh hơn: x{res['legacy'] / res['router']:.1f}")
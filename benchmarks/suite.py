@@ -0,0 +1,160 @@
+# benchmarks/suite.py
+# Đo các đường nóng của repository / báo cáo trên sổ giả lập (benchmarks.ledger), ghi kết quả ra JSON
+# để so sánh giữa các commit. Không cần token/mạng: bot Telegram được thay bằng StubBot ghi lại lệnh gửi.
+# Chạy:     python -m benchmarks.suite [--trades 50000 --symbols 40 --years 3 --repeat 7 --out bench.json]
+# So sánh:  python -m benchmarks.suite --compare cu.json moi.json
+import argparse, json, math, os, platform, sqlite3, statistics, subprocess, sys, tempfile, time
+from datetime import datetime
+from types import SimpleNamespace
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT)
+from benchmarks.ledger import generate_ledger, LEDGER_WALLETS
+
+BENCH_CHAT = 990001   # shard riêng của benchmark (trong thư mục tạm)
+
+class StubBot:
+    """Thay TeleBot: mọi method (send_message, reply_to, ...) chỉ ghi lại lời gọi và trả về 1 message giả"""
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, method):
+        def call(*args, **kwargs):
+            self.calls.append(method)
+            return SimpleNamespace(message_id=len(self.calls), photo=None)
+        return call
+
+def measure(fn, repeat, setup=None):
+    """Chạy fn `repeat` lần (setup trước mỗi lần, không tính giờ) -> thống kê mili giây"""
+    times = []
+    for _ in range(repeat):
+        if setup: setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return {'runs': repeat, 'min_ms': round(times[0], 3), 'median_ms': round(statistics.median(times), 3),
+            'mean_ms': round(statistics.fmean(times), 3), 'max_ms': round(times[-1], 3)}
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(trades=50_000, symbols=40, years=3, wallets=LEDGER_WALLETS, repeat=7, trade_ops=200, seed=1, log=print):
+    """Dựng sổ giả lập trong thư mục tạm rồi đo lần lượt các kịch bản -> {kịch bản: thống kê}"""
+    workdir = tempfile.mkdtemp(prefix='bench_')
+    os.chdir(workdir)   # DB_PATH / SHARD_DIR / CHART_DIR là đường dẫn tương đối: mọi file benchmark nằm trong thư mục tạm
+    from backend.database.repository import DatabaseRepo, use_chat
+    from backend.services.import_service import ImportService
+    from backend.modules.dashboard import DashboardModule
+    from backend.modules.stock import StockModule
+    from backend.modules.history import HistoryModule
+    from backend.modules.report import ReportModule
+    from backend.utils.render_cache import render_cache
+
+    t0 = time.perf_counter()
+    ledger = generate_ledger(wallets, symbols, trades, years, seed=seed)
+    log(f"Sổ giả lập: {len(ledger['history']):,} dòng, {len(ledger['holdings'])} mã đang giữ ({time.perf_counter() - t0:.1f}s)")
+
+    results = {}
+    def bench(name, fn, setup=None, n=repeat):
+        results[name] = stats = measure(fn, n, setup)
+        log(f"{name:<28} median {stats['median_ms']:>10.3f} ms | min {stats['min_ms']:>10.3f} ms")
+
+    with use_chat(BENCH_CHAT):
+        db = DatabaseRepo()
+        importer, dash, stock, hist, report = ImportService(), DashboardModule(), StockModule(), HistoryModule(), ReportModule()
+
+        def cold():
+            # Bỏ snapshot + bản dựng sẵn: đo đủ đường đọc SQLite -> tính toán -> dựng tin nhắn
+            render_cache.invalidate(db.pool.db_path)
+            db.pool.snapshot = None
+
+        def do_import():
+            ok, msg = importer.process_import_file(ledger)
+            if not ok: raise RuntimeError(msg)
+        bench('import_ledger', do_import, n=max(1, min(repeat, 3)))
+
+        bench('get_dashboard_data', db.get_dashboard_data, cold)
+        bench('main_dashboard_cold', dash.get_main_dashboard, cold)
+        bench('main_dashboard_warm', dash.get_main_dashboard)
+        bench('stock_group_report_cold', stock.get_group_report, cold)
+        bench('stock_group_report_warm', stock.get_group_report)
+
+        total = db.get_transactions_count()
+        last_page = math.ceil(total / 5)
+        oldest = db.execute_query("SELECT MIN(id) AS id FROM transactions", fetch_one=True)['id']
+        busiest = db.execute_query("SELECT scope FROM tx_counters WHERE scope LIKE 'S:%' ORDER BY total DESC LIMIT 1", fetch_one=True)['scope'][2:]
+        bench('history_first_page', lambda: hist.get_history_ui(1))
+        bench('history_deep_page', lambda: hist.get_history_ui(last_page))
+        bench('history_deep_cursor', lambda: hist.get_history_ui(last_page - 1, cursor=f"o{oldest + 10}"))
+        bench('history_symbol_deep_page', lambda: hist.get_history_ui(10**9, symbol=busiest))
+        bench('history_search', lambda: hist.search(text='chot loi', date_from=f"{ledger['history'][0]['timestamp'][:4]}-01-01"))
+        bench('period_report_year', lambda: report.get_period_report('Y', ledger['history'][-1]['timestamp'][:4], ledger['history'][-1]['timestamp'][:4]), cold)
+
+        # Luồng đầy đủ của 1 tin nhắn qua handler, gửi vào StubBot
+        from backend.telegram import handlers
+        bot = StubBot()
+        home = SimpleNamespace(chat=SimpleNamespace(id=BENCH_CHAT), text="🏠 Trang chủ")
+        bench('telegram_home_cold', lambda: [r.send(bot) for r in handlers.route_text(home)], cold)
+
+        # Ghi: cặp mua/bán trên mã đang giữ (mỗi lệnh 1 transaction, đổi data version)
+        trade_ops = max(2, trade_ops - trade_ops % 2)
+        h = ledger['holdings'][0]
+        wid, sym, price = h['wallet_id'], h['symbol'], h['market_price']
+        qty = 100 if wid == 'STOCK' else h['qty'] / 10
+        value = qty * price * (float(ledger['settings']['crypto_rate']) if wid == 'CRYPTO' else 1)
+        db.update_cash_balance(trade_ops * value, 'NAP')
+        db.transfer_funds('CASH', wid, trade_ops * value)
+        def trades_batch():
+            for i in range(trade_ops // 2):
+                db.execute_trade(wid, sym, qty, price, value)
+                db.execute_trade(wid, sym, -qty, price, value)
+        stats = measure(trades_batch, max(1, min(repeat, 3)))
+        results['execute_trade'] = dict(stats, **{k: round(v / trade_ops, 4) for k, v in stats.items() if k.endswith('_ms')}, ops=trade_ops)
+        log(f"{'execute_trade':<28} median {results['execute_trade']['median_ms']:>10.3f} ms / lệnh ({trade_ops} lệnh/lượt)")
+    return results
+
+def compare(old_path, new_path):
+    with open(old_path, encoding='utf-8') as f: old = json.load(f)
+    with open(new_path, encoding='utf-8') as f: new = json.load(f)
+    print(f"{'kịch bản':<28} {old['meta'].get('commit') or old_path:>12} {new['meta'].get('commit') or new_path:>12}   x")
+    for name, res in new['results'].items():
+        before = old['results'].get(name)
+        if not before:
+            print(f"{name:<28} {'-':>12} {res['median_ms']:>12.3f}")
+            continue
+        ratio = before['median_ms'] / res['median_ms'] if res['median_ms'] else float('inf')
+        print(f"{name:<28} {before['median_ms']:>12.3f} {res['median_ms']:>12.3f}   {ratio:.2f}")
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark repository / báo cáo trên sổ giả lập")
+    ap.add_argument('--trades', type=int, default=50_000, help="số lệnh MUA/BAN trong sổ giả lập")
+    ap.add_argument('--symbols', type=int, default=40, help="số mã mỗi ví")
+    ap.add_argument('--years', type=int, default=3)
+    ap.add_argument('--wallets', default=','.join(LEDGER_WALLETS), help="ví có giao dịch, vd: STOCK,CRYPTO")
+    ap.add_argument('--repeat', type=int, default=7, help="số lần đo mỗi kịch bản")
+    ap.add_argument('--trade-ops', type=int, default=200, help="số lệnh execute_trade mỗi lượt đo")
+    ap.add_argument('--seed', type=int, default=1)
+    ap.add_argument('--out', help="file JSON kết quả (mặc định bench_<commit>.json)")
+    ap.add_argument('--compare', nargs=2, metavar=('CU', 'MOI'), help="so sánh 2 file kết quả, không chạy đo")
+    args = ap.parse_args(argv)
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit = git_commit()
+    out = os.path.abspath(args.out or f"bench_{commit or 'local'}.json")
+    wallets = tuple(w.strip().upper() for w in args.wallets.split(',') if w.strip())
+    params = {'trades': args.trades, 'symbols': args.symbols, 'years': args.years, 'wallets': list(wallets),
+              'repeat': args.repeat, 'trade_ops': args.trade_ops, 'seed': args.seed}
+    results = run(args.trades, args.symbols, args.years, wallets, args.repeat, args.trade_ops, args.seed)
+    meta = {'commit': commit, 'created_at': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(), 'params': params}
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"Đã ghi {out}")
+
+if __name__ == "__main__":
+    main()
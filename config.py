@@ -7,6 +7,39 @@ load_dotenv()
 TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 DB_PATH = "data/finance_v2.db"
 
+# Mỗi chat một sổ SQLite riêng trong SHARD_DIR; chat chủ cũ (OWNER_CHAT_ID) tiếp tục dùng DB_PATH
+SHARD_DIR = "data/chats"
+MAX_OPEN_SHARDS = int(os.getenv("MAX_OPEN_SHARDS", "64"))
+OWNER_CHAT_ID = os.getenv("OWNER_CHAT_ID")   # bắt buộc khi DB_PATH đã có dữ liệu (bot từ chối khởi động nếu thiếu)
+
+# Pool worker xử lý update: song song giữa các chat, tuần tự trong 1 chat
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "8"))
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", "1000"))
+
+# Runtime: "threads" (TeleBot + ChatDispatcher) hoặc "asyncio" (AsyncTeleBot, cần aiohttp; SQLite chạy trên DB_WORKER_THREADS thread)
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "threads")
+DB_WORKER_THREADS = int(os.getenv("DB_WORKER_THREADS", "4"))
+
+# Nhận update: "polling" (mặc định) hoặc "webhook" (HTTP server nội bộ; WEBHOOK_URL là địa chỉ public đăng ký với Telegram)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("PORT", os.getenv("WEBHOOK_PORT", "8080")))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")   # bỏ trống: tự sinh khi có WEBHOOK_URL, không thì từ chối chạy webhook
+
+# Giá tự động: PRICE_PROVIDER rỗng = tắt (chỉ cập nhật tay bằng lệnh up);
+# "file:data/prices.csv" (CSV mã,giá hoặc .json) hoặc "http://host/prices" (GET ?symbols=A,B -> JSON {mã: giá})
+PRICE_PROVIDER = os.getenv("PRICE_PROVIDER", "")
+PRICE_TTL = int(os.getenv("PRICE_TTL", "60"))                            # giây giữ giá trong cache / mã
+PRICE_REFRESH_INTERVAL = int(os.getenv("PRICE_REFRESH_INTERVAL", "300"))  # chu kỳ thread nền (giây)
+PRICE_FETCH_TIMEOUT = float(os.getenv("PRICE_FETCH_TIMEOUT", "5"))
+
+# Biểu đồ PNG (matplotlib): vẽ trên CHART_WORKERS thread riêng, giữ tối đa CHART_CACHE_MAX ảnh trong CHART_DIR
+CHART_DIR = "data/charts"
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_CACHE_MAX = int(os.getenv("CHART_CACHE_MAX", "500"))
+
 # Tỷ giá bọc thép
 RATE_CRYPTO = 25000  # 1 USD = 25.000 VNĐ
 RATE_STOCK = 1000    # Nhân 1000 cho giá cổ phiếu (vd: 80 -> 80,000)
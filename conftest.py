@@ -0,0 +1,25 @@
+# conftest.py
+# Fixture dùng chung cho test: mỗi test 1 thư mục tạm + 1 shard riêng (DB_PATH / SHARD_DIR là đường dẫn tương đối)
+import itertools
+import pytest
+from backend.database.repository import DatabaseRepo, use_chat
+
+_chats = itertools.count(910001)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    with use_chat(next(_chats)):
+        yield DatabaseRepo()
+
+@pytest.fixture
+def table(db):
+    """table(sql, số cột khóa) -> {khóa: giá trị làm tròn}; bỏ dòng toàn 0 mà trigger xóa để lại"""
+    def read(sql, key_len):
+        out = {}
+        for r in db.execute_query(sql, fetch_all=True):
+            r = tuple(r.values())
+            values = tuple(round(v or 0, 4) for v in r[key_len:])
+            if any(values): out[r[:key_len]] = values
+        return out
+    return read